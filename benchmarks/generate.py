@@ -0,0 +1,134 @@
+"""Seeded synthetic documents for the benchmarks.
+
+Usage: python benchmarks/generate.py SHAPE COUNT DIRECTORY [--seed N]
+Writes SHAPE-COUNT.lts, .ctd and .ncd fixtures of the same tree into DIRECTORY.
+
+Shapes:
+  wide     every node has up to WIDE_FANOUT children, so the tree is only a few levels deep
+  deep     long parent-child chains with occasional branches, hundreds of levels deep
+  content  a mixed tree whose notes carry a few kilobytes of HTML each
+"""
+import os
+import random
+import sqlite3
+import sys
+from xml.sax.saxutils import escape, quoteattr
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+from utility import Node, iter_tree_preorder, save_tree_to_custom_format  # noqa: E402
+
+SHAPES = ("wide", "deep", "content")
+WIDE_FANOUT = 200
+DEEP_BRANCH_CHANCE = 0.05  # Chance that a deep-tree node starts a new chain instead of extending the last one
+SHORT_PARAGRAPHS = (1, 2)
+LONG_PARAGRAPHS = (2, 10)  # Paragraphs per note in the content-heavy shape (~60 words each)
+_WORDS = (
+    "tree node note branch leaf root index record journal section content image "
+    "merge save load import export search query result draft outline summary chapter "
+    "list table link quote code item topic idea task plan review detail version change"
+).split()
+
+
+def generate_rows(shape, count, seed=0):
+    """Yields (parent_row, name, content) for count nodes; parent_row is None for the root."""
+    if shape not in SHAPES:
+        raise ValueError(f"Unknown tree shape '{shape}', expected one of {', '.join(SHAPES)}")
+    rng = random.Random(f"{shape}:{seed}")
+    paragraphs = LONG_PARAGRAPHS if shape == "content" else SHORT_PARAGRAPHS
+    yield None, "Root", ""
+    for row in range(1, count):
+        if shape == "wide":
+            parent = (row - 1) // WIDE_FANOUT
+        elif shape == "deep":
+            parent = row - 1 if rng.random() >= DEEP_BRANCH_CHANCE else rng.randrange(row)
+        else:
+            parent = rng.randrange(max(0, row - 64), row)
+        yield parent, f"Node {row} {rng.choice(_WORDS)}", _html(rng, rng.randint(*paragraphs))
+
+
+def _html(rng, paragraphs):
+    return "".join(
+        "<p>" + " ".join(rng.choices(_WORDS, k=rng.randint(20, 100))) + "</p>"
+        for _ in range(paragraphs)
+    )
+
+
+def build_tree(shape, count, seed=0):
+    """Builds the tree for (shape, count, seed) as Nodes and returns its root."""
+    nodes = []
+    for parent, name, content in generate_rows(shape, count, seed):
+        node = Node(name, content)
+        if parent is not None:
+            nodes[parent].add_child(node)
+        nodes.append(node)
+    return nodes[0]
+
+
+def write_cherrytree(root, file_name):
+    """Writes root's children as a CherryTree XML document, without recursion."""
+    with open(file_name, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<cherrytree>\n')
+        depths = {id(root): 0}
+        open_depths = []  # Depth of each <node> element still open
+        for unique_id, (node, parent) in enumerate(iter_tree_preorder(root)):
+            if parent is None:
+                continue  # The importer supplies its own root
+            depth = depths[id(node)] = depths[id(parent)] + 1
+            while open_depths and open_depths[-1] >= depth:
+                open_depths.pop()
+                f.write("</node>\n")
+            f.write(f'<node name={quoteattr(node.name)} unique_id="{unique_id}" prog_lang="custom-colors">'
+                    f'<rich_text>{escape(node.content)}</rich_text>\n')
+            open_depths.append(depth)
+        f.write("</node>\n" * len(open_depths))
+        f.write("</cherrytree>\n")
+
+
+def write_notecase(root, file_name):
+    """Writes root's children as a NoteCase SQLite database."""
+    if os.path.exists(file_name):
+        os.remove(file_name)
+    conn = sqlite3.connect(file_name)
+    try:
+        conn.execute("CREATE TABLE nodes (id INTEGER PRIMARY KEY, parent_id INTEGER, title TEXT, html_content TEXT)")
+        ids = {id(root): 0}
+        rows = []
+        for node, parent in iter_tree_preorder(root):
+            if parent is None:
+                continue
+            ids[id(node)] = len(ids)
+            rows.append((ids[id(node)], ids[id(parent)], node.name, node.content))
+        conn.executemany("INSERT INTO nodes VALUES (?, ?, ?, ?)", rows)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def write_fixtures(root, directory, stem):
+    """Writes stem.lts, stem.ctd and stem.ncd for root into directory; returns their paths by extension."""
+    paths = {ext: os.path.join(directory, f"{stem}.{ext}") for ext in ("lts", "ctd", "ncd")}
+    save_tree_to_custom_format(root, paths["lts"])
+    write_cherrytree(root, paths["ctd"])
+    write_notecase(root, paths["ncd"])
+    return paths
+
+
+def main(argv):
+    seed = 0
+    if "--seed" in argv:
+        position = argv.index("--seed")
+        seed = int(argv[position + 1])
+        del argv[position:position + 2]
+    if len(argv) != 3:
+        print(__doc__)
+        return 2
+    shape, count, directory = argv[0], int(argv[1]), argv[2]
+    os.makedirs(directory, exist_ok=True)
+    for path in write_fixtures(build_tree(shape, count, seed), directory, f"{shape}-{count}").values():
+        print(path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,79 @@
+"""Compares the memory used by Node trees and CompactTree stores.
+
+Usage: python benchmarks/memory.py [node counts...]   (default: 10000 100000 1000000)
+"""
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+from utility import Node  # noqa: E402
+from compact import CompactTree  # noqa: E402
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+CONTENT_LENGTH = 64
+
+
+def generate_rows(count, seed=0):
+    """Yields (parent_row, name, content) for a random tree; parent_row is None for the root."""
+    rng = random.Random(seed)
+    yield None, "Root", ""
+    for row in range(1, count):
+        # Bias towards recent rows so the tree gets both depth and wide branches
+        parent = rng.randrange(max(0, row - 64), row)
+        content = rng.getrandbits(CONTENT_LENGTH * 4).to_bytes(CONTENT_LENGTH // 2, 'big').hex()
+        yield parent, f"Node {row}", content
+
+
+def build_nodes(count, seed=0):
+    nodes = []
+    for parent, name, content in generate_rows(count, seed):
+        node = Node(name, content)
+        if parent is not None:
+            nodes[parent].add_child(node)
+        nodes.append(node)
+    return nodes[0]
+
+
+def build_compact(count, seed=0):
+    tree = CompactTree()
+    for parent, name, content in generate_rows(count, seed):
+        row = tree.add_row(name, content)
+        if parent is not None:
+            tree.link(parent, row)
+    return tree
+
+
+def measure(builder, count):
+    """Returns (bytes still allocated by the built structure, seconds to build it)."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    structure = builder(count)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del structure
+    gc.collect()
+    return allocated, elapsed
+
+
+def main(argv):
+    sizes = [int(arg) for arg in argv] or DEFAULT_SIZES
+    print(f"{'nodes':>10}  {'Node tree':>12}  {'per node':>9}  {'CompactTree':>12}  {'per node':>9}  {'ratio':>6}")
+    for count in sizes:
+        node_bytes, node_time = measure(build_nodes, count)
+        compact_bytes, compact_time = measure(build_compact, count)
+        print(f"{count:>10}  {node_bytes / 1e6:>10.1f}MB  {node_bytes / count:>8.0f}B"
+              f"  {compact_bytes / 1e6:>10.1f}MB  {compact_bytes / count:>8.0f}B"
+              f"  {node_bytes / compact_bytes:>5.1f}x")
+        print(f"{'':>10}  build {node_time:.2f}s (Node) / {compact_time:.2f}s (CompactTree)")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
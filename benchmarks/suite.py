@@ -0,0 +1,400 @@
+"""Times file I/O and tree operations on synthetic documents of several shapes and sizes.
+
+Usage: python benchmarks/suite.py [--sizes N ...] [--shapes SHAPE ...] [--only OPERATION ...]
+                                  [--repeat N] [--seed N] [--output FILE] [--baseline FILE]
+                                  [--save-baseline] [--threshold RATIO]
+
+Each operation is run --repeat times and the fastest run is reported with
+its throughput; peak memory is taken from one extra run under tracemalloc
+(Python allocations only, so Qt's own memory is not counted). Results are
+written as JSON to --output and compared with --baseline when that file
+exists; operations slower than the baseline by more than --threshold
+(and taking at least NOISE_FLOOR_S) are flagged and make the exit status 1. Qt runs on the offscreen platform, so
+no display is needed.
+"""
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARK_DIR, "..", "scripts"))
+
+from utility import (  # noqa: E402
+    Node, ChangeTracker, iter_tree_preorder, save_tree_to_custom_format, save_tree_incremental,
+    load_tree_from_custom_format, save_tree_to_file, load_tree_from_file, merge_trees, subtree_hash
+)
+from importers import import_cherrytree, import_notecase  # noqa: E402
+from merge import plan_merge  # noqa: E402
+from markup import QT_HTML_MARKER, compact_tree_markup  # noqa: E402
+from generate import SHAPES, build_tree, write_cherrytree, write_notecase  # noqa: E402
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+DEFAULT_REPEAT = 3
+DEFAULT_OUTPUT = os.path.join(BENCHMARK_DIR, "results", "latest.json")
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "results", "baseline.json")
+REGRESSION_THRESHOLD = 1.25  # Slowdown against the baseline that counts as a regression
+NOISE_FLOOR_S = 0.005  # Runs this short are compared but never flagged
+JOURNAL_EDITS = 20  # Nodes changed before each incremental save
+REVEAL_NODES = 200  # Random nodes fetched down to in the tree model
+# What QTextEdit.toHtml() wraps around a note, for notes saved before markup was compacted
+EDITOR_HTML_START = ('<!DOCTYPE HTML PUBLIC "-//W3C//DTD HTML 4.0//EN" "http://www.w3.org/TR/REC-html40/strict.dtd">\n'
+                     f'<html><head>{QT_HTML_MARKER}<style type="text/css">\np, li {{ white-space: pre-wrap; }}\n'
+                     "</style></head><body style=\" font-family:'Arial'; font-size:12pt; font-weight:400; font-style:normal;\">\n")
+EDITOR_PARAGRAPH = ('<p style=" margin-top:0px; margin-bottom:0px; margin-left:0px; margin-right:0px; '
+                    '-qt-block-indent:0; text-indent:0px;">')
+
+
+class Case:
+    """One generated document with its fixture files, shared by the operations that use it."""
+    def __init__(self, shape, count, seed, directory):
+        self.shape = shape
+        self.count = count
+        self.seed = seed
+        self.tree = build_tree(shape, count, seed)
+        self.directory = directory
+        self.files = {}
+
+    def path(self, name):
+        return os.path.join(self.directory, f"{self.shape}-{self.count}-{name}")
+
+    def fixture(self, kind):
+        """Writes the fixture of the given kind on first use and returns its path."""
+        if kind not in self.files:
+            path = self.files[kind] = self.path(FIXTURE_NAMES[kind])
+            FIXTURE_WRITERS[kind](self.tree, path)
+        return self.files[kind]
+
+
+FIXTURE_NAMES = {"lts": "fixture.lts", "json": "fixture.json.lts", "ctd": "fixture.ctd", "ncd": "fixture.ncd"}
+FIXTURE_WRITERS = {
+    "lts": save_tree_to_custom_format,
+    "json": save_tree_to_file,
+    "ctd": write_cherrytree,
+    "ncd": write_notecase,
+}
+
+
+# --- Operations ---
+# Each returns (setup, run, file): setup (or None) is called untimed before
+# every run, and file, when set, is the path whose size gives the MB/s figure.
+
+def op_save_lts(case):
+    path = case.path("save.lts")
+    return None, lambda: save_tree_to_custom_format(case.tree, path), path
+
+
+def op_save_lts_incremental(case):
+    path = case.path("journal.lts")
+    tree = build_tree(case.shape, case.count, case.seed)
+    save_tree_to_custom_format(tree, path)
+    nodes = [node for node, _ in iter_tree_preorder(tree)]
+    rng = random.Random(case.seed)
+    tracker = ChangeTracker(tree)
+    state = {}
+
+    def setup():
+        for node in rng.sample(nodes, min(JOURNAL_EDITS, len(nodes))):
+            node.content = node.content + "<p>edited</p>"
+        state["changed"] = tracker.take()
+
+    return setup, lambda: save_tree_incremental(tree, path, state["changed"]), None
+
+
+def op_load_lts(case):
+    path = case.fixture("lts")
+    return None, lambda: load_tree_from_custom_format(path), path
+
+
+def op_load_lts_content(case):
+    path = case.fixture("lts")
+
+    def run():
+        for node, _ in iter_tree_preorder(load_tree_from_custom_format(path)):
+            node.content
+    return None, run, path
+
+
+def op_save_json(case):
+    path = case.path("save.json.lts")
+    return None, lambda: save_tree_to_file(case.tree, path), path
+
+
+def op_load_json(case):
+    path = case.fixture("json")
+    return None, lambda: load_tree_from_file(path), path
+
+
+def op_import_ctd(case):
+    path = case.fixture("ctd")
+    return None, lambda: import_cherrytree(path), path
+
+
+def op_import_ncd(case):
+    path = case.fixture("ncd")
+    return None, lambda: import_notecase(path), path
+
+
+def op_compact_markup(case):
+    tree = build_tree(case.shape, case.count, case.seed)
+    editor_html = {}
+    for node, _ in iter_tree_preorder(tree):
+        editor_html[node] = EDITOR_HTML_START + node.content.replace("<p>", EDITOR_PARAGRAPH) + "</body></html>"
+
+    def setup():
+        for node, content in editor_html.items():
+            node.content = content
+    return setup, lambda: compact_tree_markup(tree), None
+
+
+def op_copy(case):
+    def run():
+        for _ in iter_tree_preorder(case.tree.copy()):
+            pass  # Visiting every node materializes the whole copy
+    return None, run, None
+
+
+def op_merge_trees(case):
+    return None, lambda: merge_trees(Node("Base"), case.tree), None
+
+
+def op_hash(case):
+    tree = build_tree(case.shape, case.count, case.seed)
+
+    def setup():
+        for node, _ in iter_tree_preorder(tree):
+            node._hash = node._content_hash = None
+    return setup, lambda: subtree_hash(tree), None
+
+
+def op_plan_merge(case):
+    path = case.fixture("lts")
+    state = {}
+
+    def setup():
+        state["base"] = build_tree(case.shape, case.count, case.seed)
+        state["other"] = load_tree_from_custom_format(path)  # Brings its stored digests
+    return setup, lambda: plan_merge(state["base"], state["other"]), None
+
+
+def op_open_tab(case):
+    app = _qt_application()
+    from interface import DocumentTab
+    tabs = []
+
+    def setup():
+        while tabs:
+            tabs.pop().deleteLater()
+        app.processEvents()
+
+    def run():
+        tabs.append(DocumentTab(case.tree, None))
+        app.processEvents()
+    return setup, run, None
+
+
+def op_model_reveal(case):
+    app = _qt_application()
+    from model import NodeTreeModel
+    nodes = [node for node, _ in iter_tree_preorder(case.tree)]
+    targets = random.Random(case.seed).sample(nodes, min(REVEAL_NODES, len(nodes)))
+    state = {}
+
+    def setup():
+        state["model"] = NodeTreeModel(case.tree)
+
+    def run():
+        model = state["model"]
+        for node in targets:
+            model.index_for_node(node)
+        app.processEvents()
+    return setup, run, None
+
+
+_qt_app = None
+
+def _qt_application():
+    global _qt_app
+    from PyQt5.QtWidgets import QApplication
+    if _qt_app is None:
+        _qt_app = QApplication.instance() or QApplication([])
+    return _qt_app
+
+
+OPERATIONS = {
+    "save_lts": op_save_lts,
+    "save_lts_incremental": op_save_lts_incremental,
+    "load_lts": op_load_lts,
+    "load_lts_content": op_load_lts_content,
+    "save_json": op_save_json,
+    "load_json": op_load_json,
+    "import_ctd": op_import_ctd,
+    "import_ncd": op_import_ncd,
+    "compact_markup": op_compact_markup,
+    "copy": op_copy,
+    "merge_trees": op_merge_trees,
+    "hash": op_hash,
+    "plan_merge": op_plan_merge,
+    "open_tab": op_open_tab,
+    "model_reveal": op_model_reveal,
+}
+
+
+# --- Measuring ---
+def measure(case, operation, repeat):
+    """Returns the result record for one operation on one case."""
+    record = {"operation": operation, "shape": case.shape, "nodes": case.count}
+    try:
+        setup, run, file_name = OPERATIONS[operation](case)
+        times = []
+        for _ in range(repeat):
+            if setup is not None:
+                setup()
+            gc.collect()
+            start = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - start)
+        if setup is not None:
+            setup()
+        gc.collect()
+        tracemalloc.start()
+        before, _ = tracemalloc.get_traced_memory()
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    except Exception as e:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        record["error"] = f"{type(e).__name__}: {e}"
+        return record
+    seconds = min(times)
+    record.update({
+        "seconds": seconds,
+        "median_seconds": statistics.median(times),
+        "nodes_per_second": case.count / seconds if seconds else None,
+        "peak_mb": (peak - before) / 1e6,
+    })
+    if file_name is not None and os.path.exists(file_name):
+        size = os.path.getsize(file_name)
+        record["file_mb"] = size / 1e6
+        record["mb_per_second"] = size / 1e6 / seconds if seconds else None
+    return record
+
+
+def run_suite(sizes, shapes, operations, repeat, seed, report=print):
+    results = []
+    directory = tempfile.mkdtemp(prefix="lts-bench-")
+    try:
+        for shape in shapes:
+            for count in sizes:
+                case = Case(shape, count, seed, directory)
+                for operation in operations:
+                    record = measure(case, operation, repeat)
+                    results.append(record)
+                    report(record)
+                del case
+                gc.collect()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+# --- Baselines ---
+def _key(record):
+    return record["operation"], record["shape"], record["nodes"]
+
+
+def compare(results, baseline, threshold):
+    """Adds "baseline_ratio" to each result found in baseline; returns the regressed results."""
+    previous = {_key(record): record for record in baseline.get("results", []) if "seconds" in record}
+    regressions = []
+    for record in results:
+        old = previous.get(_key(record))
+        if old is None or "seconds" not in record or not old["seconds"]:
+            continue
+        record["baseline_ratio"] = record["seconds"] / old["seconds"]
+        if record["baseline_ratio"] > threshold and record["seconds"] >= NOISE_FLOOR_S:
+            regressions.append(record)
+    return regressions
+
+
+def format_record(record):
+    label = f"{record['operation']:<22} {record['shape']:<8} {record['nodes']:>9}"
+    if "error" in record:
+        return f"{label}  FAILED {record['error']}"
+    line = (f"{label}  {record['seconds'] * 1000:>10.1f} ms  {record['nodes_per_second'] or 0:>12,.0f} nodes/s"
+            f"  {record['peak_mb']:>8.1f} MB peak")
+    if "mb_per_second" in record:
+        line += f"  {record['mb_per_second'] or 0:>7.1f} MB/s"
+    if "baseline_ratio" in record:
+        line += f"  {record['baseline_ratio']:.2f}x baseline"
+    return line
+
+
+def write_json(file_name, data):
+    directory = os.path.dirname(file_name)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(file_name, "w") as f:
+        json.dump(data, f, indent=2)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--shapes", nargs="+", choices=SHAPES, default=list(SHAPES))
+    parser.add_argument("--only", nargs="+", choices=list(OPERATIONS), default=list(OPERATIONS), metavar="OPERATION")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Also store the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    results = run_suite(args.sizes, args.shapes, args.only, args.repeat, args.seed,
+                        report=lambda record: print(format_record(record), flush=True))
+    regressions = []
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        print(f"\nCompared with {args.baseline} ({baseline['meta']['date']}):")
+        for record in results:
+            if "baseline_ratio" in record:
+                print(format_record(record) + ("  REGRESSION" if record in regressions else ""))
+    data = {
+        "meta": {
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    write_json(args.output, data)
+    print(f"\nResults written to {args.output}")
+    if args.save_baseline:
+        write_json(args.baseline, data)
+        print(f"Baseline saved to {args.baseline}")
+    if regressions:
+        print(f"{len(regressions)} operation(s) slower than the baseline by more than {args.threshold:.2f}x")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,235 @@
+"""Converts or merges CherryTree, NoteCase and LTS documents without opening the editor.
+
+Usage: python convert.py convert PATTERN ... [--output-dir DIR] [--overwrite] [--compact-markup] [--jobs N]
+       python convert.py merge PATTERN ... --output FILE.lts [--overwrite] [--compact-markup] [--jobs N]
+
+Patterns are file names or globs ("**" matches subdirectories). convert
+writes each .ctd, .ncd or .lts input as an LTS file named after it, next
+to the input or in --output-dir; an existing .lts input is rewritten in the
+current format. merge appends the top-level branches of every input, in
+the order given, to the first one's tree and saves the result as --output.
+--compact-markup also rewrites notes saved as the editor's full HTML in
+the compact form it writes now.
+Files are parsed in parallel worker processes. PyQt5 is never imported, so
+this runs on machines without a display.
+"""
+import argparse
+import glob
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts"))
+
+from utility import (  # noqa: E402
+    load_tree_from_file, save_tree_to_custom_format, merge_trees, iter_tree_preorder, get_lts_source
+)
+from markup import compact_tree_markup  # noqa: E402
+
+INPUT_EXTENSIONS = (".ctd", ".ncd", ".lts")
+
+
+def expand_patterns(patterns):
+    """Returns (input files in order without duplicates, patterns matching no input file)."""
+    files = []
+    seen = set()
+    unmatched = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+        matches = [path for path in matches if os.path.isfile(path) and path.lower().endswith(INPUT_EXTENSIONS)]
+        if not matches:
+            unmatched.append(pattern)
+        for path in matches:
+            key = os.path.abspath(path)
+            if key not in seen:
+                seen.add(key)
+                files.append(path)
+    return files, unmatched
+
+
+def convert_file(file_name, output_name, compact_markup=False):
+    """Loads one document and saves it as LTS; returns (nodes, seconds). Runs in a worker process."""
+    start = time.perf_counter()
+    root = load_tree_from_file(file_name)
+    nodes = sum(1 for _ in iter_tree_preorder(root))
+    if compact_markup:
+        compact_tree_markup(root)
+    save_tree_to_custom_format(root, output_name)
+    return nodes, time.perf_counter() - start
+
+
+def _output_name(file_name, output_dir):
+    base_name = os.path.splitext(os.path.basename(file_name))[0] + ".lts"
+    return os.path.join(output_dir or os.path.dirname(file_name), base_name)
+
+
+def _run_conversions(jobs, workers, compact_markup=False):
+    """Runs convert_file for (file name, output name) pairs; yields (file name, output name, result or error)."""
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(convert_file, file_name, output_name, compact_markup): (file_name, output_name)
+                   for file_name, output_name in jobs}
+        for future in as_completed(futures):
+            file_name, output_name = futures[future]
+            try:
+                yield file_name, output_name, future.result()
+            except Exception as e:  # Reported per file; the rest of the batch carries on
+                yield file_name, output_name, e
+
+
+class Summary:
+    """Totals for the throughput report."""
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.files = 0
+        self.failed = 0
+        self.nodes = 0
+        self.input_bytes = 0
+
+    def add(self, file_name, nodes):
+        self.files += 1
+        self.nodes += nodes
+        self.input_bytes += os.path.getsize(file_name)
+
+    def report(self):
+        elapsed = time.perf_counter() - self.start
+        megabytes = self.input_bytes / 1e6
+        print(f"{self.files} file(s) done, {self.failed} failed in {elapsed:.2f} s: "
+              f"{self.nodes} nodes, {megabytes:.1f} MB read "
+              f"({self.files / elapsed:.1f} files/s, {self.nodes / elapsed:.0f} nodes/s, "
+              f"{megabytes / elapsed:.1f} MB/s)")
+
+
+def _print_result(summary, file_name, output_name, result):
+    if isinstance(result, Exception):
+        summary.failed += 1
+        print(f"FAILED {file_name}: {result}", file=sys.stderr)
+    else:
+        nodes, seconds = result
+        summary.add(file_name, nodes)
+        target = f" -> {output_name}" if output_name else ""
+        print(f"ok     {file_name}{target} ({nodes} nodes, {seconds:.2f} s)")
+
+
+def convert(files, output_dir=None, overwrite=False, workers=None, compact_markup=False):
+    """Converts every file to LTS; returns the number of failures."""
+    summary = Summary()
+    jobs = []
+    outputs = set()
+    for file_name in files:
+        output_name = _output_name(file_name, output_dir)
+        key = os.path.abspath(output_name)
+        if key in outputs:
+            summary.failed += 1
+            print(f"FAILED {file_name}: another input is also converted to {output_name}", file=sys.stderr)
+        elif os.path.exists(output_name) and not overwrite:
+            summary.failed += 1
+            print(f"FAILED {file_name}: {output_name} exists (use --overwrite)", file=sys.stderr)
+        else:
+            outputs.add(key)
+            jobs.append((file_name, output_name))
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    for file_name, output_name, result in _run_conversions(jobs, workers, compact_markup):
+        _print_result(summary, file_name, output_name, result)
+    summary.report()
+    return summary.failed
+
+
+def merge(files, output_name, overwrite=False, workers=None, compact_markup=False):
+    """Merges every file into one LTS document; returns the number of failures.
+
+    CherryTree and NoteCase inputs are converted to temporary LTS files in
+    parallel; those and the LTS inputs are then loaded lazily, so only
+    their indexes are read before the merged file is written.
+    """
+    if not output_name.endswith(".lts"):
+        output_name += ".lts"
+    summary = Summary()
+    if os.path.exists(output_name) and not overwrite:
+        print(f"FAILED {output_name} exists (use --overwrite)", file=sys.stderr)
+        return 1
+    with tempfile.TemporaryDirectory(prefix="lts-merge-", ignore_cleanup_errors=True) as temp_dir:
+        sources = {}  # Input -> LTS file to load it from
+        jobs = []
+        for index, file_name in enumerate(files):
+            if file_name.lower().endswith(".lts"):
+                sources[file_name] = file_name
+            else:
+                jobs.append((file_name, os.path.join(temp_dir, f"{index}.lts")))
+        for file_name, temp_name, result in _run_conversions(jobs, workers, compact_markup):
+            if not isinstance(result, Exception):
+                sources[file_name] = temp_name
+            _print_result(summary, file_name, None, result)
+
+        merged = None
+        for file_name in files:
+            if file_name not in sources:
+                continue
+            start = time.perf_counter()
+            try:
+                root = load_tree_from_file(sources[file_name])
+            except (IOError, ValueError) as e:
+                summary.failed += 1
+                print(f"FAILED {file_name}: {e}", file=sys.stderr)
+                continue
+            if sources[file_name] == file_name:
+                _print_result(summary, file_name, None,
+                              (sum(1 for _ in iter_tree_preorder(root)), time.perf_counter() - start))
+            if merged is None:
+                merged = root
+            else:
+                merge_trees(merged, root)
+        if merged is None:
+            summary.failed = summary.failed or 1
+            print("Nothing to merge", file=sys.stderr)
+        else:
+            if compact_markup:
+                notes, before, after = compact_tree_markup(merged)
+                print(f"Compacted {notes} notes, {before - after:,} characters smaller")
+            try:
+                save_tree_to_custom_format(merged, output_name)
+            except IOError as e:
+                summary.failed += 1
+                print(f"FAILED {output_name}: {e}", file=sys.stderr)
+            else:
+                print(f"Merged {summary.files} file(s) into {output_name}")
+        merged = root = None
+        for source_name in sources.values():
+            get_lts_source(source_name).close()  # So the temporary directory can be removed on Windows
+    summary.report()
+    return summary.failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    convert_parser = commands.add_parser("convert", help="Write each input as an LTS file")
+    convert_parser.add_argument("patterns", nargs="+", metavar="PATTERN")
+    convert_parser.add_argument("--output-dir", help="Directory for the LTS files (default: next to each input)")
+    merge_parser = commands.add_parser("merge", help="Merge every input into one LTS file")
+    merge_parser.add_argument("patterns", nargs="+", metavar="PATTERN")
+    merge_parser.add_argument("--output", required=True, help="LTS file to write")
+    for command_parser in (convert_parser, merge_parser):
+        command_parser.add_argument("--overwrite", action="store_true", help="Replace existing output files")
+        command_parser.add_argument("--compact-markup", action="store_true",
+                                    help="Rewrite notes holding the editor's full HTML in the compact form")
+        command_parser.add_argument("--jobs", type=int, default=None,
+                                    help="Worker processes (default: one per CPU core)")
+    args = parser.parse_args(argv)
+
+    files, unmatched = expand_patterns(args.patterns)
+    for pattern in unmatched:
+        print(f"No .ctd, .ncd or .lts files match '{pattern}'", file=sys.stderr)
+    if not files:
+        return 1
+    if args.command == "convert":
+        failed = convert(files, args.output_dir, args.overwrite, args.jobs, args.compact_markup)
+    else:
+        failed = merge(files, args.output, args.overwrite, args.jobs, args.compact_markup)
+    return 1 if failed or unmatched else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,19 +1,54 @@
-import os
-import subprocess
-import sys
-from PyQt5.QtWidgets import QApplication
-from scripts.interface import MainWindow  # Corrected import path
-
-def main():
-    try:
-        print("Launching LiteStone...")
-        app = QApplication(sys.argv)
-        window = MainWindow()
-        window.show()
-        sys.exit(app.exec_())
-    except Exception as e:
-        print(f"An error occurred while launching the application: {e}")
-        sys.exit(1)
-
-if __name__ == "__main__":
-    main()
\ No newline at end of file
+import os
+import sys
+import time
+
+STARTED = time.perf_counter()
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts"))
+
+from startup import StartupProfile, STARTUP_BUDGET_MS  # noqa: E402
+
+def main():
+    # --startup-profile [--startup-budget MS]: start, print the timing breakdown once
+    # the settings are applied and exit with status 1 if that took longer than the budget
+    profile = None
+    budget_ms = STARTUP_BUDGET_MS
+    if "--startup-profile" in sys.argv:
+        sys.argv.remove("--startup-profile")
+        profile = StartupProfile(STARTED)
+        profile.imports.install()
+    if "--startup-budget" in sys.argv:
+        position = sys.argv.index("--startup-budget")
+        budget_ms = float(sys.argv[position + 1])
+        del sys.argv[position:position + 2]
+    try:
+        print("Launching LiteStone...")
+        # Imported here so the profile can time them
+        from PyQt5.QtCore import QEventLoop
+        from PyQt5.QtWidgets import QApplication
+        if profile:
+            profile.mark("import PyQt5")
+        from interface import MainWindow
+        if profile:
+            profile.mark("import interface")
+        app = QApplication(sys.argv)
+        if profile:
+            profile.mark("QApplication")
+        window = MainWindow()
+        if profile:
+            profile.mark("MainWindow()")
+            window.first_painted.connect(lambda: profile.mark("first paint"))
+            window.startup_finished.connect(lambda: profile.mark("settings applied"))
+        window.show()
+        if profile:
+            profile.mark("show()")
+            while not window.startup_done:
+                app.processEvents(QEventLoop.WaitForMoreEvents)
+            profile.imports.uninstall()
+            sys.exit(0 if profile.report(budget_ms) else 1)
+        sys.exit(app.exec_())
+    except Exception as e:
+        print(f"An error occurred while launching the application: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
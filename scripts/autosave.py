@@ -0,0 +1,154 @@
+import os
+import queue
+import threading
+import weakref
+from utility import RECOVERY_FORMAT_VERSION, file_stamp, write_recovery_lines, load_recovery
+
+RECOVERY_DIR = os.path.join("data", "recovery")
+RECOVERY_SUFFIX = ".recovery"
+
+
+class _TabRecovery:
+    """Autosave state of one document: its recovery file and the ids given to new nodes."""
+    def __init__(self, file_name, header):
+        self.file_name = file_name
+        self.header = header
+        self.has_base = header["base"] is not None
+        self.new_ids = weakref.WeakKeyDictionary()  # Node -> id, for nodes the base file does not have
+        self.next_id = 0
+
+    @classmethod
+    def start(cls, file_name, root, file_path, title):
+        base = file_stamp(file_path) if file_path and os.path.exists(file_path) else None
+        state = cls(file_name, {
+            "version": RECOVERY_FORMAT_VERSION,
+            "file_path": file_path if base is not None else None,
+            "title": title,
+            "base": base,
+            "root": None,
+        })
+        state.header["root"] = state.node_id(root)
+        return state
+
+    def has_id(self, node):
+        return (self.has_base and node._file_id is not None) or node in self.new_ids
+
+    def node_id(self, node):
+        if self.has_base and node._file_id is not None:
+            return f"f{node._file_id}"
+        node_id = self.new_ids.get(node)
+        if node_id is None:
+            node_id = self.new_ids[node] = f"n{self.next_id}"
+            self.next_id += 1
+        return node_id
+
+
+class Autosaver:
+    """Writes crash-recovery snapshots of modified documents on a background thread.
+
+    Each snapshot holds only the nodes changed since the previous one (plus
+    new nodes below them), gathered on the GUI thread; encoding and writing
+    happen on the worker. A document without a base file on disk is written
+    in full the first time.
+    """
+    def __init__(self, directory=RECOVERY_DIR):
+        self.directory = directory
+        self._states = {}  # Tab key -> _TabRecovery
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def recovery_files(self):
+        """Recovery files left behind by a previous session."""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                      if name.endswith(RECOVERY_SUFFIX))
+
+    def snapshot(self, key, root, file_path, title, changed_nodes):
+        """Records changed_nodes of the document identified by key."""
+        state = self._states.get(key)
+        first = state is None
+        if first:
+            file_name = os.path.join(self.directory, key + RECOVERY_SUFFIX)
+            state = self._states[key] = _TabRecovery.start(file_name, root, file_path, title)
+            if not state.has_base:
+                changed_nodes = [root]  # Everything is new
+        elif not changed_nodes:
+            return
+        entries = []
+        seen = set()
+        stack = list(changed_nodes)
+        while stack:
+            node = stack.pop()
+            if id(node) in seen:
+                continue
+            seen.add(id(node))
+            node_id = state.node_id(node)
+            if node_id.startswith("f") and not node.is_content_loaded():
+                content = None  # Unchanged since it was read from the base file
+            else:
+                content = node.content if node.is_content_loaded() else node.content_bytes().decode('utf-8')
+            children = node.children
+            stack.extend(child for child in children if not state.has_id(child))  # Not recorded yet
+            entries.append([node_id, node.name, content, [state.node_id(child) for child in children]])
+        lines = ([state.header] if first else []) + [entries]
+        self._submit(write_recovery_lines, state.file_name, lines, first)
+
+    def adopt(self, key, file_name, header, new_nodes):
+        """Continues a restored document's recovery file, keeping the ids it already uses."""
+        state = _TabRecovery(file_name, header)
+        for node_id, node in new_nodes.items():
+            state.new_ids[node] = node_id
+            state.next_id = max(state.next_id, int(node_id[1:]) + 1)
+        self._states[key] = state
+
+    def discard(self, key):
+        """Drops a document's recovery file, e.g. once it has been saved or closed."""
+        state = self._states.pop(key, None)
+        if state is not None:
+            self._submit(_remove_file, state.file_name)
+
+    def discard_file(self, file_name):
+        self._submit(_remove_file, file_name)
+
+    def wait(self):
+        """Blocks until every queued write has reached the disk."""
+        self._queue.join()
+
+    def _submit(self, func, *args):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="autosave", daemon=True)
+            self._thread.start()
+        self._queue.put((func, args))
+
+    def _run(self):
+        while True:
+            func, args = self._queue.get()
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                func(*args)
+            except (IOError, OSError) as e:
+                print(f"Autosave failed: {e}")
+            finally:
+                self._queue.task_done()
+
+
+def _remove_file(file_name):
+    if os.path.exists(file_name):
+        os.remove(file_name)
+
+
+def load_recovery_files(file_names, progress=None):
+    """Loads each recovery file; returns (file name, load_recovery result or the error) pairs."""
+    results = []
+    for file_name in file_names:
+        try:
+            results.append((file_name, load_recovery(file_name, progress)))
+        except (IOError, ValueError) as e:
+            results.append((file_name, e))
+    return results
+
+
+def recovery_key(file_name):
+    """The document key a recovery file was written under."""
+    return os.path.basename(file_name)[:-len(RECOVERY_SUFFIX)]
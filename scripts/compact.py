@@ -0,0 +1,292 @@
+import weakref
+from array import array
+from utility import Node, TreeNode, _attach, iter_tree_preorder
+
+NO_NODE = -1
+
+
+class CompactTree:
+    """Array-backed store for a whole document tree.
+
+    Each node is a row index. Links are kept in int32 columns (parent,
+    first child, last child, next sibling) and names and content are UTF-8
+    slices of one shared text buffer, so a node costs a few dozen bytes plus
+    its text instead of a Python object, a dict and a list.
+    Editing a name or content appends the new text; compact_text() drops the
+    stale bytes.
+    """
+    def __init__(self):
+        self.parent = array('i')
+        self.first_child = array('i')
+        self.last_child = array('i')
+        self.next_sibling = array('i')
+        self.name_offset = array('q')
+        self.name_length = array('I')
+        self.content_offset = array('q')
+        self.content_length = array('I')
+        self.text = bytearray()
+        self.stale_bytes = 0
+        self.root_index = NO_NODE
+        self._handles = weakref.WeakValueDictionary()  # Row index -> CompactNode while one is held
+
+    def __len__(self):
+        return len(self.parent)
+
+    # --- Rows ---
+    def add_row(self, name, content=""):
+        """Adds an unlinked node and returns its index."""
+        index = len(self.parent)
+        for column in (self.parent, self.first_child, self.last_child, self.next_sibling):
+            column.append(NO_NODE)
+        offset, length = self._store_text(name)
+        self.name_offset.append(offset)
+        self.name_length.append(length)
+        offset, length = self._store_text(content)
+        self.content_offset.append(offset)
+        self.content_length.append(length)
+        if self.root_index == NO_NODE:
+            self.root_index = index
+        return index
+
+    def _store_text(self, text):
+        data = text.encode('utf-8')
+        offset = len(self.text)
+        self.text += data
+        return offset, len(data)
+
+    def name(self, index):
+        offset = self.name_offset[index]
+        return self.text[offset:offset + self.name_length[index]].decode('utf-8')
+
+    def set_name(self, index, name):
+        self.stale_bytes += self.name_length[index]
+        self.name_offset[index], self.name_length[index] = self._store_text(name)
+        self._invalidate_hashes(index)
+
+    def content_bytes(self, index):
+        offset = self.content_offset[index]
+        return bytes(self.text[offset:offset + self.content_length[index]])
+
+    def content(self, index):
+        return self.content_bytes(index).decode('utf-8')
+
+    def set_content(self, index, content):
+        self.stale_bytes += self.content_length[index]
+        self.content_offset[index], self.content_length[index] = self._store_text(content)
+        self._invalidate_hashes(index, content=True)
+
+    # --- Links ---
+    def child_indices(self, index):
+        children = []
+        child = self.first_child[index]
+        while child != NO_NODE:
+            children.append(child)
+            child = self.next_sibling[child]
+        return children
+
+    def link(self, parent, child, position=None):
+        """Makes child the position-th child of parent (appended when position is None)."""
+        self._invalidate_hashes(parent)
+        self.parent[child] = parent
+        if position is None or self.first_child[parent] == NO_NODE:
+            position = None
+        if position is None:
+            last = self.last_child[parent]
+            if last == NO_NODE:
+                self.first_child[parent] = child
+            else:
+                self.next_sibling[last] = child
+            self.last_child[parent] = child
+            self.next_sibling[child] = NO_NODE
+            return
+        previous = NO_NODE
+        following = self.first_child[parent]
+        for _ in range(position):
+            if following == NO_NODE:
+                break
+            previous, following = following, self.next_sibling[following]
+        self.next_sibling[child] = following
+        if previous == NO_NODE:
+            self.first_child[parent] = child
+        else:
+            self.next_sibling[previous] = child
+        if following == NO_NODE:
+            self.last_child[parent] = child
+
+    def unlink(self, child):
+        parent = self.parent[child]
+        if parent == NO_NODE:
+            return
+        self._invalidate_hashes(parent)
+        previous = NO_NODE
+        current = self.first_child[parent]
+        while current != child:
+            previous, current = current, self.next_sibling[current]
+        following = self.next_sibling[child]
+        if previous == NO_NODE:
+            self.first_child[parent] = following
+        else:
+            self.next_sibling[previous] = following
+        if following == NO_NODE:
+            self.last_child[parent] = previous
+        self.parent[child] = NO_NODE
+        self.next_sibling[child] = NO_NODE
+
+    def _invalidate_hashes(self, index, content=False):
+        """Marks the digests cached on live handles from index up to the root stale.
+
+        Handles come and go, so unlike Node this always walks the whole path.
+        """
+        if not self._handles:
+            return
+        if content:
+            handle = self._handles.get(index)
+            if handle is not None:
+                handle._content_hash = None
+        while index != NO_NODE:
+            handle = self._handles.get(index)
+            if handle is not None:
+                handle._hash = None
+            index = self.parent[index]
+
+    # --- Handles and conversion ---
+    def handle(self, index):
+        handle = self._handles.get(index)
+        if handle is None:
+            handle = CompactNode(self, index)
+            self._handles[index] = handle
+        return handle
+
+    @property
+    def root(self):
+        return self.handle(self.root_index) if self.root_index != NO_NODE else None
+
+    def import_subtree(self, node):
+        """Copies a Node subtree into the store without recursion; returns the new root row."""
+        rows = {}
+        top = NO_NODE
+        for current, parent in iter_tree_preorder(node):
+            index = self.add_row(current.name, current.content)
+            rows[id(current)] = index
+            if parent is None:
+                top = index
+            else:
+                self.link(rows[id(parent)], index)
+        return top
+
+    @classmethod
+    def from_node(cls, root):
+        tree = cls()
+        tree.root_index = tree.import_subtree(root)
+        return tree
+
+    def to_node(self, index=None):
+        """Builds a Node subtree from the row at index (default: the root)."""
+        if index is None:
+            index = self.root_index
+        top = Node(self.name(index), self.content(index))
+        stack = [(index, top)]
+        while stack:
+            row, node = stack.pop()
+            for child in self.child_indices(row):
+                child_node = Node(self.name(child), self.content(child))
+                _attach(node, child_node)
+                stack.append((child, child_node))
+        return top
+
+    def compact_text(self):
+        """Rewrites the text buffer without the bytes left behind by edits."""
+        text = bytearray()
+        for offsets, lengths in ((self.name_offset, self.name_length),
+                                 (self.content_offset, self.content_length)):
+            for index in range(len(offsets)):
+                offset = offsets[index]
+                offsets[index] = len(text)
+                text += self.text[offset:offset + lengths[index]]
+        self.text = text
+        self.stale_bytes = 0
+
+    def nbytes(self):
+        """Approximate memory held by the columns and the text buffer."""
+        columns = (self.parent, self.first_child, self.last_child, self.next_sibling,
+                   self.name_offset, self.name_length, self.content_offset, self.content_length)
+        return sum(column.itemsize * len(column) for column in columns) + len(self.text)
+
+
+class CompactNode(TreeNode):
+    """Thin handle to one row of a CompactTree, usable where a Node is expected."""
+    __slots__ = ("tree", "index", "_file_id", "_hash", "_content_hash", "__weakref__")
+    _content_ref = None  # Content always lives in the store's text buffer
+
+    def __init__(self, tree, index):
+        self.tree = tree
+        self.index = index
+        self._file_id = None
+        self._hash = None
+        self._content_hash = None
+
+    def __eq__(self, other):
+        return isinstance(other, CompactNode) and other.tree is self.tree and other.index == self.index
+
+    def __hash__(self):
+        return hash((id(self.tree), self.index))
+
+    @property
+    def name(self):
+        return self.tree.name(self.index)
+
+    @name.setter
+    def name(self, value):
+        self.tree.set_name(self.index, value)
+
+    @property
+    def content(self):
+        return self.tree.content(self.index)
+
+    @content.setter
+    def content(self, value):
+        self.tree.set_content(self.index, value)
+
+    def is_content_loaded(self):
+        return True
+
+    def content_bytes(self):
+        return self.tree.content_bytes(self.index)
+
+    @property
+    def parent(self):
+        parent = self.tree.parent[self.index]
+        return self.tree.handle(parent) if parent != NO_NODE else None
+
+    @property
+    def children(self):
+        return [self.tree.handle(child) for child in self.tree.child_indices(self.index)]
+
+    def add_child(self, child):
+        return self.insert_child(None, child)
+
+    def insert_child(self, index, child):
+        """Links child here; a Node from outside the store is copied in first."""
+        if isinstance(child, CompactNode) and child.tree is self.tree:
+            self.tree.unlink(child.index)
+            row = child.index
+        else:
+            row = self.tree.import_subtree(child)
+        self.tree.link(self.index, row, index)
+        return self.tree.handle(row)
+
+    def move_child(self, old_index, new_index):
+        child = self.tree.child_indices(self.index)[old_index]
+        self.tree.unlink(child)
+        self.tree.link(self.index, child, new_index)
+
+    def remove_child(self, child):
+        if isinstance(child, CompactNode) and child.tree is self.tree and child.parent == self:
+            self.tree.unlink(child.index)
+
+    def copy(self):
+        """Returns the subtree as a detached Node tree."""
+        return self.tree.to_node(self.index)
+
+    def to_dict(self):
+        return self.copy().to_dict()
@@ -0,0 +1,242 @@
+import html
+import re
+from collections import OrderedDict
+from PyQt5.QtCore import QBuffer, QByteArray, QIODevice, QTimer, QUrl, pyqtSignal
+from PyQt5.QtGui import QImage, QKeySequence, QTextCursor, QTextDocument
+from PyQt5.QtWidgets import QTextEdit, QPlainTextEdit, QWidget, QLabel, QPushButton, QVBoxLayout, QHBoxLayout
+from utility import BLOB_SCHEME, blob_store
+
+IMAGE_CACHE_BYTES = 64 << 20  # Decoded images kept across note switches
+DOCUMENT_CACHE_SIZE = 8  # Laid-out documents of recently shown notes kept per tab
+DOCUMENT_CACHE_CHARS = 8 << 20  # ... as long as their HTML adds up to no more than this (~20 bytes each laid out)
+LARGE_NOTE_CHARS = 1 << 20  # Notes longer than this open as plain text until rich editing is asked for
+PLAIN_TEXT_CHUNK_CHARS = 128 << 10  # HTML converted and added to the large note view per event loop pass
+
+
+class ImageCache:
+    """LRU cache of decoded images, bounded by their size in memory."""
+    def __init__(self, max_bytes=IMAGE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._images = OrderedDict()  # Blob key -> QImage, least recently used first
+
+    def get(self, key):
+        image = self._images.get(key)
+        if image is not None:
+            self._images.move_to_end(key)
+        return image
+
+    def put(self, key, image):
+        previous = self._images.pop(key, None)
+        if previous is not None:
+            self.total_bytes -= previous.sizeInBytes()
+        self._images[key] = image
+        self.total_bytes += image.sizeInBytes()
+        while self.total_bytes > self.max_bytes and len(self._images) > 1:
+            _, evicted = self._images.popitem(last=False)
+            self.total_bytes -= evicted.sizeInBytes()
+
+
+image_cache = ImageCache()
+
+
+def load_blob_image(key):
+    """Returns the decoded image for a blob key, or None if it is missing or unreadable."""
+    image = image_cache.get(key)
+    if image is None:
+        data = blob_store.get(key)
+        if data is None:
+            return None
+        image = QImage.fromData(data)
+        if image.isNull():
+            return None
+        image_cache.put(key, image)
+    return image
+
+
+def _load_blob_resource(resource_type, url):
+    if resource_type == QTextDocument.ImageResource and url.scheme() == "blob":
+        return load_blob_image(url.path())
+    return None
+
+
+def store_image(image):
+    """Encodes an image as PNG into the blob store and returns the URL to reference it by."""
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QIODevice.WriteOnly)
+    image.save(buffer, "PNG")
+    key = blob_store.add(bytes(data))
+    image_cache.put(key, image)
+    return BLOB_SCHEME + key
+
+
+class NoteEditor(QTextEdit):
+    """Rich text editor that keeps images in the blob store instead of inline base64.
+
+    Blob images are only decoded when the document lays them out, and decoded
+    images are shared through image_cache. The undo and redo keys are passed
+    on as signals, so the document's undo history also covers typing.
+    """
+    undo_requested = pyqtSignal()
+    redo_requested = pyqtSignal()
+
+    def keyPressEvent(self, event):
+        if event.matches(QKeySequence.Undo):
+            self.undo_requested.emit()
+        elif event.matches(QKeySequence.Redo):
+            self.redo_requested.emit()
+        else:
+            super().keyPressEvent(event)
+
+    def loadResource(self, resource_type, url):
+        image = _load_blob_resource(resource_type, url)
+        if image is not None:
+            return image
+        return super().loadResource(resource_type, url)
+
+    def canInsertFromMimeData(self, source):
+        return source.hasImage() or super().canInsertFromMimeData(source)
+
+    def insertFromMimeData(self, source):
+        if source.hasImage():
+            image = QImage(source.imageData())
+            if not image.isNull():
+                url = store_image(image)
+                self.document().addResource(QTextDocument.ImageResource, QUrl(url), image)
+                self.textCursor().insertImage(url)
+                return
+        super().insertFromMimeData(source)
+
+
+# --- Note documents ---
+
+class NoteDocument(QTextDocument):
+    """Document for one note, created outside the editor so it can be kept and shown again."""
+    def loadResource(self, resource_type, url):
+        image = _load_blob_resource(resource_type, url)
+        if image is not None:
+            return image
+        return super().loadResource(resource_type, url)
+
+
+def new_note_document(content, font):
+    """Parses a note's HTML into a NoteDocument for NoteEditor.setDocument."""
+    document = NoteDocument()
+    document.setDefaultFont(font)
+    document.setUndoRedoEnabled(False)  # Edits are undone through the tab's undo log
+    document.setHtml(content)
+    return document
+
+
+class DocumentCache:
+    """LRU of the documents of recently shown notes, so showing one again skips parsing and layout.
+
+    An entry is used only while its node still holds the very content string
+    the document was built from (or last saved to); any other change to the
+    note makes it stale. The newest entry, normally the one on screen, is
+    never evicted.
+    """
+    def __init__(self, max_documents=DOCUMENT_CACHE_SIZE, max_chars=DOCUMENT_CACHE_CHARS):
+        self.max_documents = max_documents
+        self.max_chars = max_chars
+        self.total_chars = 0
+        self._documents = OrderedDict()  # Node -> (content, document), least recently used first
+
+    def get(self, node, content):
+        entry = self._documents.get(node)
+        if entry is None:
+            return None
+        if entry[0] is not content:
+            self.discard(node)
+            return None
+        self._documents.move_to_end(node)
+        return entry[1]
+
+    def put(self, node, content, document):
+        self.discard(node)
+        self._documents[node] = (content, document)
+        self.total_chars += len(content)
+        while len(self._documents) > 1 and (
+                len(self._documents) > self.max_documents or self.total_chars > self.max_chars):
+            _, (evicted, _) = self._documents.popitem(last=False)
+            self.total_chars -= len(evicted)
+
+    def discard(self, node):
+        entry = self._documents.pop(node, None)
+        if entry is not None:
+            self.total_chars -= len(entry[0])
+
+    def clear(self):
+        self._documents.clear()
+        self.total_chars = 0
+
+
+_MARKUP_BLOCK = re.compile(r'<(head|style|script)\b.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+_LINE_END = re.compile(r'<br\s*/?>|</(p|div|li|tr|pre|h[1-6])\s*>', re.IGNORECASE)
+_TAG = re.compile(r'<[^>]*>')
+
+
+def _plain_text_of_markup(markup):
+    """Text of a piece of note HTML with one line per paragraph."""
+    return html.unescape(_TAG.sub('', _LINE_END.sub('\n', markup)))
+
+
+class LargeNoteView(QWidget):
+    """Read-only plain text view of a large note, converted and filled a chunk per event loop pass.
+
+    Parsing and laying out megabytes of HTML blocks the window for seconds;
+    plain text is shown right away and the rest streams in while the window
+    stays responsive. rich_text_requested asks for the full editor instead.
+    """
+    rich_text_requested = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._html = ""
+        self._offset = 0
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self._append_chunk)
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        bar = QHBoxLayout()
+        self.label = QLabel()
+        bar.addWidget(self.label, 1)
+        self.edit_button = QPushButton("Edit as Rich Text")
+        self.edit_button.setToolTip("Load the whole note into the editor; this may take a while")
+        self.edit_button.clicked.connect(self.rich_text_requested)
+        bar.addWidget(self.edit_button)
+        layout.addLayout(bar)
+        self.text_view = QPlainTextEdit()
+        self.text_view.setReadOnly(True)
+        self.text_view.setUndoRedoEnabled(False)
+        layout.addWidget(self.text_view, 1)
+
+    def show_html(self, content):
+        """Starts showing the plain text of a note's HTML."""
+        self.stop()
+        self.text_view.clear()
+        self._html = _MARKUP_BLOCK.sub('', content)
+        self.label.setText(f"Large note ({len(content) / 1e6:.1f} MB) shown as plain text, read-only.")
+        self._append_chunk()
+        if self._offset < len(self._html):
+            self._timer.start(0)
+
+    def is_loading(self):
+        return self._timer.isActive()
+
+    def stop(self):
+        self._timer.stop()
+        self._html = ""
+        self._offset = 0
+
+    def _append_chunk(self):
+        # Chunks end just after a '>', so no tag or character reference is cut in two
+        end = self._html.find('>', self._offset + PLAIN_TEXT_CHUNK_CHARS) + 1 or len(self._html)
+        cursor = QTextCursor(self.text_view.document())
+        cursor.movePosition(QTextCursor.End)
+        cursor.insertText(_plain_text_of_markup(self._html[self._offset:end]))
+        self._offset = end
+        if self._offset >= len(self._html):
+            self._timer.stop()
+            self._html = ""
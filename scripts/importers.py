@@ -0,0 +1,190 @@
+import os
+import sqlite3
+import threading
+import xml.etree.ElementTree as ET
+from instrument import timed
+from utility import Node, OperationCancelled, PROGRESS_NODES_STEP, _ProgressReader, _attach, _report
+
+# Imported by load_tree_from_file the first time a CherryTree or NoteCase
+# file is opened, so starting the editor does not load the XML and SQLite
+# modules.
+
+# CherryTree Importer
+@timed
+def import_cherrytree(file_name, progress=None):
+    """Imports a CherryTree document (.ctd) into the application's Node structure.
+
+    The XML is streamed with iterparse and each element is dropped as soon as it
+    has been turned into a Node, so the DOM is never held in memory; an explicit
+    stack replaces recursion so nesting depth is unlimited.
+    """
+    app_root_node = Node("Imported CherryTree") 
+    node_stack = [app_root_node]  # Open <node> elements map to these Nodes
+    element_stack = []  # Open XML elements, for detaching finished children
+    has_content = [True]  # Whether each open Node already has its content
+    try:
+        with open(file_name, "rb") as f:
+            source = f if progress is None else _ProgressReader(f, os.path.getsize(file_name), progress)
+            for event, element in ET.iterparse(source, events=("start", "end")):
+                if event == "start":
+                    if element.tag == "node" and len(element_stack) == len(node_stack):
+                        # Only <node> elements nested directly in the root or another <node>
+                        rich_text_content = element.get("rich_text", "")
+                        app_node = Node(element.get("name", "Untitled"), rich_text_content)
+                        _attach(node_stack[-1], app_node)
+                        node_stack.append(app_node)
+                        has_content.append(bool(rich_text_content))
+                    element_stack.append(element)
+                    continue
+                element_stack.pop()
+                if element.tag == "node" and len(element_stack) == len(node_stack) - 1:
+                    node_stack.pop()
+                    has_content.pop()
+                elif (element.tag == "rich_text" and len(element_stack) == len(node_stack)
+                      and not has_content[-1] and element.text):
+                    node_stack[-1]._content = element.text  # Not an edit, so set without recording it
+                    has_content[-1] = True
+                element.clear()
+                if element_stack:
+                    del element_stack[-1][-1]  # A finished element is always its parent's last child
+    except FileNotFoundError:
+        raise FileNotFoundError(f"CherryTree file not found: {file_name}")
+    except ET.ParseError:
+        raise ValueError(f"Invalid XML in CherryTree file: {file_name}")
+    return app_root_node
+
+# NoteCase Importer
+NOTECASE_BATCH_SIZE = 500  # Stays under SQLite's default limit of 999 bound parameters
+
+
+class NoteCaseContentSource:
+    """Reads node content on demand from a NoteCase SQLite file, by node id."""
+    def __init__(self, file_name, content_column):
+        self.file_name = file_name
+        self.content_column = content_column
+        self._conn = None
+        self._lock = threading.Lock()  # Saves read content from a worker thread
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.file_name, check_same_thread=False)
+        return self._conn
+
+    def read_content(self, key):
+        return self.read_many_content([key]).get(key, "")
+
+    def read_bytes(self, key):
+        return self.read_content(key).encode('utf-8')
+
+    def read_many_content(self, keys):
+        """Fetches content for many node ids with batched IN (...) queries."""
+        contents = {}
+        keys = list(keys)
+        with self._lock:
+            cursor = self._connection().cursor()
+            for start in range(0, len(keys), NOTECASE_BATCH_SIZE):
+                batch = keys[start:start + NOTECASE_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                cursor.execute(
+                    f"SELECT id, {self.content_column} FROM nodes WHERE id IN ({placeholders})", batch
+                )
+                for node_id, content_data in cursor:
+                    contents[node_id] = str(content_data if content_data is not None else "")
+        return contents
+
+    def read_many_bytes(self, keys):
+        return {key: content.encode('utf-8') for key, content in self.read_many_content(keys).items()}
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def __deepcopy__(self, memo):
+        return self  # Sources are shared, read-only handles
+
+    def __del__(self):
+        self.close()
+
+
+@timed
+def import_notecase(file_name, progress=None, lazy=True):
+    """Imports a NoteCase document (.ncd) into the application's Node structure.
+
+    Rows are streamed from the cursor and linked to their parents in a single
+    pass. With lazy=True only id, parent_id and title are read; each node's
+    content is fetched from the database the first time it is needed.
+    """
+    conn = None
+    try:
+        if not os.path.exists(file_name):
+            raise FileNotFoundError(file_name)
+        conn = sqlite3.connect(file_name)
+        cursor = conn.cursor()
+        
+        # Check if nodes table exists
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='nodes'")
+        if not cursor.fetchone():
+            raise ValueError("No 'nodes' table found in NoteCase database")
+        
+        content_column = None
+        for column in ("html_content", "rtf_content"):
+            try:
+                cursor.execute(f"SELECT id, parent_id, title, {column} FROM nodes LIMIT 0")
+                content_column = column
+                break
+            except sqlite3.OperationalError as e_inner:
+                column_error = e_inner
+        if content_column is None:
+            raise ValueError(f"Could not find expected table/columns in NoteCase DB: {column_error}")
+
+        (total,) = cursor.execute("SELECT COUNT(*) FROM nodes").fetchone()
+        if not total:
+            raise ValueError("NoteCase database is empty")
+
+        app_root_node = Node("Imported NoteCase")
+        source = NoteCaseContentSource(file_name, content_column) if lazy else None
+        db_nodes_map = {}
+        pending_children = {}  # parent_id -> nodes whose parent row has not been read yet
+
+        columns = "id, parent_id, title" if lazy else f"id, parent_id, title, {content_column}"
+        cursor.execute(f"SELECT {columns} FROM nodes ORDER BY parent_id, id")
+        for i, row in enumerate(cursor):
+            if i % PROGRESS_NODES_STEP == 0:
+                _report(progress, i, total)
+            node_id, parent_id, title = row[0], row[1], row[2]
+            if lazy:
+                app_node = Node(name=title if title else "Untitled")
+                app_node.bind_content(source, node_id)
+            else:
+                content_data = row[3]
+                app_node = Node(title if title else "Untitled", str(content_data if content_data is not None else ""))
+            db_nodes_map[node_id] = app_node
+            # Rows are grouped by parent, so a parent seen after its children adopts them in id order
+            for child in pending_children.pop(node_id, ()):
+                _attach(app_node, child)
+            parent_app_node = db_nodes_map.get(parent_id)
+            if parent_app_node:
+                _attach(parent_app_node, app_node)
+            else:
+                pending_children.setdefault(parent_id, []).append(app_node)
+
+        for orphans in pending_children.values():
+            for app_node in orphans:
+                _attach(app_root_node, app_node)
+        
+        _report(progress, total, total)
+        return app_root_node
+
+    except FileNotFoundError:
+        raise FileNotFoundError(f"NoteCase file not found: {file_name}")
+    except sqlite3.Error as e: 
+        raise ValueError(f"Database error with NoteCase file '{file_name}': {e}")
+    except OperationCancelled:
+        raise
+    except Exception as e: 
+        raise RuntimeError(f"An unexpected error occurred during NoteCase import: {e}")
+    finally:
+        if conn:
+            conn.close()
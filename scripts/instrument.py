@@ -0,0 +1,183 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+TRACE_FILE = os.path.join("data", "trace.json")
+TRACE_EVENT_LIMIT = 100000  # Most recent spans kept for the trace file
+HISTOGRAM_BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)  # Upper bounds; one more bucket above
+
+# Off by default: timed functions then cost one global lookup and a call.
+# Spans may finish on worker threads, so everything below is guarded by _lock.
+_enabled = False
+_lock = threading.Lock()
+_stats = {}  # Span name -> SpanStats
+_counters = {}  # Counter name -> total
+_events = deque(maxlen=TRACE_EVENT_LIMIT)  # (name, start s, duration s, thread id)
+_thread_names = {}  # Thread id -> name, for the trace viewer
+_origin = time.perf_counter()
+last_span = None  # (name, duration s) of the most recently finished span
+
+
+class SpanStats:
+    """Call count, total/min/max time and a millisecond histogram for one span name."""
+    __slots__ = ("count", "total", "min", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = 0.0
+        self.buckets = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        self.min = duration if self.min is None else min(self.min, duration)
+        self.max = max(self.max, duration)
+        milliseconds = duration * 1000
+        bucket = 0
+        while bucket < len(HISTOGRAM_BOUNDS_MS) and milliseconds > HISTOGRAM_BOUNDS_MS[bucket]:
+            bucket += 1
+        self.buckets[bucket] += 1
+
+    def percentile(self, fraction):
+        """Upper bound in ms of the bucket holding the given fraction of calls; None past the last bound."""
+        wanted = fraction * self.count
+        seen = 0
+        for bound, calls in zip(HISTOGRAM_BOUNDS_MS, self.buckets):
+            seen += calls
+            if seen >= wanted:
+                return bound
+        return None
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "total_ms": round(self.total * 1000, 3),
+            "mean_ms": round(self.total * 1000 / self.count, 3) if self.count else 0,
+            "min_ms": round((self.min or 0) * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+            "p95_ms": self.percentile(0.95),
+            "histogram_ms": {_bucket_label(i): calls for i, calls in enumerate(self.buckets) if calls},
+        }
+
+
+def _bucket_label(index):
+    if index < len(HISTOGRAM_BOUNDS_MS):
+        return f"<={HISTOGRAM_BOUNDS_MS[index]}"
+    return f">{HISTOGRAM_BOUNDS_MS[-1]}"
+
+
+def enable():
+    """Starts recording; spans finished before this are not kept."""
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    """Forgets every recorded span and counter."""
+    global last_span
+    with _lock:
+        _stats.clear()
+        _counters.clear()
+        _events.clear()
+        last_span = None
+
+
+def timed(func):
+    """Decorator recording each call of func as a span named after it.
+
+    Qt slots must not be wrapped: PyQt passes every signal argument to a
+    *args callable. Use span() inside the slot instead.
+    """
+    name = func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return func(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _record(name, start, time.perf_counter() - start)
+    return wrapper
+
+
+class span:
+    """Context manager recording the enclosed block as a span called name."""
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        if _enabled:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.start is not None:
+            _record(self.name, self.start, time.perf_counter() - self.start)
+
+
+def count(name, amount=1):
+    """Adds amount to the counter called name."""
+    if _enabled:
+        with _lock:
+            _counters[name] = _counters.get(name, 0) + amount
+
+
+def _record(name, start, duration):
+    global last_span
+    thread = threading.current_thread()
+    with _lock:
+        stats = _stats.get(name)
+        if stats is None:
+            stats = _stats[name] = SpanStats()
+        stats.add(duration)
+        _events.append((name, start, duration, thread.ident))
+        _thread_names.setdefault(thread.ident, thread.name)
+        last_span = (name, duration)
+
+
+def snapshot():
+    """Returns {"spans": {name: stats dict}, "counters": {name: total}}, spans by total time, longest first."""
+    with _lock:
+        spans = sorted(_stats.items(), key=lambda item: item[1].total, reverse=True)
+        return {
+            "spans": {name: stats.to_dict() for name, stats in spans},
+            "counters": dict(_counters),
+        }
+
+
+def dump(file_name=TRACE_FILE):
+    """Writes the recorded spans as a Chrome trace (chrome://tracing, Perfetto) with the statistics alongside."""
+    pid = os.getpid()
+    with _lock:
+        events = list(_events)
+        thread_names = dict(_thread_names)
+    trace = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+             for tid, name in thread_names.items()]
+    trace.extend({
+        "name": name, "cat": name.split(".")[0], "ph": "X", "pid": pid, "tid": tid,
+        "ts": round((start - _origin) * 1e6, 1), "dur": round(duration * 1e6, 1),
+    } for name, start, duration, tid in events)
+    directory = os.path.dirname(file_name)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(file_name, "w") as f:
+        json.dump({"traceEvents": trace, "displayTimeUnit": "ms", "otherData": snapshot()}, f)
@@ -2,120 +2,342 @@ import sys
 import os
 import json
 from PyQt5.QtWidgets import (
-    QApplication, QMainWindow, QTreeWidget, QTreeWidgetItem, QTextEdit,
+    QApplication, QMainWindow, QTreeView, QTextEdit,
     QHBoxLayout, QWidget, QToolBar, QPushButton, QComboBox, QFileDialog,
-    QMessageBox, QMenu, QTabWidget, QInputDialog, QDialog, QFormLayout, QDialogButtonBox
+    QMessageBox, QMenu, QTabWidget, QInputDialog, QDialog, QFormLayout, QDialogButtonBox,
+    QProgressBar, QDockWidget, QLineEdit, QListWidget, QListWidgetItem, QLabel, QVBoxLayout,
+    QSplitter, QTreeWidget, QTreeWidgetItem, QAbstractItemView, QStackedWidget
 )
-from PyQt5.QtCore import Qt, QByteArray, QBuffer, QIODevice
-from PyQt5.QtGui import QFont
+from PyQt5.QtCore import Qt, QByteArray, QBuffer, QIODevice, QTimer, QItemSelection, QItemSelectionModel, pyqtSignal
+from PyQt5.QtGui import QFont, QKeySequence
 from utility import (
-    Node, save_tree_to_custom_format, load_tree_from_custom_format,
-    import_cherrytree, import_notecase, add_node_to_tree, remove_node_from_tree,
-    move_node_up, move_node_down, indent_node, outdent_node, merge_trees
+    Node, ChangeTracker, save_tree_to_custom_format, save_tree_incremental, load_tree_from_file, load_tree_mapped,
+    extract_inline_images, subtree_hash, node_index_path, node_at_index_path, top_level_nodes, find_node
 )
+from editor import (
+    NoteEditor, NoteDocument, DocumentCache, LargeNoteView, new_note_document, LARGE_NOTE_CHARS
+)
+from model import NodeTreeModel
+from workers import JobRunner
+from search import SearchIndex
+from autosave import Autosaver, load_recovery_files, recovery_key
+from merge import plan_merge, plan_merge_from_file, apply_merge, node_path, diff_with_file
 from temporary import clipboard, clipboard_action, settings, load_settings
+from undo import UndoLog, ContentEdit
+from markup import compact_html, find_editor_markup
+import instrument
+
+CONTENT_SYNC_DELAY_MS = 500  # Typing pause after which editor content is written to the node
+SEARCH_REFRESH_MS = 500  # How often results are refreshed while documents are still being indexed
+DIFF_LIST_LIMIT = 5000  # Differences listed in the compare dialog
+STATS_REFRESH_MS = 1000  # How often the performance panel and status readout update
+
+
+def _tab_title(file_path, read_only=False):
+    title = os.path.basename(file_path) if file_path else "Untitled"
+    return f"{title} (read-only)" if read_only else title
+
 
 class DocumentTab(QWidget):
     """A tab containing a tree view and text editor for a single document."""
-    def __init__(self, root_node, main_window):
+    node_content_changed = pyqtSignal(object, str)  # Node, new HTML content
+
+    def __init__(self, root_node, main_window, read_only=False):
         super().__init__()
         self.root_node = root_node  # Root node of the document's tree
         self.main_window = main_window
+        self.read_only = read_only  # Opened for viewing with load_tree_mapped; nothing in it can be changed
         self.selected_node = None  # Currently selected node in the tree
-        self.item_to_node_map = {}  # Maps QTreeWidgetItems to Node objects
         self.file_path = None  # File path if the document is saved
         self.is_modified = False  # Tracks unsaved changes
+        self.saved_hash = root_node._hash if root_node else None  # Tree digest as last loaded or saved, if known
+        self.changes = ChangeTracker(root_node)  # Nodes edited since the last save, for incremental saves
+        self.autosave_changes = ChangeTracker(root_node)  # Nodes edited since the last recovery snapshot
+        self.recovery_key = os.urandom(16).hex()  # Names this tab's crash-recovery file
+        self.content_dirty = False  # Editor holds edits not yet written to selected_node.content
+        self.pending_session = None  # Saved session state of a restored tab whose file is not loaded yet
+        self.undo_log = UndoLog(int(settings.get("undo_memory_limit_mb", 32) * (1 << 20)))
+        self._loading_editor = False
+        self.sync_timer = QTimer(self)
+        self.sync_timer.setSingleShot(True)
+        self.sync_timer.setInterval(CONTENT_SYNC_DELAY_MS)
+        self.sync_timer.timeout.connect(self.flush_node_content)
 
         # Layout: tree on left, editor on right
         layout = QHBoxLayout(self)
-        self.tree_widget = QTreeWidget()
-        self.tree_widget.setHeaderLabel("Nodes")
-        self.tree_widget.itemSelectionChanged.connect(self.on_item_selection_changed)
-        self.tree_widget.itemChanged.connect(self.on_item_changed)
-        self.tree_widget.setContextMenuPolicy(Qt.CustomContextMenu)
-        self.tree_widget.customContextMenuRequested.connect(self.open_context_menu)
-        layout.addWidget(self.tree_widget, 1)
-
-        self.text_edit = QTextEdit()
-        self.text_edit.textChanged.connect(self.update_node_content)
+        self.tree_model = NodeTreeModel(root_node, self, self.undo_log)
+        self.tree_model.node_renamed.connect(self.on_node_renamed)
+        self.tree_view = QTreeView()
+        self.tree_view.setModel(self.tree_model)
+        self.tree_view.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.tree_view.setUniformRowHeights(True)  # Lets scrollTo skip measuring every row of long sibling lists
+        if read_only:
+            self.tree_view.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.tree_view.selectionModel().currentChanged.connect(self.on_item_selection_changed)
+        self.tree_view.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.tree_view.customContextMenuRequested.connect(self.open_context_menu)
+        layout.addWidget(self.tree_view, 1)
+
+        # Each note gets its own document, kept in self.documents in editable tabs for
+        # quick switching; typing is undone through undo_log together with the tree edits
+        self.text_edit = NoteEditor()
+        self.text_edit.textChanged.connect(self.on_text_changed)
+        self.text_edit.undo_requested.connect(self.undo)
+        self.text_edit.redo_requested.connect(self.redo)
         self.text_edit.setFont(QFont(settings.get("default_font", "Arial"), settings.get("default_font_size", 12)))
         self.text_edit.setAcceptRichText(True)  # Enable rich text for images
-        layout.addWidget(self.text_edit, 2)
+        self.text_edit.setReadOnly(read_only)
+        self.empty_document = NoteDocument(self)  # Shown when no note is selected
+        self.empty_document.setUndoRedoEnabled(False)
+        self.shown_document = None  # Keeps the document on screen alive when the cache drops it
+        self.documents = DocumentCache()
+        self.large_view = LargeNoteView()
+        self.large_view.rich_text_requested.connect(self.edit_large_note)
+        if read_only:
+            self.large_view.edit_button.setText("Show as Rich Text")
+        self.editor_stack = QStackedWidget()
+        self.editor_stack.addWidget(self.text_edit)
+        self.editor_stack.addWidget(self.large_view)
+        layout.addWidget(self.editor_stack, 2)
+        self.show_document(self.empty_document)
         self.setLayout(layout)
-        self.refresh_tree_widget()
-
-    def refresh_tree_widget(self):
-        """Refresh the tree view to reflect the current node structure."""
-        self.tree_widget.clear()
-        self.item_to_node_map.clear()
-        if self.root_node:
-            root_item = QTreeWidgetItem(self.tree_widget, [self.root_node.name])
-            root_item.setFlags(root_item.flags() | Qt.ItemIsEditable)
-            self.item_to_node_map[root_item] = self.root_node
-            self.root_node.tree_item = root_item
-            self._add_child_items(root_item, self.root_node)
-            self.tree_widget.expandItem(root_item)
-
-    def _add_child_items(self, parent_item, parent_node):
-        """Recursively populate the tree with child nodes."""
-        for child in parent_node.children:
-            child_item = QTreeWidgetItem(parent_item, [child.name])
-            child_item.setFlags(child_item.flags() | Qt.ItemIsEditable)
-            self.item_to_node_map[child_item] = child
-            child.tree_item = child_item
-            self._add_child_items(child_item, child)
+        if root_node:
+            self.tree_view.expand(self.tree_model.index_for_node(root_node))
+
+    def select_node(self, node):
+        """Select a node in the tree view, fetching rows down to it if needed."""
+        index = self.tree_model.index_for_node(node)
+        if index.isValid():
+            self.tree_view.setCurrentIndex(index)
+            self.tree_view.scrollTo(index)
+
+    def selected_nodes(self):
+        """Selected nodes in document order, leaving out any below another selected node.
+
+        Falls back to the current node when nothing is selected.
+        """
+        nodes = [self.tree_model.node_from_index(index) for index in self.tree_view.selectionModel().selectedRows()]
+        if not nodes and self.selected_node:
+            nodes = [self.selected_node]
+        return top_level_nodes(nodes)
+
+    def select_nodes(self, nodes, current=None):
+        """Select several nodes, fetching rows down to them, and make current (default: the first) current."""
+        selection = QItemSelection()
+        for node in nodes:
+            index = self.tree_model.index_for_node(node)
+            if index.isValid():
+                self.tree_view.scrollTo(index)
+                selection.select(index, index)
+        current = current if current is not None else (nodes[0] if nodes else None)
+        selection_model = self.tree_view.selectionModel()
+        selection_model.setCurrentIndex(self.tree_model.index_for_node(current), QItemSelectionModel.NoUpdate)
+        selection_model.select(selection, QItemSelectionModel.ClearAndSelect)
 
     def on_item_selection_changed(self):
-        """Update editor content when a tree node is selected."""
-        items = self.tree_widget.selectedItems()
-        if items:
-            item = items[0]
-            node = self.item_to_node_map.get(item)
-            if node:
-                self.selected_node = node
-                self.text_edit.setHtml(node.content)
+        """Show the current node in the editor (lazily loaded content is read here).
+
+        With several nodes selected, the editor follows the current one.
+        """
+        with instrument.span("DocumentTab.on_item_selection_changed"):
+            self.flush_node_content()
+            node = self.tree_model.node_from_index(self.tree_view.selectionModel().currentIndex())
+            self.selected_node = node
+            self.load_editor(node)
+
+    def load_editor(self, node, rich_text=False):
+        """Show a node's content in the editor without marking it dirty.
+
+        A recently shown note gets its cached document back. A note longer
+        than LARGE_NOTE_CHARS opens in the plain text view unless rich_text.
+        In a read-only tab the content is not kept on the node once shown.
+        """
+        self._loading_editor = True
+        try:
+            self.large_view.stop()
+            if not node:
+                self.empty_document.clear()
+                self.show_document(self.empty_document)
+                return
+            if not node.is_content_loaded():
+                instrument.count("Note contents read from file")
+            with instrument.span("Node.content"):
+                content = node.content_bytes().decode("utf-8") if self.read_only else node.content
+            if "data:image/" in content:
+                content = extract_inline_images(content)  # Older notes kept images inline
+                if not self.read_only:
+                    node.content = content
+            # Read-only notes are decoded afresh from the mapped file on every view, so a
+            # cached document would never match its content and would only pin memory
+            document = None if self.read_only else self.documents.get(node, content)
+            if document is None and len(content) > LARGE_NOTE_CHARS and not rich_text:
+                instrument.count("Large notes shown as plain text")
+                self.show_document(self.empty_document)
+                self.large_view.show_html(content)
+                self.editor_stack.setCurrentWidget(self.large_view)
+                return
+            if document is None:
+                with instrument.span("DocumentTab.load_editor"):
+                    document = new_note_document(content, self.text_edit.font())
+                if not self.read_only:
+                    self.documents.put(node, content, document)
             else:
-                self.selected_node = None
-                self.text_edit.clear()
-        else:
-            self.selected_node = None
-            self.text_edit.clear()
-
-    def on_item_changed(self, item, column):
-        """Update node name when edited in the tree."""
-        if column == 0:
-            node = self.item_to_node_map.get(item)
-            if node:
-                node.name = item.text(0)
-                self.is_modified = True
-
-    def update_node_content(self):
-        """Update node content when the editor text changes."""
+                instrument.count("Note documents reused")
+                if document.defaultFont() != self.text_edit.font():  # Changed in the options since it was built
+                    document.setDefaultFont(self.text_edit.font())
+            self.show_document(document)
+        finally:
+            self._loading_editor = False
+
+    def show_document(self, document):
+        self.shown_document = document
+        self.text_edit.setDocument(document)
+        self.editor_stack.setCurrentWidget(self.text_edit)
+
+    def edit_large_note(self):
+        """Load the large note shown as plain text into the rich text editor."""
         if self.selected_node:
-            self.selected_node.content = self.text_edit.toHtml()
-            self.is_modified = True
+            QApplication.setOverrideCursor(Qt.WaitCursor)
+            try:
+                self.load_editor(self.selected_node, rich_text=True)
+            finally:
+                QApplication.restoreOverrideCursor()
+
+    def on_node_renamed(self, node):
+        """Mark the document modified when a node is renamed in the tree."""
+        self.is_modified = True
+
+    def on_text_changed(self):
+        """Mark the selected node dirty and restart the sync timer."""
+        if self._loading_editor or self.read_only or not self.selected_node:
+            return
+        self.content_dirty = True
+        self.is_modified = True
+        self.sync_timer.start()
+
+    def flush_node_content(self):
+        """Serialize pending editor changes into the selected node's content."""
+        self.sync_timer.stop()
+        if self.content_dirty and self.selected_node:
+            with instrument.span("DocumentTab.flush_node_content"):
+                node = self.selected_node
+                content = compact_html(extract_inline_images(self.text_edit.toHtml()))
+                if content != node.content:
+                    self.undo_log.record(ContentEdit(node, node.content, content))
+                    node.content = content
+                    self.documents.put(node, content, self.text_edit.document())  # Still matches the note
+                    self.node_content_changed.emit(node, content)
+        self.content_dirty = False
+
+    # --- Undo ---
+    def undo(self):
+        """Revert the latest edit of this document and select the nodes it touched."""
+        self.flush_node_content()
+        self._show_replayed(self.undo_log.undo, "undo")
+
+    def redo(self):
+        """Apply the latest undone edit again."""
+        self.flush_node_content()
+        self._show_replayed(self.undo_log.redo, "redo")
+
+    def _show_replayed(self, replay, action):
+        status_bar = self.main_window.statusBar()
+        try:
+            nodes = replay(self)
+        except ValueError as e:
+            QMessageBox.warning(self, "Undo", f"Cannot {action}: {e}. The undo history was cleared.")
+            return
+        if nodes is None:
+            status_bar.showMessage(f"Nothing to {action}", 3000)
+            return
+        self.is_modified = True
+        nodes = [node for node in nodes if node is self.root_node or node.parent is not None]
+        if len(nodes) > 1:
+            self.select_nodes(top_level_nodes(nodes))
+        elif nodes:
+            self.select_node(nodes[0])
+
+    def place_nodes(self, placements):
+        self.tree_model.place_nodes(placements)
+        if self.selected_node is not None and self.selected_node is not self.root_node:
+            node = self.selected_node
+            while node.parent is not None:
+                node = node.parent
+            if node is not self.root_node:  # The shown note was taken out of the tree
+                self.selected_node = None
+                self.load_editor(None)
+
+    def set_node_name(self, node, name):
+        self.tree_model.set_node_name(node, name)
+
+    def set_node_content(self, node, content):
+        node.content = content
+        self.node_content_changed.emit(node, content)
+        if node is self.selected_node:
+            position = self.text_edit.textCursor().position()
+            self.load_editor(node)
+            cursor = self.text_edit.textCursor()
+            cursor.setPosition(min(position, len(self.text_edit.toPlainText())))
+            self.text_edit.setTextCursor(cursor)
+
+    def has_unsaved_changes(self):
+        """Whether the tree really differs from the version last loaded or saved.
+
+        is_modified is set by any edit, including one undone by hand; this
+        compares tree digests, which only rehashes the edited nodes.
+        """
+        self.flush_node_content()
+        if self.is_modified and self.saved_hash is not None and subtree_hash(self.root_node) == self.saved_hash:
+            self.is_modified = False
+        return self.is_modified
+
+    def session_state(self):
+        """The file, selected node and expanded nodes to reopen this tab with next time."""
+        if self.pending_session is not None:
+            return self.pending_session
+        expanded = [node for node in self.tree_model.exposed_parents()
+                    if self.tree_view.isExpanded(self.tree_model.index_for_node(node))]
+        return {
+            "file_path": self.file_path,
+            "read_only": self.read_only,
+            "selected": node_index_path(self.selected_node) if self.selected_node else None,
+            "expanded": [node_index_path(node) for node in expanded],
+        }
+
+    def restore_view(self, state):
+        """Expand and select the nodes recorded by session_state, skipping any the file no longer has."""
+        for path in sorted(state.get("expanded", ()), key=len):  # Parents before their children
+            node = node_at_index_path(self.root_node, path)
+            if node is not None:
+                self.tree_view.expand(self.tree_model.index_for_node(node))
+        if state.get("selected") is not None:
+            node = node_at_index_path(self.root_node, state["selected"])
+            if node is not None:
+                self.select_node(node)
 
     def open_context_menu(self, position):
         """Show context menu for tree nodes."""
-        item = self.tree_widget.itemAt(position)
-        if item:
+        index = self.tree_view.indexAt(position)
+        if index.isValid():
             menu = QMenu()
             copy_action = menu.addAction("Copy", self.copy_node)
             copy_action.setToolTip("Copy the selected node and its subnodes")
-            cut_action = menu.addAction("Cut", self.cut_node)
-            cut_action.setToolTip("Cut the selected node and its subnodes")
-            paste_action = menu.addAction("Paste", self.paste_node)
-            paste_action.setToolTip("Paste the copied/cut node as a child")
-            rename_action = menu.addAction("Rename", self.rename_node)
-            rename_action.setToolTip("Rename the selected node")
-            delete_action = menu.addAction("Delete", self.delete_node)
-            delete_action.setToolTip("Delete the selected node and its subnodes")
-            menu.exec_(self.tree_widget.viewport().mapToGlobal(position))
+            if not self.read_only:
+                cut_action = menu.addAction("Cut", self.cut_node)
+                cut_action.setToolTip("Cut the selected node and its subnodes")
+                paste_action = menu.addAction("Paste", self.paste_node)
+                paste_action.setToolTip("Paste the copied/cut node as a child")
+                rename_action = menu.addAction("Rename", self.rename_node)
+                rename_action.setToolTip("Rename the selected node")
+                delete_action = menu.addAction("Delete", self.delete_node)
+                delete_action.setToolTip("Delete the selected node and its subnodes")
+            menu.exec_(self.tree_view.viewport().mapToGlobal(position))
 
     def copy_node(self):
         """Copy the selected node to the clipboard."""
         global clipboard, clipboard_action
         if self.selected_node:
+            self.flush_node_content()
             clipboard = self.selected_node.copy()
             clipboard_action = "copy"
 
@@ -123,10 +345,10 @@ class DocumentTab(QWidget):
         """Cut the selected node to the clipboard."""
         global clipboard, clipboard_action
         if self.selected_node:
+            self.flush_node_content()
             clipboard = self.selected_node.copy()
             clipboard_action = "cut"
-            remove_node_from_tree(self.selected_node)
-            self.refresh_tree_widget()
+            self.tree_model.remove_node(self.selected_node)
             self.is_modified = True
 
     def paste_node(self):
@@ -134,8 +356,7 @@ class DocumentTab(QWidget):
         global clipboard, clipboard_action
         if clipboard and self.selected_node:
             new_node = clipboard.copy()
-            self.selected_node.add_child(new_node)
-            self.refresh_tree_widget()
+            self.tree_model.insert_node(self.selected_node, new_node)
             self.is_modified = True
             if clipboard_action == "cut":
                 clipboard = None
@@ -144,15 +365,20 @@ class DocumentTab(QWidget):
     def rename_node(self):
         """Rename the selected node."""
         if self.selected_node:
-            self.tree_widget.editItem(self.selected_node.tree_item)
+            self.tree_view.edit(self.tree_model.index_for_node(self.selected_node))
 
     def delete_node(self):
-        """Delete the selected node."""
-        if self.selected_node:
-            remove_node_from_tree(self.selected_node)
-            self.refresh_tree_widget()
+        """Delete the selected nodes."""
+        nodes = self.selected_nodes()
+        if nodes:
+            self.sync_timer.stop()
+            self.content_dirty = False
+            if len(nodes) == 1:
+                self.tree_model.remove_node(nodes[0])
+            else:
+                self.tree_model.remove_nodes(nodes)
             self.selected_node = None
-            self.text_edit.clear()
+            self.load_editor(None)
             self.is_modified = True
             
 class OptionsDialog(QDialog):
@@ -180,12 +406,201 @@ class OptionsDialog(QDialog):
         settings["default_font_size"] = int(self.size_combo.currentText())
         super().accept()
 
+class DiffDialog(QDialog):
+    """Side-by-side view of the differences between a tab's tree and another tree."""
+    def __init__(self, tab, other_title, diff, parent=None):
+        super().__init__(parent)
+        self.tab = tab
+        self.setWindowTitle(f"Compare with {other_title}")
+        self.resize(900, 600)
+        layout = QVBoxLayout(self)
+        summary = diff.summary() + f"; {diff.identical} identical branch(es) not compared"
+        layout.addWidget(QLabel(summary))
+
+        self.changes_tree = QTreeWidget()
+        self.changes_tree.setHeaderLabels(["Change", "Path"])
+        self.changes_tree.setRootIsDecorated(False)
+        entries = ([("Changed", base, other) for base, other in diff.changed]
+                   + [(f"Not in {other_title}", base, None) for base in diff.removed]
+                   + [(f"Only in {other_title}", None, other) for _, other in diff.added]
+                   + [("Reordered", base, other) for base, other in diff.reordered])
+        for kind, base, other in entries[:DIFF_LIST_LIMIT]:
+            item = QTreeWidgetItem([kind, node_path(base if base is not None else other)])
+            # The document's node is held by id, so deleting it while the dialog is open frees it
+            item.setData(0, Qt.UserRole, (kind, base.id if base is not None else None, other))
+            self.changes_tree.addTopLevelItem(item)
+        if len(entries) > DIFF_LIST_LIMIT:
+            self.changes_tree.addTopLevelItem(QTreeWidgetItem(["", f"... and {len(entries) - DIFF_LIST_LIMIT} more"]))
+        self.changes_tree.resizeColumnToContents(0)
+        self.changes_tree.currentItemChanged.connect(self.show_entry)
+        self.changes_tree.itemActivated.connect(self.open_entry)
+
+        splitter = QSplitter(Qt.Vertical)
+        splitter.addWidget(self.changes_tree)
+        sides = QSplitter(Qt.Horizontal)
+        self.base_view = NoteEditor()
+        self.other_view = NoteEditor()
+        for title, view in (("This document", self.base_view), (other_title, self.other_view)):
+            view.setReadOnly(True)
+            side = QWidget()
+            side_layout = QVBoxLayout(side)
+            side_layout.setContentsMargins(0, 0, 0, 0)
+            side_layout.addWidget(QLabel(title))
+            side_layout.addWidget(view)
+            sides.addWidget(side)
+        splitter.addWidget(sides)
+        layout.addWidget(splitter)
+        buttons = QDialogButtonBox(QDialogButtonBox.Close, self)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+
+    def show_entry(self, item):
+        """Show both sides of the selected difference."""
+        entry = item.data(0, Qt.UserRole) if item else None
+        if entry is None:
+            return
+        kind, base_id, other = entry
+        base = find_node(base_id) if base_id is not None else None
+        for view, node in ((self.base_view, base), (self.other_view, other)):
+            if node is None:
+                view.clear()
+            elif kind == "Reordered":
+                view.setPlainText("\n".join(child.name for child in node.children))
+            else:
+                view.setHtml(node.content)
+
+    def open_entry(self, item):
+        """Select the difference's node in the document."""
+        entry = item.data(0, Qt.UserRole)
+        base = find_node(entry[1]) if entry is not None and entry[1] is not None else None
+        if base is not None and self.parent().tab_for_node(base) is self.tab:
+            self.tab.select_node(base)  # Still open and the node is still in it
+
+
+class SearchPanel(QDockWidget):
+    """Dock listing the nodes of all open documents that match a query."""
+    def __init__(self, search_index, main_window):
+        super().__init__("Search", main_window)
+        self.search_index = search_index
+        self.main_window = main_window
+        self.setObjectName("search_panel")
+
+        panel = QWidget()
+        layout = QVBoxLayout(panel)
+        self.query_edit = QLineEdit()
+        self.query_edit.setPlaceholderText("Search all open documents")
+        self.query_edit.textChanged.connect(self.run_query)
+        layout.addWidget(self.query_edit)
+        self.results_list = QListWidget()
+        self.results_list.itemActivated.connect(self.open_result)
+        self.results_list.itemClicked.connect(self.open_result)
+        layout.addWidget(self.results_list)
+        self.status_label = QLabel()
+        layout.addWidget(self.status_label)
+        self.setWidget(panel)
+
+        # Re-runs the query while documents are still being indexed
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setSingleShot(True)
+        self.refresh_timer.setInterval(SEARCH_REFRESH_MS)
+        self.refresh_timer.timeout.connect(self.run_query)
+
+    def focus_query(self):
+        """Show the panel and put the cursor in the query box."""
+        self.show()
+        self.raise_()
+        self.query_edit.setFocus()
+        self.query_edit.selectAll()
+
+    def run_query(self):
+        """Fill the result list for the current query."""
+        query = self.query_edit.text()
+        self.results_list.clear()
+        for node in self.search_index.search(query):
+            tab = self.main_window.tab_for_node(node)
+            if tab is None:
+                continue
+            item = QListWidgetItem(f"{node.name}  ({self.main_window.tab_widget.tabText(self.main_window.tab_widget.indexOf(tab))})")
+            item.setData(Qt.UserRole, node.id)  # Results hold no node, so deleting one frees it at once
+            self.results_list.addItem(item)
+        status = f"{self.results_list.count()} matches" if query.strip() else ""
+        if self.search_index.is_busy():
+            status += " (indexing...)"
+            self.refresh_timer.start()
+        if self.search_index.failed:
+            status += f"\n{self.search_index.failed} notes could not be indexed: {self.search_index.last_error}"
+        self.status_label.setText(status.strip())
+
+    def open_result(self, item):
+        """Switch to the result's document and select its node."""
+        node = find_node(item.data(Qt.UserRole))
+        tab = self.main_window.tab_for_node(node) if node is not None else None
+        if tab is not None:
+            self.main_window.tab_widget.setCurrentWidget(tab)
+            tab.select_node(node)
+
+
+class PerformancePanel(QDockWidget):
+    """Dock listing the time spent in each instrumented operation."""
+    COLUMNS = ("Operation", "Calls", "Total ms", "Mean ms", "Max ms", "95% under ms")
+
+    def __init__(self, main_window):
+        super().__init__("Performance", main_window)
+        self.setObjectName("performance_panel")
+
+        panel = QWidget()
+        layout = QVBoxLayout(panel)
+        self.stats_tree = QTreeWidget()
+        self.stats_tree.setRootIsDecorated(False)
+        self.stats_tree.setHeaderLabels(self.COLUMNS)
+        layout.addWidget(self.stats_tree)
+        buttons = QHBoxLayout()
+        reset_button = QPushButton("Reset")
+        reset_button.clicked.connect(self.reset)
+        buttons.addWidget(reset_button)
+        dump_button = QPushButton("Write Trace")
+        dump_button.setToolTip("Write the recorded spans as a Chrome trace file")
+        dump_button.clicked.connect(main_window.write_trace)
+        buttons.addWidget(dump_button)
+        buttons.addStretch()
+        layout.addLayout(buttons)
+        self.setWidget(panel)
+
+    def refresh(self):
+        """Fill the table from the current statistics."""
+        if not self.isVisible():
+            return
+        stats = instrument.snapshot()
+        self.stats_tree.clear()
+        for name, entry in stats["spans"].items():
+            p95 = entry["p95_ms"]
+            self.stats_tree.addTopLevelItem(QTreeWidgetItem([
+                name, str(entry["count"]), f"{entry['total_ms']:.1f}", f"{entry['mean_ms']:.2f}",
+                f"{entry['max_ms']:.1f}", str(p95) if p95 is not None else f">{instrument.HISTOGRAM_BOUNDS_MS[-1]}",
+            ]))
+        for name, total in stats["counters"].items():
+            self.stats_tree.addTopLevelItem(QTreeWidgetItem([name, str(total)]))
+
+    def reset(self):
+        instrument.reset()
+        self.refresh()
+
+
 class MainWindow(QMainWindow):
-    """Main window for the L1TESTON3E Tree-Document Editor."""
+    """Main window for the L1TESTON3E Tree-Document Editor.
+
+    Settings are read and crash recovery is offered only after the window
+    has first been painted (see finish_startup); until then the defaults apply.
+    """
+    first_painted = pyqtSignal()
+    startup_finished = pyqtSignal()
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("LiteStone")
-        load_settings()
+        self.startup_done = False
+        self.recovery_offered = False  # Session tabs are not loaded before the recovery question is answered
+        self._startup_pending = True  # Cleared when the first paint schedules finish_startup
         self.resize(settings.get("window_width", 800), settings.get("window_height", 600))
         self.move(settings.get("window_x", 100), settings.get("window_y", 100))
 
@@ -193,20 +608,68 @@ class MainWindow(QMainWindow):
         self.tab_widget = QTabWidget()
         self.tab_widget.setTabsClosable(True)
         self.tab_widget.tabCloseRequested.connect(self.close_tab)
+        self.tab_widget.currentChanged.connect(self.load_session_tab)
         self.setCentralWidget(self.tab_widget)
 
+        # Background file jobs, with progress and cancel in the status bar
+        self.jobs = JobRunner(self)
+        self.jobs.started.connect(self.on_job_started)
+        self.jobs.progress.connect(self.on_job_progress)
+        self.jobs.done.connect(self.on_job_done)
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 1000)
+        self.progress_bar.setMaximumWidth(200)
+        self.progress_bar.hide()
+        self.statusBar().addPermanentWidget(self.progress_bar)
+        self.cancel_job_button = QPushButton("Cancel")
+        self.cancel_job_button.setToolTip("Cancel the running file operation")
+        self.cancel_job_button.clicked.connect(self.jobs.cancel)
+        self.cancel_job_button.hide()
+        self.statusBar().addPermanentWidget(self.cancel_job_button)
+
+        # Full-text search over every open document, indexed in the background
+        self.search_index = SearchIndex()
+        self.search_panel = SearchPanel(self.search_index, self)
+        self.addDockWidget(Qt.RightDockWidgetArea, self.search_panel)
+        self.search_panel.hide()
+
+        # Crash-recovery snapshots of modified tabs, written in the background
+        self.autosaver = Autosaver()
+        self.autosave_timer = QTimer(self)
+        self.autosave_timer.setInterval(int(settings.get("autosave_interval_s", 30) * 1000))
+        self.autosave_timer.timeout.connect(self.autosave)
+        self.autosave_timer.start()
+
+        # Opt-in timing of file operations and tree edits, see instrument.py; set up by enable_instrumentation
+        self.performance_panel = None
+
         # File menu
         menubar = self.menuBar()
         file_menu = menubar.addMenu("File")
         file_menu.addAction("New", self.new_file, "Ctrl+N")
         file_menu.addAction("Open", self.open_file, "Ctrl+O")
-        file_menu.addAction("Save", self.save_file, "Ctrl+S")
-        file_menu.addAction("Save As...", self.save_file_as)
-        file_menu.addAction("Merge Open Documents", self.merge_open_documents)
-        file_menu.addAction("Merge from File", self.merge_from_file)
+        file_menu.addAction("Open Read-Only...", self.open_file_read_only)
+        self.editing_actions = [  # Disabled while a read-only tab is current
+            file_menu.addAction("Save", self.save_file, "Ctrl+S"),
+            file_menu.addAction("Save As...", self.save_file_as),
+            file_menu.addAction("Compact File", self.compact_file),
+            file_menu.addAction("Compact Note Markup", self.compact_note_markup),
+            file_menu.addAction("Merge Open Documents", self.merge_open_documents),
+            file_menu.addAction("Merge from File", self.merge_from_file),
+            file_menu.addAction("Compare with Saved", self.compare_with_saved),
+            file_menu.addAction("Compare with File...", self.compare_with_file),
+        ]
+        file_menu.addAction("Find", self.search_panel.focus_query, "Ctrl+F")
         file_menu.addAction("Options", self.open_options)
+        self.performance_action = file_menu.addAction("Performance", lambda: self.performance_panel.show())
+        self.performance_action.setVisible(False)
         file_menu.addAction("Quit", self.close, "Ctrl+Q")  # Closes immediately, no prompt
 
+        # Edit menu
+        edit_menu = menubar.addMenu("Edit")
+        self.editing_actions.append(edit_menu.addAction("Undo", self.undo, QKeySequence.Undo))
+        self.editing_actions.append(edit_menu.addAction("Redo", self.redo, QKeySequence.Redo))
+
         # Toolbar
         toolbar = QToolBar()
         self.addToolBar(toolbar)
@@ -241,72 +704,405 @@ class MainWindow(QMainWindow):
         center_action.setToolTip("Align text to the center")
         right_action = toolbar.addAction("Right", lambda: self.set_text_alignment(Qt.AlignRight))
         right_action.setToolTip("Align text to the right")
+        self.editing_actions += [add_node_action, remove_node_action, paste_node_action,
+                                 left_action, center_action, right_action]
+        self.editing_widgets = [self.font_combo, self.size_combo, self.bold_button]
+        self.tab_widget.currentChanged.connect(self.update_editing_actions)
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if self._startup_pending:
+            self._startup_pending = False
+            self.first_painted.emit()
+            QTimer.singleShot(0, self.finish_startup)
+
+    def finish_startup(self):
+        """Apply the saved settings, then offer crash recovery; runs once, after the first paint."""
+        if self.startup_done:
+            return
+        self.startup_done = True
+        load_settings()
+        self.resize(settings.get("window_width", 800), settings.get("window_height", 600))
+        self.move(settings.get("window_x", 100), settings.get("window_y", 100))
+        for combo, value in ((self.font_combo, settings.get("default_font", "Arial")),
+                             (self.size_combo, str(settings.get("default_font_size", 12)))):
+            combo.blockSignals(True)  # Not a change made by the user
+            combo.setCurrentText(value)
+            combo.blockSignals(False)
+        for i in range(self.tab_widget.count()):
+            tab = self.tab_widget.widget(i)
+            tab.text_edit.setFont(QFont(settings.get("default_font", "Arial"), settings.get("default_font_size", 12)))
+        self.autosave_timer.setInterval(int(settings.get("autosave_interval_s", 30) * 1000))
+        if settings.get("instrumentation", False):
+            self.enable_instrumentation()
+        if settings.get("restore_session", True):
+            self.restore_session(settings.get("session", {}))
+        self.startup_finished.emit()
+        QTimer.singleShot(0, self.offer_recovery)
+
+    def restore_session(self, session):
+        """Reopen the tabs of the last session as placeholders; each file is loaded when its tab is first shown."""
+        self.tab_widget.blockSignals(True)  # Only the tab finally made current is loaded
+        for state in session.get("tabs", ()):
+            if not state.get("file_path"):
+                continue
+            tab = DocumentTab(None, self, state.get("read_only", False))
+            tab.file_path = state["file_path"]
+            tab.pending_session = state
+            index = self.tab_widget.addTab(tab, _tab_title(tab.file_path, tab.read_only))
+            self.tab_widget.setTabToolTip(index, f"{tab.file_path} (opens when selected)")
+        current = session.get("current", 0)
+        if 0 <= current < self.tab_widget.count():
+            self.tab_widget.setCurrentIndex(current)
+        self.tab_widget.blockSignals(False)
+
+    def load_session_tab(self, index=None):
+        """Load the current tab's document if it is a session placeholder and no other file job is running."""
+        tab = self.tab_widget.currentWidget()
+        if tab is None or tab.pending_session is None or not self.recovery_offered or self.jobs.is_busy():
+            return
+        file_path = tab.file_path
+        self.jobs.start(
+            f"Opening {os.path.basename(file_path)}", load_tree_mapped if tab.read_only else load_tree_from_file, file_path,
+            on_finished=lambda root_node: self.replace_session_tab(tab, root_node),
+            on_failed=lambda e: self.drop_session_tab(tab, e),
+            on_cancelled=lambda: self.drop_session_tab(tab, None)
+        )
+
+    def session_tab_for(self, file_path):
+        """The session placeholder for file_path that has not been loaded yet, or None."""
+        for i in range(self.tab_widget.count()):
+            tab = self.tab_widget.widget(i)
+            if file_path and tab.pending_session is not None and tab.file_path == file_path:
+                return tab
+        return None
+
+    def replace_session_tab(self, placeholder, root_node):
+        """Swap a session placeholder for the loaded document, keeping its position."""
+        index = self.tab_widget.indexOf(placeholder)
+        if index < 0:
+            return  # Closed while loading
+        was_current = self.tab_widget.currentWidget() is placeholder
+        tab = self.add_document_tab(root_node, placeholder.file_path, index, select=was_current,
+                                    read_only=placeholder.read_only)
+        self.tab_widget.removeTab(self.tab_widget.indexOf(placeholder))
+        placeholder.deleteLater()
+        tab.restore_view(placeholder.pending_session)
+
+    def drop_session_tab(self, placeholder, error):
+        """Close a session placeholder whose file could not be loaded."""
+        index = self.tab_widget.indexOf(placeholder)
+        if index < 0:
+            return
+        self.tab_widget.removeTab(index)
+        placeholder.deleteLater()
+        if error is not None:
+            self.show_file_error(error, placeholder.file_path, "Failed to reopen file")
+
+    def enable_instrumentation(self):
+        """Start timing operations and add the performance panel and status readout."""
+        if self.performance_panel is not None:
+            return
+        instrument.enable()
+        self.performance_panel = PerformancePanel(self)
+        self.addDockWidget(Qt.BottomDockWidgetArea, self.performance_panel)
+        self.performance_panel.hide()
+        self.performance_action.setVisible(True)
+        self.last_span_label = QLabel()
+        self.statusBar().addPermanentWidget(self.last_span_label)
+        self.stats_timer = QTimer(self)
+        self.stats_timer.setInterval(STATS_REFRESH_MS)
+        self.stats_timer.timeout.connect(self.refresh_stats)
+        self.stats_timer.start()
+
+    def refresh_stats(self):
+        """Show the last finished operation in the status bar and update the performance panel."""
+        last = instrument.last_span
+        if last is not None:
+            self.last_span_label.setText(f"{last[0]}: {last[1] * 1000:.1f} ms")
+        self.performance_panel.refresh()
+
+    def write_trace(self):
+        """Write the recorded spans to the trace file named in the settings."""
+        file_name = settings.get("instrumentation_trace_file", instrument.TRACE_FILE)
+        try:
+            instrument.dump(file_name)
+        except (IOError, OSError) as e:
+            QMessageBox.critical(self, "Error", f"Failed to write trace: {e}")
+            return
+        self.statusBar().showMessage(f"Trace written to {file_name}", 10000)
+
+    def autosave(self):
+        """Record the edits made since the last tick for every modified tab."""
+        for i in range(self.tab_widget.count()):
+            tab = self.tab_widget.widget(i)
+            if tab.root_node and tab.is_modified and tab.isEnabled():  # Disabled while a save reads the tree
+                tab.flush_node_content()
+                self.autosaver.snapshot(tab.recovery_key, tab.root_node, tab.file_path,
+                                        self.tab_widget.tabText(i), tab.autosave_changes.take())
+
+    def offer_recovery(self):
+        """Offer to restore documents that had unsaved changes when the last session ended.
+
+        The restored session's tabs start loading only after this, so the restore job never finds the runner busy.
+        """
+        self.recovery_offered = True
+        recovery_files = self.autosaver.recovery_files()
+        if recovery_files:
+            reply = QMessageBox.question(
+                self, "Restore Unsaved Changes",
+                f"{len(recovery_files)} document(s) had unsaved changes when LiteStone last closed. Restore them?",
+                QMessageBox.Yes | QMessageBox.No
+            )
+            if reply == QMessageBox.Yes:
+                self.jobs.wait()  # A file opened while the question was shown
+                # The session tab is loaded when this is done; if it cannot start the files are kept for next time
+                self.start_job("Restoring unsaved documents", load_recovery_files, recovery_files,
+                               on_finished=self.add_recovered_tabs,
+                               on_failed=lambda error: QMessageBox.critical(self, "Error", f"Failed to restore documents: {error}"))
+                return
+            for file_name in recovery_files:
+                self.autosaver.discard_file(file_name)
+        self.load_session_tab()
+
+    def add_recovered_tabs(self, results):
+        """Open a modified tab for each restored document."""
+        for file_name, result in results:
+            if isinstance(result, Exception):
+                QMessageBox.warning(self, "Restore Failed", f"Could not restore unsaved changes: {result}")
+                self.autosaver.discard_file(file_name)
+                continue
+            root_node, header, new_nodes, changed_nodes = result
+            placeholder = self.session_tab_for(header["file_path"])
+            if placeholder is not None:  # Replaces the restored session's unloaded tab for the same file
+                index = self.tab_widget.indexOf(placeholder)
+                self.tab_widget.removeTab(index)
+                placeholder.deleteLater()
+                tab = self.add_document_tab(root_node, header["file_path"], index)
+            else:
+                tab = self.add_document_tab(root_node, header["file_path"])
+            if not header["file_path"]:
+                self.tab_widget.setTabText(self.tab_widget.indexOf(tab), header["title"])
+            tab.is_modified = True
+            tab.changes.restore(changed_nodes)
+            tab.recovery_key = recovery_key(file_name)
+            self.autosaver.adopt(tab.recovery_key, file_name, header, new_nodes)
 
     def new_file(self):
         """Create a new blank document tab."""
         root_node = Node("New Node")  # Default root node name
-        tab = DocumentTab(root_node, self)
-        self.tab_widget.addTab(tab, "Untitled")
-        self.tab_widget.setCurrentWidget(tab)
+        self.add_document_tab(root_node)
 
     def open_file(self):
-        """Open an existing file in a new tab."""
+        """Open an existing file in a new tab, loading it on a worker thread."""
         file_path, _ = QFileDialog.getOpenFileName(
             self, "Open File", "", "LTS Files (*.lts);;CherryTree Files (*.ctd);;NoteCase Files (*.ncd)"
         )
         if file_path:
-            try:
-                if file_path.endswith(".lts"):
-                    root_node = load_tree_from_custom_format(file_path)
-                elif file_path.endswith(".ctd"):
-                    root_node = import_cherrytree(file_path)
-                elif file_path.endswith(".ncd"):
-                    root_node = import_notecase(file_path)
-                else:
-                    raise ValueError("Unsupported file format")
-                tab = DocumentTab(root_node, self)
-                tab.file_path = file_path
-                self.tab_widget.addTab(tab, os.path.basename(file_path))
-                self.tab_widget.setCurrentWidget(tab)
-            except FileNotFoundError:
-                QMessageBox.critical(self, "Error", f"File not found: {file_path}")
-            except ValueError as e:
-                QMessageBox.critical(self, "Error", f"Invalid file format: {e}")
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"Failed to open file: {e}")
-
-    def save_file(self):
+            self.start_job(
+                f"Opening {os.path.basename(file_path)}", load_tree_from_file, file_path,
+                on_finished=lambda root_node: self.add_document_tab(root_node, file_path),
+                on_failed=lambda e: self.show_file_error(e, file_path, "Failed to open file")
+            )
+
+    def open_file_read_only(self):
+        """Open an LTS file for viewing only; notes are read from a memory map of the file as they are shown."""
+        file_path, _ = QFileDialog.getOpenFileName(self, "Open Read-Only", "", "LTS Files (*.lts)")
+        if file_path:
+            self.start_job(
+                f"Opening {os.path.basename(file_path)}", load_tree_mapped, file_path,
+                on_finished=lambda root_node: self.add_document_tab(root_node, file_path, read_only=True),
+                on_failed=lambda e: self.show_file_error(e, file_path, "Failed to open file")
+            )
+
+    def editable_tab(self):
+        """The current tab, or None if it is read-only or a background save holds it read-only."""
+        current_tab = self.tab_widget.currentWidget()
+        if current_tab and current_tab.isEnabled() and current_tab.root_node is not None and not current_tab.read_only:
+            return current_tab
+        return None
+
+    def update_editing_actions(self):
+        """Enable the actions that change a document unless the current tab is read-only."""
+        current_tab = self.tab_widget.currentWidget()
+        enabled = not (current_tab and current_tab.read_only)
+        for action in self.editing_actions:
+            action.setEnabled(enabled)
+        for widget in self.editing_widgets:
+            widget.setEnabled(enabled)
+
+    def add_document_tab(self, root_node, file_path=None, index=None, select=True, read_only=False):
+        """Add a tab for a loaded tree, at the end unless index is given.
+
+        Read-only tabs are indexed for search by node name only, so opening
+        one never reads every note of the file.
+        """
+        tab = DocumentTab(root_node, self, read_only)
+        tab.file_path = file_path
+        tab.tree_model.subtree_inserted.connect(self.search_index.add_subtree)
+        tab.tree_model.subtree_removed.connect(self.search_index.remove_subtree)
+        tab.tree_model.node_renamed.connect(self.search_index.update_name)
+        tab.node_content_changed.connect(self.search_index.update_content)
+        if root_node:
+            self.search_index.add_subtree(root_node, content=not read_only)
+        title = _tab_title(file_path, read_only)
+        if index is None:
+            self.tab_widget.addTab(tab, title)
+        else:
+            self.tab_widget.insertTab(index, tab, title)
+        if select:
+            self.tab_widget.setCurrentWidget(tab)
+        return tab
+
+    def tab_for_node(self, node):
+        """The open tab whose tree contains node, or None."""
+        while node.parent is not None:
+            node = node.parent
+        for i in range(self.tab_widget.count()):
+            tab = self.tab_widget.widget(i)
+            if tab.root_node is node:
+                return tab
+        return None
+
+    def show_file_error(self, error, file_path, message):
+        """Report a failed file job."""
+        if isinstance(error, FileNotFoundError):
+            QMessageBox.critical(self, "Error", f"File not found: {file_path}")
+        elif isinstance(error, ValueError):
+            QMessageBox.critical(self, "Error", f"Invalid file format: {error}")
+        else:
+            QMessageBox.critical(self, "Error", f"{message}: {error}")
+
+    def start_job(self, description, func, *args, on_finished=None, on_failed=None, on_cancelled=None):
+        """Run a file job in the background, showing its progress in the status bar."""
+        if not self.jobs.start(description, func, *args, on_finished=on_finished,
+                               on_failed=on_failed, on_cancelled=on_cancelled):
+            QMessageBox.information(self, "Busy", "Another file operation is still in progress.")
+            return False
+        return True
+
+    def on_job_started(self, description):
+        self.statusBar().showMessage(description + "...")
+        self.progress_bar.setValue(0)
+        self.progress_bar.show()
+        self.cancel_job_button.show()
+
+    def on_job_progress(self, done, total):
+        self.progress_bar.setValue(int(done * 1000 / total) if total else 0)
+
+    def on_job_done(self):
+        self.statusBar().clearMessage()
+        self.progress_bar.hide()
+        self.cancel_job_button.hide()
+        QTimer.singleShot(0, self.load_session_tab)  # A placeholder may have been selected while busy
+
+    def save_file(self, wait=False):
         """Save the current tab's document."""
         current_tab = self.tab_widget.currentWidget()
-        if current_tab:
+        if current_tab and current_tab.root_node is not None and not current_tab.read_only:
+            current_tab.flush_node_content()
             if current_tab.file_path:
-                try:
-                    save_tree_to_custom_format(current_tab.root_node, current_tab.file_path)
-                    current_tab.is_modified = False
-                except Exception as e:
-                    QMessageBox.critical(self, "Error", f"Failed to save file: {e}")
+                self.save_tab(current_tab, current_tab.file_path, wait)
             else:
-                self.save_file_as()
+                self.save_file_as(wait)
 
-    def save_file_as(self):
+    def save_file_as(self, wait=False):
         """Save the current tab's document to a new file."""
         current_tab = self.tab_widget.currentWidget()
-        if current_tab:
+        if current_tab and current_tab.root_node is not None and not current_tab.read_only:
+            current_tab.flush_node_content()
             file_path, _ = QFileDialog.getSaveFileName(self, "Save File As", "", "LTS Files (*.lts)")
             if file_path:
-                try:
-                    save_tree_to_custom_format(current_tab.root_node, file_path)
-                    current_tab.file_path = file_path
-                    current_tab.is_modified = False
-                    self.tab_widget.setTabText(self.tab_widget.indexOf(current_tab), os.path.basename(file_path))
-                except Exception as e:
-                    QMessageBox.critical(self, "Error", f"Failed to save file: {e}")
+                self.save_tab(current_tab, file_path, wait)
+
+    def compact_file(self):
+        """Rewrite the current tab's file in full, folding its save journal back in."""
+        current_tab = self.editable_tab()
+        if current_tab and current_tab.file_path:
+            current_tab.flush_node_content()
+            self.save_tab(current_tab, current_tab.file_path, compact=True)
+
+    def compact_note_markup(self):
+        """Rewrite notes still holding the editor's full HTML in the compact form, checking them on a worker thread."""
+        current_tab = self.editable_tab()
+        if not current_tab:
+            return
+        current_tab.flush_node_content()
+
+        def finished(found):
+            current_tab.setEnabled(True)
+            if self.tab_widget.indexOf(current_tab) == -1:
+                return
+            before = after = 0
+            for node, compact in found:
+                before += len(node.content)
+                after += len(compact)
+                node.content = compact
+            if found:
+                current_tab.is_modified = True
+                current_tab.undo_log.clear()  # Its content edits were taken against the old markup
+            self.statusBar().showMessage(
+                f"Compacted {len(found)} notes, {before - after:,} characters smaller", 10000)
+
+        def failed(error):
+            current_tab.setEnabled(True)
+            QMessageBox.critical(self, "Error", f"Failed to compact note markup: {error}")
+
+        self.jobs.wait()
+        current_tab.setEnabled(False)
+        if not self.start_job("Compacting note markup", find_editor_markup, current_tab.root_node,
+                              on_finished=finished, on_failed=failed,
+                              on_cancelled=lambda: current_tab.setEnabled(True)):
+            current_tab.setEnabled(True)
+
+    def save_tab(self, tab, file_path, wait=False, compact=False):
+        """Save a tab on a worker thread; the tab is read-only until the save completes.
+
+        Only the nodes changed since the last save are written, as a journal
+        record appended to the file, unless compact is set or the file needs
+        a full rewrite anyway.
+        """
+        def save(*args, progress=None):
+            saved_path = save_func(*args, progress=progress)
+            return saved_path, subtree_hash(tab.root_node)  # Already current after a full save
+
+        def finished(result):
+            saved_path, tab.saved_hash = result
+            tab.setEnabled(True)
+            tab.file_path = saved_path
+            tab.is_modified = False
+            self.autosaver.discard(tab.recovery_key)  # The file now holds everything
+            tab.autosave_changes.take()
+            self.tab_widget.setTabText(self.tab_widget.indexOf(tab), os.path.basename(saved_path))
+
+        def failed(error):
+            cancelled()
+            QMessageBox.critical(self, "Error", f"Failed to save file: {error}")
+
+        def cancelled():
+            tab.setEnabled(True)
+            tab.changes.restore(changed_nodes)
+
+        self.jobs.wait()  # Edits made while it runs belong in this save
+        changed_nodes = tab.changes.take()
+        if compact:
+            save_func, args = save_tree_to_custom_format, (tab.root_node, file_path)
+        else:
+            save_func, args = save_tree_incremental, (tab.root_node, file_path, changed_nodes)
+        tab.setEnabled(False)
+        if not self.start_job(f"Saving {os.path.basename(file_path)}", save, *args,
+                              on_finished=finished, on_failed=failed, on_cancelled=cancelled):
+            cancelled()
+            return
+        if wait:
+            self.jobs.wait()
 
     def merge_open_documents(self):
         """Merge another open tab's content into the current tab."""
-        current_tab = self.tab_widget.currentWidget()
-        if current_tab and self.tab_widget.count() > 1:
-            tab_indices = [i for i in range(self.tab_widget.count()) if self.tab_widget.widget(i) != current_tab]
+        current_tab = self.editable_tab()
+        tab_indices = [i for i in range(self.tab_widget.count())
+                       if self.tab_widget.widget(i) != current_tab and self.tab_widget.widget(i).root_node is not None]
+        if current_tab and tab_indices:
             tab_names = [self.tab_widget.tabText(i) for i in tab_indices]
             merge_tab_name, ok = QInputDialog.getItem(
                 self, "Merge Documents", "Select document to merge:", tab_names, 0, False
@@ -314,36 +1110,109 @@ class MainWindow(QMainWindow):
             if ok and merge_tab_name:
                 merge_tab_index = tab_names.index(merge_tab_name)
                 merge_tab = self.tab_widget.widget(tab_indices[merge_tab_index])
-                merge_trees(current_tab.root_node, merge_tab.root_node)
-                current_tab.refresh_tree_widget()
-                current_tab.is_modified = True
+                merge_tab.flush_node_content()
+                current_tab.flush_node_content()
+                self.start_merge(current_tab, f"Merging {merge_tab_name}", plan_merge,
+                                 current_tab.root_node, merge_tab.root_node, source_tab=merge_tab)
 
     def merge_from_file(self):
-        """Merge a file's content into the current tab."""
-        current_tab = self.tab_widget.currentWidget()
+        """Merge a file's content into the current tab, loading it on a worker thread."""
+        current_tab = self.editable_tab()
         if current_tab:
             file_path, _ = QFileDialog.getOpenFileName(
                 self, "Merge from File", "", "LTS Files (*.lts);;CherryTree Files (*.ctd);;NoteCase Files (*.ncd)"
             )
             if file_path:
-                try:
-                    if file_path.endswith(".lts"):
-                        merge_root_node = load_tree_from_custom_format(file_path)
-                    elif file_path.endswith(".ctd"):
-                        merge_root_node = import_cherrytree(file_path)
-                    elif file_path.endswith(".ncd"):
-                        merge_root_node = import_notecase(file_path)
-                    else:
-                        raise ValueError("Unsupported file format")
-                    merge_trees(current_tab.root_node, merge_root_node)
-                    current_tab.refresh_tree_widget()
-                    current_tab.is_modified = True
-                except FileNotFoundError:
-                    QMessageBox.critical(self, "Error", f"File not found: {file_path}")
-                except ValueError as e:
-                    QMessageBox.critical(self, "Error", f"Invalid file format: {e}")
-                except Exception as e:
-                    QMessageBox.critical(self, "Error", f"Failed to merge file: {e}")
+                current_tab.flush_node_content()
+                self.start_merge(current_tab, f"Merging {os.path.basename(file_path)}", plan_merge_from_file,
+                                 current_tab.root_node, file_path,
+                                 on_failed=lambda e: self.show_file_error(e, file_path, "Failed to merge file"))
+
+    def start_merge(self, tab, description, plan_func, *args, source_tab=None, on_failed=None):
+        """Plan a merge into tab on a worker thread, then apply it and report the outcome.
+
+        Both tabs are read-only while the worker compares their trees.
+        """
+        tabs = [t for t in (tab, source_tab) if t is not None]
+
+        def release():
+            for t in tabs:
+                t.setEnabled(True)
+
+        def finished(plan):
+            release()
+            if self.tab_widget.indexOf(tab) == -1:
+                return
+            with tab.tree_model.single_undo_step():
+                added = apply_merge(plan, tab.tree_model.insert_node)
+            if added:
+                tab.is_modified = True
+            self.show_merge_report(plan)
+
+        def failed(error):
+            release()
+            if on_failed is not None:
+                on_failed(error)
+            else:
+                QMessageBox.critical(self, "Error", f"Failed to merge: {error}")
+
+        self.jobs.wait()
+        for t in tabs:
+            t.setEnabled(False)
+        if not self.start_job(description, plan_func, *args,
+                              on_finished=finished, on_failed=failed, on_cancelled=release):
+            release()
+
+    def show_merge_report(self, plan):
+        """Summarize a merge in the status bar, listing conflicts in a dialog."""
+        self.statusBar().showMessage(f"Merge complete: {plan.summary()}", 10000)
+        if plan.conflicts:
+            paths = [node_path(base_node) for base_node, _ in plan.conflicts[:20]]
+            if len(plan.conflicts) > len(paths):
+                paths.append(f"... and {len(plan.conflicts) - len(paths)} more")
+            QMessageBox.information(
+                self, "Merge Conflicts",
+                f"{plan.summary()}.\n\nThese nodes differ in the merged document; their current content was kept:\n"
+                + "\n".join(paths)
+            )
+
+    def compare_with_saved(self):
+        """Show how the current tab differs from its file on disk."""
+        current_tab = self.editable_tab()
+        if current_tab and current_tab.file_path:
+            self.start_compare(current_tab, current_tab.file_path)
+
+    def compare_with_file(self):
+        """Show how the current tab differs from another document."""
+        current_tab = self.editable_tab()
+        if current_tab:
+            file_path, _ = QFileDialog.getOpenFileName(
+                self, "Compare with File", "", "LTS Files (*.lts);;CherryTree Files (*.ctd);;NoteCase Files (*.ncd)"
+            )
+            if file_path:
+                self.start_compare(current_tab, file_path)
+
+    def start_compare(self, tab, file_path):
+        """Diff a tab against a file on a worker thread; the tab is read-only meanwhile."""
+        tab.flush_node_content()
+
+        def finished(result):
+            tab.setEnabled(True)
+            _, diff = result
+            if not diff:
+                self.statusBar().showMessage(f"No differences from {os.path.basename(file_path)}", 10000)
+                return
+            DiffDialog(tab, os.path.basename(file_path), diff, self).show()
+
+        def failed(error):
+            tab.setEnabled(True)
+            self.show_file_error(error, file_path, "Failed to compare with file")
+
+        self.jobs.wait()
+        tab.setEnabled(False)
+        if not self.start_job(f"Comparing with {os.path.basename(file_path)}", diff_with_file, tab.root_node, file_path,
+                              on_finished=finished, on_failed=failed, on_cancelled=lambda: tab.setEnabled(True)):
+            tab.setEnabled(True)
 
     def open_options(self):
         """Open the settings dialog."""
@@ -353,25 +1222,31 @@ class MainWindow(QMainWindow):
                 tab = self.tab_widget.widget(i)
                 tab.text_edit.setFont(QFont(settings.get("default_font", "Arial"), settings.get("default_font_size", 12)))
 
+    def undo(self):
+        """Undo the latest edit in the current tab."""
+        current_tab = self.editable_tab()
+        if current_tab:
+            current_tab.undo()
+
+    def redo(self):
+        """Redo the latest undone edit in the current tab."""
+        current_tab = self.editable_tab()
+        if current_tab:
+            current_tab.redo()
+
     def add_node(self):
         """Add a new node to the current tab."""
-        current_tab = self.tab_widget.currentWidget()
+        current_tab = self.editable_tab()
         if current_tab and current_tab.selected_node:
-            new_node = add_node_to_tree(current_tab.selected_node)
-            current_tab.refresh_tree_widget()
-            if new_node.tree_item:
-                current_tab.tree_widget.setCurrentItem(new_node.tree_item)
+            new_node = current_tab.tree_model.add_node(current_tab.selected_node)
+            current_tab.select_node(new_node)
             current_tab.is_modified = True
 
     def remove_node(self):
         """Remove the selected node from the current tab."""
-        current_tab = self.tab_widget.currentWidget()
+        current_tab = self.editable_tab()
         if current_tab and current_tab.selected_node:
-            remove_node_from_tree(current_tab.selected_node)
-            current_tab.refresh_tree_widget()
-            current_tab.selected_node = None
-            current_tab.text_edit.clear()
-            current_tab.is_modified = True
+            current_tab.delete_node()
 
     def copy_node(self):
         """Copy the selected node in the current tab."""
@@ -381,7 +1256,7 @@ class MainWindow(QMainWindow):
 
     def paste_node(self):
         """Paste a node into the current tab."""
-        current_tab = self.tab_widget.currentWidget()
+        current_tab = self.editable_tab()
         if current_tab:
             current_tab.paste_node()
 
@@ -417,44 +1292,64 @@ class MainWindow(QMainWindow):
     def close_tab(self, index):
         """Close a tab, prompting to save if modified."""
         widget = self.tab_widget.widget(index)
-        if widget and widget.is_modified:
+        self.jobs.wait()  # Never drop a tab that a background save is still reading
+        if widget and widget.has_unsaved_changes():
             reply = QMessageBox.question(
                 self, "Unsaved Changes",
                 "Do you want to save changes before closing?",
                 QMessageBox.Save | QMessageBox.Discard | QMessageBox.Cancel
             )
             if reply == QMessageBox.Save:
-                self.save_file()
+                self.tab_widget.setCurrentIndex(index)
+                self.save_file(wait=True)
             elif reply == QMessageBox.Cancel:
                 return
         self.tab_widget.removeTab(index)
+        self.autosaver.discard(widget.recovery_key)
+        if widget.root_node:
+            self.search_index.remove_subtree(widget.root_node)
         widget.deleteLater()
 
     def keyPressEvent(self, event):
         """Handle node movement with Shift+Ctrl+Arrow keys."""
         if event.modifiers() == (Qt.ShiftModifier | Qt.ControlModifier):
-            current_tab = self.tab_widget.currentWidget()
-            if current_tab and current_tab.selected_node:
-                if event.key() == Qt.Key_Up:
-                    move_node_up(current_tab.selected_node)
-                    current_tab.refresh_tree_widget()
-                elif event.key() == Qt.Key_Down:
-                    move_node_down(current_tab.selected_node)
-                    current_tab.refresh_tree_widget()
-                elif event.key() == Qt.Key_Left:
-                    outdent_node(current_tab.selected_node)
-                    current_tab.refresh_tree_widget()
-                elif event.key() == Qt.Key_Right:
-                    indent_node(current_tab.selected_node)
-                    current_tab.refresh_tree_widget()
+            current_tab = self.editable_tab()
+            nodes = current_tab.selected_nodes() if current_tab else []
+            if len(nodes) > 1:
+                model = current_tab.tree_model
+                move = {
+                    Qt.Key_Up: model.move_nodes_up,
+                    Qt.Key_Down: model.move_nodes_down,
+                    Qt.Key_Left: model.outdent_nodes,
+                    Qt.Key_Right: model.indent_nodes,
+                }.get(event.key())
+                if move:
+                    move(nodes)
+                    current_tab.select_nodes(nodes, current_tab.selected_node)
+                    current_tab.is_modified = True
+            elif current_tab and current_tab.selected_node:
+                model = current_tab.tree_model
+                move = {
+                    Qt.Key_Up: model.move_node_up,
+                    Qt.Key_Down: model.move_node_down,
+                    Qt.Key_Left: model.outdent_node,
+                    Qt.Key_Right: model.indent_node,
+                }.get(event.key())
+                if move:
+                    node = current_tab.selected_node
+                    move(node)
+                    current_tab.select_node(node)
+                    current_tab.is_modified = True
         else:
             super().keyPressEvent(event)
 
     def closeEvent(self, event):
         """Prompt to save unsaved changes before closing the application."""
+        self.jobs.wait()
+        discarded = []
         for i in range(self.tab_widget.count()):
             widget = self.tab_widget.widget(i)
-            if widget and widget.is_modified:
+            if widget and widget.has_unsaved_changes():
                 reply = QMessageBox.question(
                     self, "Unsaved Changes",
                     f"Do you want to save changes in {self.tab_widget.tabText(i)} before closing?",
@@ -462,16 +1357,38 @@ class MainWindow(QMainWindow):
                 )
                 if reply == QMessageBox.Save:
                     self.tab_widget.setCurrentIndex(i)
-                    self.save_file()
+                    self.save_file(wait=True)
+                elif reply == QMessageBox.Discard:
+                    discarded.append(widget)
                 elif reply == QMessageBox.Cancel:
                     event.ignore()
                     return
+        self.autosave()  # A tab whose save failed or was cancelled keeps its latest edits for recovery
+        for i in range(self.tab_widget.count()):
+            tab = self.tab_widget.widget(i)
+            if tab in discarded or not tab.has_unsaved_changes():
+                self.autosaver.discard(tab.recovery_key)
+        self.autosaver.wait()
+        if not self.startup_done:
+            self.startup_done = True
+            load_settings()  # Closed before the settings were applied: keep the saved ones and their session
+        else:
+            tabs = [self.tab_widget.widget(i) for i in range(self.tab_widget.count())]
+            settings["session"] = {
+                "tabs": [tab.session_state() for tab in tabs if tab.file_path],
+                "current": max(0, sum(1 for tab in tabs[:self.tab_widget.currentIndex()] if tab.file_path)),
+            }
         settings["window_width"] = self.width()
         settings["window_height"] = self.height()
         settings["window_x"] = self.x()
         settings["window_y"] = self.y()
         with open("data/persistent.json", "w") as f:
             json.dump(settings, f, indent=2)
+        if instrument.is_enabled():
+            try:
+                instrument.dump(settings.get("instrumentation_trace_file", instrument.TRACE_FILE))
+            except (IOError, OSError) as e:
+                print(f"Failed to write trace: {e}")
         super().closeEvent(event)
 
 if __name__ == "__main__":
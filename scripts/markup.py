@@ -0,0 +1,104 @@
+import html
+import re
+from collections import Counter
+from utility import iter_tree_preorder, PROGRESS_NODES_STEP, _report
+
+# QTextEdit.toHtml() wraps every note in a DOCTYPE, a head with a style
+# sheet, a body styled with the editor's default font (which the document
+# the note is loaded into supplies anyway), and repeats Qt's
+# margin declarations on every paragraph. compact_html keeps only the body,
+# drops declarations that restate Qt's defaults and moves each inline style
+# used more than once into a class defined once at the top. QTextDocument
+# resolves those classes itself, so setHtml of the compact form gives the
+# same document back and notes need no separate expansion when loaded.
+
+QT_HTML_MARKER = '<meta name="qrichtext" content="1" />'
+MARKER_SEARCH_CHARS = 400  # The marker sits in the head, right after the DOCTYPE
+COMPACT_START = "<html><head><style>p, li { white-space: pre-wrap; }"  # Qt's own rule, then the classes
+INTERN_MIN_USES = 2  # Inline styles used at least this often become classes
+
+_BODY = re.compile(r'<body[^>]*>\n?(.*)</body>', re.DOTALL)
+# List items carry two style attributes (character and block format) that
+# could not both become classes, so they are matched whole and kept as they are
+_STYLE_ATTRIBUTE = re.compile(r'<li [^<>]*>| style="([^"<>{}]*)"')
+_DEFAULT_DECLARATIONS = frozenset(("margin-left:0px", "margin-right:0px", "-qt-block-indent:0", "text-indent:0px"))
+_INLINE_ONLY = ("-qt-paragraph-type",)  # Only honoured in a style attribute, not from a style sheet
+
+
+def is_editor_html(content):
+    """Whether content is raw QTextEdit.toHtml() output."""
+    return QT_HTML_MARKER in content[:MARKER_SEARCH_CHARS]
+
+
+def _reduce_style(style):
+    """Splits a Qt style into (declarations that must stay inline, the rest), defaults left out."""
+    inline = []
+    shared = []
+    for declaration in style.split(";"):
+        declaration = declaration.strip()
+        if declaration and declaration not in _DEFAULT_DECLARATIONS:
+            (inline if declaration.startswith(_INLINE_ONLY) else shared).append(declaration)
+    return "; ".join(inline), "; ".join(shared)
+
+
+def compact_html(content):
+    """Canonical compact form of QTextEdit.toHtml() output; any other HTML is returned unchanged."""
+    if not is_editor_html(content):
+        return content
+    match = _BODY.search(content)
+    if match is None:
+        return content
+    found = [style for style in _STYLE_ATTRIBUTE.findall(match.group(1)) if style]
+    styles = {style: _reduce_style(style) for style in found}
+    uses = Counter(styles[style][1] for style in found)
+    classes = {}  # Shared part of a style -> class name, numbered in order of first use
+    for style, count in uses.items():
+        if count >= INTERN_MIN_USES and style:
+            classes[style] = f"s{len(classes)}"
+
+    def replace(style_match):
+        if style_match.group(1) is None:
+            return style_match.group(0).replace(' style=""', "")  # Qt itself drops the empty one on the next load
+        inline, shared = styles[style_match.group(1)]
+        if shared in classes:
+            attributes = f' class="{classes[shared]}"'
+        else:
+            inline = "; ".join(part for part in (inline, shared) if part)
+            attributes = ""
+        return attributes + (f' style="{inline}"' if inline else "")
+
+    body = _STYLE_ATTRIBUTE.sub(replace, match.group(1))
+    rules = "".join(f".{name} {{ {html.unescape(style)} }}" for style, name in classes.items())
+    return f"{COMPACT_START}{rules}</style></head><body>{body}</body></html>"
+
+
+def find_editor_markup(root, progress=None):
+    """Returns (node, compact content) for every note of the tree still holding raw editor HTML.
+
+    Content stored in a file is read to check it, so this visits the whole
+    document; nothing is changed, so it can run while the tree is only read.
+    """
+    nodes = [node for node, _ in iter_tree_preorder(root)]
+    found = []
+    for done, node in enumerate(nodes, 1):
+        # Notes still on disk are read without being kept in memory
+        content = node.content if node.is_content_loaded() else node.content_bytes().decode("utf-8")
+        if is_editor_html(content):
+            compact = compact_html(content)
+            if compact != content:
+                found.append((node, compact))
+        if done % PROGRESS_NODES_STEP == 0:
+            _report(progress, done, len(nodes))
+    _report(progress, len(nodes), len(nodes))
+    return found
+
+
+def compact_tree_markup(root, progress=None):
+    """Rewrites every note holding raw editor HTML in the compact form; returns (notes, chars before, chars after)."""
+    before = after = 0
+    found = find_editor_markup(root, progress)
+    for node, compact in found:
+        before += len(node.content)
+        after += len(compact)
+        node.content = compact
+    return len(found), before, after
@@ -0,0 +1,142 @@
+from collections import deque
+from utility import load_tree_from_file, subtree_hash, _report
+
+
+def node_path(node):
+    """Slash-separated names from the root down to node."""
+    names = []
+    while node is not None:
+        names.append(node.name)
+        node = node.parent
+    return "/".join(reversed(names))
+
+
+class TreeDiff:
+    """Differences between two trees whose nodes are matched by path and name.
+
+    Roots always match each other; below them, children are paired with
+    same-named children of the matched parent, in order. added holds
+    (base parent, other node) for the topmost unmatched nodes of the other
+    tree, removed the topmost unmatched base nodes, changed (base node,
+    other node) pairs whose content differs and reordered (base node, other
+    node) pairs whose matched children come in a different order.
+    identical counts matched subtrees skipped because their digests agree.
+    """
+    def __init__(self):
+        self.added = []
+        self.removed = []
+        self.changed = []
+        self.reordered = []
+        self.identical = 0
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed or self.reordered)
+
+    def summary(self):
+        return (f"{len(self.added)} added, {len(self.removed)} removed, "
+                f"{len(self.changed)} changed, {len(self.reordered)} reordered")
+
+
+def diff_trees(base_root, other_root, progress=None):
+    """Compares two trees, descending only into subtrees whose digests differ.
+
+    Only reads both trees, so it can run on a worker thread. Digests cached
+    on the nodes are reused, so diffing again after a few edits only
+    rehashes the edited nodes.
+    """
+    subtree_hash(base_root, _progress_share(progress, 0, 2))
+    subtree_hash(other_root, _progress_share(progress, 1, 2))
+    diff = TreeDiff()
+    stack = [(base_root, other_root)]
+    while stack:
+        base_node, other_node = stack.pop()
+        if base_node._hash == other_node._hash:
+            diff.identical += 1
+            continue
+        if base_node._content_hash != other_node._content_hash:
+            diff.changed.append((base_node, other_node))
+        unmatched = {}  # Name -> base children with that name not yet matched, in order
+        for child in base_node.children:
+            unmatched.setdefault(child.name, deque()).append(child)
+        matched = []
+        for child in other_node.children:
+            candidates = unmatched.get(child.name)
+            if candidates:
+                match = candidates.popleft()
+                matched.append(match)
+                stack.append((match, child))
+            else:
+                diff.added.append((base_node, child))
+        kept = set(map(id, matched))
+        diff.removed.extend(child for child in base_node.children if id(child) not in kept)
+        if matched != [child for child in base_node.children if id(child) in kept]:
+            diff.reordered.append((base_node, other_node))
+    return diff
+
+
+def _progress_share(progress, part, parts):
+    """Reports one of parts equal steps of a longer operation through progress."""
+    if progress is None:
+        return None
+    return lambda done, total: _report(progress, part * total + done, parts * total) if total else None
+
+
+class MergePlan:
+    """What merging one tree into another would change.
+
+    additions holds (base parent, node from the other tree) pairs to copy in;
+    conflicts holds (base node, other node) pairs found at the same path with
+    different content, where the base content is kept.
+    """
+    def __init__(self, additions, conflicts, identical_subtrees=0):
+        self.additions = additions
+        self.conflicts = conflicts
+        self.identical_subtrees = identical_subtrees  # Matched subtrees skipped without descending into them
+
+    def summary(self):
+        return (f"{len(self.additions)} branch(es) added, {len(self.conflicts)} conflict(s), "
+                f"{self.identical_subtrees} identical branch(es) skipped")
+
+
+def plan_merge(base_root, other_root, progress=None):
+    """Matches other_root's tree against base_root's by path and name.
+
+    Only reads both trees, so it can run on a worker thread; apply the
+    result with apply_merge. Nodes only in the base tree are kept, and the
+    roots' own content is never reported as a conflict.
+    """
+    diff = diff_trees(base_root, other_root, progress)
+    conflicts = [pair for pair in diff.changed if pair[0] is not base_root]
+    return MergePlan(diff.added, conflicts, diff.identical)
+
+
+def apply_merge(plan, insert=None):
+    """Copies the planned additions into the base tree; returns the inserted nodes.
+
+    insert(parent, node) defaults to parent.add_child; pass a model's
+    insert_node to keep views up to date.
+    """
+    added = []
+    for parent, other_child in plan.additions:
+        node = other_child.copy()
+        if insert is None:
+            parent.add_child(node)
+        else:
+            insert(parent, node)
+        added.append(node)
+    return added
+
+
+def plan_merge_from_file(base_root, file_name, progress=None):
+    """Loads a document and plans merging it into base_root."""
+    return plan_merge(base_root, load_tree_from_file(file_name, progress), progress)
+
+
+def diff_with_file(root, file_name, progress=None):
+    """Loads a document and diffs it against root; returns (loaded root, TreeDiff).
+
+    LTS2 files store their digests, so only the nodes edited in root since
+    it was loaded or saved, and none of the file's content, are hashed.
+    """
+    other_root = load_tree_from_file(file_name, _progress_share(progress, 0, 2))
+    return other_root, diff_trees(root, other_root, _progress_share(progress, 1, 2))
@@ -0,0 +1,419 @@
+import weakref
+from contextlib import contextmanager
+from PyQt5.QtCore import Qt, QAbstractItemModel, QModelIndex, pyqtSignal
+from utility import (
+    Node, remove_node_from_tree, move_node_up, move_node_down,
+    indent_node, outdent_node, merge_trees,
+    remove_nodes, move_nodes, move_nodes_up, move_nodes_down, indent_nodes, outdent_nodes,
+    place_nodes, top_level_nodes
+)
+from instrument import timed
+from undo import Placement, Rename
+
+FETCH_BATCH_SIZE = 256  # Rows exposed per fetchMore call
+
+
+class NodeTreeModel(QAbstractItemModel):
+    """Item model over a Node tree.
+
+    Rows are exposed lazily: a parent reports only the children the view has
+    fetched so far, so nothing is built for branches that were never expanded.
+    Structural edits go through the model and emit insert/remove/move signals
+    for the affected rows only; batch edits of several nodes emit a single
+    layout change instead. With an undo_log, every edit made through the
+    model is recorded in it.
+    """
+    node_renamed = pyqtSignal(object)
+    subtree_inserted = pyqtSignal(object)  # Root of a subtree added to the tree
+    subtree_removed = pyqtSignal(object)  # Root of a subtree taken out of the tree
+
+    def __init__(self, root_node, parent=None, undo_log=None):
+        super().__init__(parent)
+        self.root_node = root_node
+        self.undo_log = undo_log  # undo.UndoLog receiving the model's edits, if any
+        self._fetched = weakref.WeakKeyDictionary()  # Node -> number of child rows exposed
+        self._editing = False  # Views must not fetch rows while the tree is being changed
+        self._grouped_moves = None  # Moves made inside single_undo_step, recorded together when it ends
+
+    # --- Read-only model interface ---
+    def index(self, row, column, parent=QModelIndex()):
+        if column != 0 or row < 0:
+            return QModelIndex()
+        if not parent.isValid():
+            return self.createIndex(row, 0, self.root_node) if row == 0 and self.root_node else QModelIndex()
+        parent_node = parent.internalPointer()
+        if row >= self._fetched_count(parent_node):
+            return QModelIndex()
+        return self.createIndex(row, 0, parent_node.children[row])
+
+    def parent(self, index):
+        if not index.isValid():
+            return QModelIndex()
+        parent_node = index.internalPointer().parent
+        if parent_node is None:
+            return QModelIndex()
+        return self.createIndex(self._row_of(parent_node), 0, parent_node)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        if not parent.isValid():
+            return 1 if self.root_node else 0
+        return self._fetched_count(parent.internalPointer())
+
+    def columnCount(self, parent=QModelIndex()):
+        return 1
+
+    def hasChildren(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return self.root_node is not None
+        return bool(parent.internalPointer().children)
+
+    def canFetchMore(self, parent):
+        if not parent.isValid() or self._editing:
+            return False
+        node = parent.internalPointer()
+        return self._fetched_count(node) < len(node.children)
+
+    @timed
+    def fetchMore(self, parent):
+        if not parent.isValid() or self._editing:
+            return
+        node = parent.internalPointer()
+        self._expose_rows(node, min(len(node.children), self._fetched_count(node) + FETCH_BATCH_SIZE))
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            return index.internalPointer().name
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or role != Qt.EditRole:
+            return False
+        node = index.internalPointer()
+        if node.name == value:
+            return False
+        self.set_node_name(node, value)
+        return True
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsEditable
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole and section == 0:
+            return "Nodes"
+        return None
+
+    # --- Node lookup ---
+    def node_from_index(self, index):
+        return index.internalPointer() if index.isValid() else None
+
+    def index_for_node(self, node):
+        """Returns the index of node, fetching its ancestors' rows as far as needed."""
+        if node is None:
+            return QModelIndex()
+        path = [node]
+        while path[-1].parent is not None:
+            path.append(path[-1].parent)  # A loop, not recursion: trees can be deeper than the stack
+        if path.pop() is not self.root_node:
+            return QModelIndex()
+        index = self.createIndex(0, 0, self.root_node)
+        for node in reversed(path):
+            row = self._row_of(node)
+            self._expose_rows(node.parent, row + 1)
+            index = self.createIndex(row, 0, node)
+        return index
+
+    def exposed_parents(self):
+        """Nodes shown in the view whose child rows have been fetched, e.g. to save which are expanded."""
+        return [node for node, count in self._fetched.items() if count and self._is_exposed(node)]
+
+    def set_node_name(self, node, name):
+        """Renames a node, shown in the view or not."""
+        if self.undo_log is not None:
+            self.undo_log.record(Rename(node, node.name, name))
+        node.name = name
+        if self._is_exposed(node):
+            index = self._index_if_shown(node)
+            self.dataChanged.emit(index, index, [Qt.DisplayRole, Qt.EditRole])
+        self.node_renamed.emit(node)
+
+    # --- Structural edits ---
+    def add_node(self, parent_node, name="New Node", content=""):
+        """Adds a new child under parent_node and returns it."""
+        new_node = Node(name, content)
+        self.insert_node(parent_node, new_node)
+        return new_node
+
+    @timed
+    def insert_node(self, parent_node, node, row=None):
+        """Inserts an existing node (and its subtree) under parent_node."""
+        with self._structural_edit():
+            if row is None:
+                row = len(parent_node.children)
+            in_range = self._in_fetched_range(parent_node, row)
+            announce = in_range and self._is_exposed(parent_node)
+            if announce:
+                self.beginInsertRows(self._index_if_shown(parent_node), row, row)
+            parent_node.insert_child(row, node)
+            self._record([(node, None, 0, parent_node, node.index_in_parent())])
+            if in_range:
+                self._fetched[parent_node] = self._fetched_count(parent_node) + 1
+            if announce:
+                self.endInsertRows()
+            else:
+                self._notify_has_children(parent_node)
+        self.subtree_inserted.emit(node)
+
+    @timed
+    def remove_node(self, node):
+        """Removes node and its subtree from the tree."""
+        with self._structural_edit():
+            parent_node = node.parent
+            if parent_node is None:
+                return
+            row = self._row_of(node)
+            in_range = row < self._fetched_count(parent_node)
+            announce = in_range and self._is_exposed(parent_node)
+            if announce:
+                self.beginRemoveRows(self._index_if_shown(parent_node), row, row)
+            remove_node_from_tree(node)
+            self._record([(node, parent_node, row, None, 0)])
+            if in_range:
+                self._fetched[parent_node] -= 1
+            if announce:
+                self.endRemoveRows()
+            else:
+                self._notify_has_children(parent_node)
+        self.subtree_removed.emit(node)
+
+    def move_node_up(self, node):
+        if node.parent is not None:
+            row = self._row_of(node)
+            if row > 0:
+                self._move(node, node.parent, row - 1, lambda: move_node_up(node))
+
+    def move_node_down(self, node):
+        if node.parent is not None:
+            row = self._row_of(node)
+            if row < len(node.parent.children) - 1:
+                self._move(node, node.parent, row + 1, lambda: move_node_down(node))
+
+    def indent_node(self, node):
+        if node.parent is not None:
+            row = self._row_of(node)
+            if row > 0:
+                new_parent = node.parent.children[row - 1]
+                self._move(node, new_parent, len(new_parent.children), lambda: indent_node(node))
+
+    def outdent_node(self, node):
+        if node.parent is not None and node.parent.parent is not None:
+            grandparent = node.parent.parent
+            self._move(node, grandparent, self._row_of(node.parent) + 1, lambda: outdent_node(node))
+
+    @timed
+    def merge_tree(self, tree_to_merge_root):
+        """Merges another tree into the root, announcing only the appended rows."""
+        with self._structural_edit():
+            first = len(self.root_node.children)
+            count = len(tree_to_merge_root.children)
+            in_range = count > 0 and self._in_fetched_range(self.root_node, first)
+            if in_range:
+                self.beginInsertRows(self._index_if_shown(self.root_node), first, first + count - 1)
+            merge_trees(self.root_node, tree_to_merge_root)
+            self._record([(node, None, 0, self.root_node, first + offset)
+                          for offset, node in enumerate(self.root_node.children[first:first + count])])
+            if in_range:
+                self._fetched[self.root_node] = self._fetched_count(self.root_node) + count
+                self.endInsertRows()
+        for node in self.root_node.children[first:first + count]:
+            self.subtree_inserted.emit(node)
+
+    # --- Batch edits ---
+    def remove_nodes(self, nodes):
+        """Removes several nodes and their subtrees; returns the removed top-level nodes."""
+        removed = self._restructure(lambda: remove_nodes(nodes), nodes)
+        for node in removed:
+            self.subtree_removed.emit(node)
+        return removed
+
+    def move_nodes(self, nodes, new_parent, row=None):
+        return self._restructure(lambda: move_nodes(nodes, new_parent, row), nodes)
+
+    def move_nodes_up(self, nodes):
+        self._restructure(lambda: move_nodes_up(nodes), nodes)
+
+    def move_nodes_down(self, nodes):
+        self._restructure(lambda: move_nodes_down(nodes), nodes)
+
+    def indent_nodes(self, nodes):
+        self._restructure(lambda: indent_nodes(nodes), nodes)
+
+    def outdent_nodes(self, nodes):
+        self._restructure(lambda: outdent_nodes(nodes), nodes)
+
+    def place_nodes(self, placements):
+        """Puts nodes at (node, parent, row) positions, parent None meaning out of the tree; used by undo and redo.
+
+        A single node takes the insert, remove or move path, so views update
+        just that row; several nodes are placed with one layout change.
+        """
+        if len(placements) == 1:
+            node, parent_node, row = placements[0]
+            if parent_node is None:
+                self.remove_node(node)
+            elif node.parent is None:
+                self.insert_node(parent_node, node, row)
+            else:
+                self._move(node, parent_node, row, lambda: place_nodes(placements))
+            return
+        leaving = [node for node, parent_node, _ in placements if parent_node is None and node.parent is not None]
+        arriving = [node for node, parent_node, _ in placements if parent_node is not None and node.parent is None]
+        self._restructure(lambda: place_nodes(placements), [node for node, _, _ in placements])
+        for node in leaving:
+            self.subtree_removed.emit(node)
+        for node in arriving:
+            self.subtree_inserted.emit(node)
+
+    # --- Helpers ---
+    # Fetch counts are kept exact for every node, exposed or not; signals are
+    # only emitted for rows the view can currently see.
+    def _fetched_count(self, node):
+        return self._fetched.get(node, 0)
+
+    def _row_of(self, node):
+        return node.index_in_parent()
+
+    def _index_if_shown(self, node):
+        """Index for a node that is known to be exposed in the view."""
+        return self.createIndex(self._row_of(node), 0, node)
+
+    def _in_fetched_range(self, parent_node, row):
+        """Whether a row inserted at this position falls inside the fetched prefix."""
+        fetched = self._fetched_count(parent_node)
+        return row < fetched or fetched == len(parent_node.children)
+
+    def _is_exposed(self, node):
+        while node.parent is not None:
+            if self._row_of(node) >= self._fetched_count(node.parent):
+                return False
+            node = node.parent
+        return node is self.root_node
+
+    @contextmanager
+    def _structural_edit(self):
+        editing = self._editing
+        self._editing = True
+        try:
+            yield
+        finally:
+            self._editing = editing
+
+    def _expose_rows(self, node, count):
+        fetched = self._fetched_count(node)
+        if count > fetched and not self._editing:
+            with self._structural_edit():
+                self.beginInsertRows(self._index_if_shown(node), fetched, count - 1)
+                self._fetched[node] = count
+                self.endInsertRows()
+
+    def _notify_has_children(self, node):
+        if self._is_exposed(node):
+            index = self._index_if_shown(node)
+            self.dataChanged.emit(index, index)
+
+    @contextmanager
+    def single_undo_step(self):
+        """Records the structural edits made inside as one undo step, e.g. every insertion of a merge."""
+        if self._grouped_moves is not None:
+            yield  # Already inside one
+            return
+        self._grouped_moves = []
+        try:
+            yield
+        finally:
+            moves, self._grouped_moves = self._grouped_moves, None
+            if moves and self.undo_log is not None:
+                self.undo_log.record(Placement(moves))
+
+    def _record(self, moves):
+        """Records (node, old parent, old row, new parent, new row) moves, leaving out nodes that stayed put."""
+        if self.undo_log is not None:
+            moves = [move for move in moves if move[1:3] != move[3:5]]
+            if self._grouped_moves is not None:
+                self._grouped_moves.extend(moves)
+            elif moves:
+                self.undo_log.record(Placement(moves))
+
+    def _restructure(self, mutate, edited):
+        """Applies a batch edit of the edited nodes with mutate() and tells views about it with one layout change.
+
+        Fully fetched parents stay fully fetched; others keep at most as many
+        rows as before. Persistent indexes (selection, expanded rows) follow
+        their nodes, or become invalid if the node is gone or no longer shown.
+        """
+        with self._structural_edit():
+            self.layoutAboutToBeChanged.emit()
+            old_indexes = self.persistentIndexList()
+            nodes = [index.internalPointer() for index in old_indexes]
+            counts = [(node, count, count == len(node.children)) for node, count in self._fetched.items() if count]
+            if self.undo_log is not None:
+                edited = top_level_nodes(edited)
+                before = [(node, node.parent, node.index_in_parent()) for node in edited]
+            result = mutate()
+            if self.undo_log is not None:
+                self._record([old + (node.parent, node.index_in_parent()) for old, node in zip(before, edited)])
+            for node, count, full in counts:
+                self._fetched[node] = len(node.children) if full else min(count, len(node.children))
+            self.changePersistentIndexList(
+                old_indexes,
+                [self._index_if_shown(node) if self._is_exposed(node) else QModelIndex() for node in nodes])
+            self.layoutChanged.emit()
+        return result
+
+    def _move(self, node, new_parent, new_row, mutate):
+        """Applies mutate() and emits the signals for moving node to new_row of new_parent.
+
+        new_row is the node's final position in new_parent.children.
+        """
+        with self._structural_edit():
+            old_parent = node.parent
+            old_row = self._row_of(node)
+            same_parent = old_parent is new_parent
+            source_in_range = old_row < self._fetched_count(old_parent)
+            if same_parent:
+                # Position the destination row takes before the node is taken out.
+                dest_row = new_row + 1 if new_row > old_row else new_row
+                dest_in_range = new_row < self._fetched_count(old_parent)
+            else:
+                dest_row = new_row
+                dest_in_range = self._in_fetched_range(new_parent, new_row)
+            announce_source = source_in_range and self._is_exposed(old_parent)
+            announce_dest = dest_in_range and self._is_exposed(new_parent)
+            if announce_source and announce_dest:
+                self.beginMoveRows(self._index_if_shown(old_parent), old_row, old_row,
+                                   self._index_if_shown(new_parent), dest_row)
+            elif announce_source:
+                self.beginRemoveRows(self._index_if_shown(old_parent), old_row, old_row)
+            elif announce_dest:
+                self.beginInsertRows(self._index_if_shown(new_parent), new_row, new_row)
+            mutate()
+            self._record([(node, old_parent, old_row, new_parent, node.index_in_parent())])
+            if source_in_range:
+                self._fetched[old_parent] -= 1
+            if dest_in_range:
+                self._fetched[new_parent] = self._fetched_count(new_parent) + 1
+            if announce_source and announce_dest:
+                self.endMoveRows()
+            elif announce_source:
+                self.endRemoveRows()
+            elif announce_dest:
+                self.endInsertRows()
+            if not announce_dest:
+                self._notify_has_children(new_parent)
+            if not announce_source and not same_parent:
+                self._notify_has_children(old_parent)
@@ -0,0 +1,233 @@
+import html
+import queue
+import re
+import threading
+from utility import find_node, prefetch_content_bytes
+
+SEARCH_RESULT_LIMIT = 200
+PREFIX_LENGTH = 3  # Query words at least this long also match longer words starting with them
+
+_MARKUP_BLOCK = re.compile(r'<(head|style|script)\b.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+_TAG = re.compile(r'<[^>]*>')
+_WORD = re.compile(r'\w+')
+
+
+def html_to_text(content):
+    """Plain text of a note's HTML, without markup, styles or image references."""
+    if '<' not in content:
+        return html.unescape(content)
+    return html.unescape(_TAG.sub(' ', _MARKUP_BLOCK.sub(' ', content)))
+
+
+def tokenize(text):
+    return set(_WORD.findall(text.lower()))
+
+
+def _subtree_nodes(root, materialize=True):
+    """The nodes of root's subtree, listed on the worker.
+
+    Each child list is copied before it is walked, since the GUI thread may
+    be inserting or removing children meanwhile; those edits are queued
+    behind this walk and fix up whatever it saw.
+    """
+    nodes = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        nodes.append(node)
+        stack.extend(reversed(list(node.children if materialize else node._children)))
+    return nodes
+
+
+class SearchIndex:
+    """Inverted index over node names and plain-text content.
+
+    Callers report changes from the GUI thread; the work of reading content
+    and tokenizing it is queued to a background thread that owns all updates.
+    Queries can run at any time and see whatever has been indexed so far.
+    Nodes are held by Node.id, so the index never keeps a deleted one alive.
+    """
+    def __init__(self):
+        self._postings = {}  # term -> set of ids of nodes whose name or content contains it
+        self._prefixes = {}  # first PREFIX_LENGTH characters -> set of terms
+        self._node_terms = {}  # Node.id -> (name terms, content terms)
+        self.failed = 0  # Notes whose content could not be read; they are indexed by name only
+        self.last_error = None  # Message of the latest failure, shown by the search panel
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = None
+
+    # --- Change notifications (GUI thread) ---
+    def add_subtree(self, node, content=True):
+        """Indexes node and its descendants; by name only unless content is set."""
+        # The worker lists the nodes: walking a pasted branch here would materialize
+        # its copy-on-write copy on the GUI thread
+        self._submit(self._index_subtree, node, content)
+
+    def remove_subtree(self, node):
+        self._submit(self._drop_subtree, node)
+
+    def update_name(self, node):
+        self._submit(self._reindex, node, node.name, None)
+
+    def update_content(self, node, content):
+        self._submit(self._reindex, node, None, content)
+
+    def is_busy(self):
+        return self._queue.unfinished_tasks > 0
+
+    def wait(self):
+        """Blocks until every queued change has been indexed."""
+        self._queue.join()
+
+    def __len__(self):
+        return len(self._node_terms)
+
+    def __contains__(self, node):
+        return node.id in self._node_terms
+
+    # --- Queries ---
+    def search(self, query, limit=SEARCH_RESULT_LIMIT):
+        """Returns up to limit nodes containing every word of query, name matches first."""
+        words = sorted(tokenize(query), key=len, reverse=True)
+        if not words:
+            return []
+        with self._lock:
+            matches = None
+            for word in words:
+                node_ids = self._matching_nodes(word)
+                matches = node_ids if matches is None else matches & node_ids
+                if not matches:
+                    return []
+            name_hits = []
+            other_hits = []
+            for node_id in matches:
+                name_terms = self._node_terms[node_id][0]
+                if all(self._word_in(word, name_terms) for word in words):
+                    name_hits.append(node_id)
+                elif len(other_hits) < limit:
+                    other_hits.append(node_id)
+            name_hits = self._live_nodes(name_hits)
+            other_hits = self._live_nodes(other_hits)
+        name_hits.sort(key=lambda node: node.name.lower())
+        return (name_hits + other_hits)[:limit]
+
+    def _live_nodes(self, node_ids):
+        """The nodes with these ids; those deleted without being reported are dropped. Caller holds the lock."""
+        nodes = []
+        for node_id in node_ids:
+            node = find_node(node_id)
+            if node is None:  # Deleted without its removal being reported
+                self._set_terms(node_id, None, None)
+            else:
+                nodes.append(node)
+        return nodes
+
+    def _matching_nodes(self, word):
+        node_ids = set(self._postings.get(word, ()))
+        if len(word) >= PREFIX_LENGTH:
+            for term in self._prefixes.get(word[:PREFIX_LENGTH], ()):
+                if term != word and term.startswith(word):
+                    node_ids |= self._postings[term]
+        return node_ids
+
+    @staticmethod
+    def _word_in(word, terms):
+        if word in terms:
+            return True
+        return len(word) >= PREFIX_LENGTH and any(term.startswith(word) for term in terms)
+
+    # --- Worker ---
+    def _submit(self, func, *args):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="search-index", daemon=True)
+            self._thread.start()
+        self._queue.put((func, args))
+
+    def _run(self):
+        while True:
+            func, args = self._queue.get()
+            try:
+                func(*args)
+            except Exception as e:  # Reported, and the queue keeps going
+                self._failed(e)
+            finally:
+                func = args = None  # Not kept alive while waiting for the next change
+                self._queue.task_done()
+
+    def _failed(self, error):
+        self.failed += 1
+        self.last_error = str(error)
+
+    def _index_subtree(self, root, content):
+        self._index_nodes(_subtree_nodes(root), content)
+
+    def _drop_subtree(self, root):
+        # Only nodes that exist were indexed, so copies not yet materialized are not entered
+        self._drop_nodes(_subtree_nodes(root, materialize=False))
+
+    def _index_nodes(self, nodes, content=True):
+        for start in range(0, len(nodes), 512):
+            batch = nodes[start:start + 512]
+            prefetched = {}
+            if content:
+                try:
+                    prefetched = prefetch_content_bytes(batch)
+                except Exception:
+                    pass  # Read note by note below, so only the notes that fail are reported
+            for node in batch:
+                content_terms = set()
+                if content:
+                    try:
+                        data = prefetched.get(id(node))
+                        if data is None:
+                            data = node.content_bytes()
+                        content_terms = tokenize(html_to_text(data.decode('utf-8')))
+                    except Exception as e:  # A bad note must not stop indexing of the others
+                        self._failed(e)
+                with self._lock:
+                    self._set_terms(node.id, tokenize(node.name), content_terms)
+
+    def _drop_nodes(self, nodes):
+        with self._lock:
+            for node in nodes:
+                if node._id is not None:  # Never given an id, so never indexed
+                    self._set_terms(node._id, None, None)
+
+    def _reindex(self, node, name, content):
+        node_id = node.id
+        with self._lock:
+            if node_id not in self._node_terms:
+                return  # Removed since the change was reported
+            name_terms, content_terms = self._node_terms[node_id]
+        if name is not None:
+            name_terms = tokenize(name)
+        if content is not None:
+            content_terms = tokenize(html_to_text(content))
+        with self._lock:
+            if node_id in self._node_terms:
+                self._set_terms(node_id, name_terms, content_terms)
+
+    def _set_terms(self, node_id, name_terms, content_terms):
+        """Replaces a node's terms; None for both removes it. Caller holds the lock."""
+        old_name_terms, old_content_terms = self._node_terms.pop(node_id, (set(), set()))
+        old_terms = old_name_terms | old_content_terms
+        new_terms = set()
+        if name_terms is not None:
+            self._node_terms[node_id] = (name_terms, content_terms)
+            new_terms = name_terms | content_terms
+        for term in old_terms - new_terms:
+            node_ids = self._postings[term]
+            node_ids.discard(node_id)
+            if not node_ids:
+                del self._postings[term]
+                prefix_terms = self._prefixes[term[:PREFIX_LENGTH]]
+                prefix_terms.discard(term)
+                if not prefix_terms:
+                    del self._prefixes[term[:PREFIX_LENGTH]]
+        for term in new_terms - old_terms:
+            node_ids = self._postings.get(term)
+            if node_ids is None:
+                node_ids = self._postings[term] = set()
+                self._prefixes.setdefault(term[:PREFIX_LENGTH], set()).add(term)
+            node_ids.add(node_id)
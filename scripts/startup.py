@@ -0,0 +1,114 @@
+import sys
+import time
+
+STARTUP_BUDGET_MS = 1500  # Launcher start to settings applied, checked by --startup-profile
+SLOWEST_IMPORTS_SHOWN = 15
+
+# Imported by launcher.py before PyQt5 so --startup-profile can time every
+# import that follows; nothing here may import Qt at module level.
+
+
+class _TimedLoader:
+    """Wraps a module's loader to time create_module and exec_module."""
+    def __init__(self, loader, name, timer):
+        self._loader = loader
+        self._name = name
+        self._timer = timer
+
+    def create_module(self, spec):
+        with self._timer.timing(self._name):
+            return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        with self._timer.timing(self._name):
+            self._loader.exec_module(module)
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+
+class ImportTimer:
+    """Meta path finder recording how long each module takes to import, excluding its own imports."""
+    def __init__(self):
+        self.self_times = {}  # Module name -> seconds spent in its own code
+        self._stack = []  # [module name, seconds spent in nested imports] being imported
+        self._finding = False
+
+    def install(self):
+        sys.meta_path.insert(0, self)
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, name, path, target=None):
+        if self._finding:
+            return None
+        self._finding = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, "find_spec"):
+                    continue
+                spec = finder.find_spec(name, path, target)
+                if spec is not None:
+                    break
+            else:
+                return None
+        finally:
+            self._finding = False
+        if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+            spec.loader = _TimedLoader(spec.loader, name, self)
+        return spec
+
+    def timing(self, name):
+        return _ImportSpan(self, name)
+
+
+class _ImportSpan:
+    __slots__ = ("timer", "name", "start")
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.timer._stack.append([self.name, 0.0])
+        self.start = time.perf_counter()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        elapsed = time.perf_counter() - self.start
+        name, nested = self.timer._stack.pop()
+        self.timer.self_times[name] = self.timer.self_times.get(name, 0.0) + elapsed - nested
+        if self.timer._stack:
+            self.timer._stack[-1][1] += elapsed
+
+
+class StartupProfile:
+    """Timestamps of the startup phases, printed as a breakdown by report()."""
+    def __init__(self, started):
+        self.started = started
+        self.marks = []  # (label, perf_counter)
+        self.imports = ImportTimer()
+
+    def mark(self, label):
+        self.marks.append((label, time.perf_counter()))
+
+    def total_ms(self):
+        return (self.marks[-1][1] - self.started) * 1000 if self.marks else 0.0
+
+    def report(self, budget_ms=STARTUP_BUDGET_MS, out=sys.stdout):
+        """Prints the phases and slowest imports; returns whether startup stayed within budget_ms."""
+        print("Startup phases (ms since the launcher started; interpreter startup not included):", file=out)
+        previous = self.started
+        for label, when in self.marks:
+            print(f"  {(when - self.started) * 1000:8.1f}  +{(when - previous) * 1000:7.1f}  {label}", file=out)
+            previous = when
+        slowest = sorted(self.imports.self_times.items(), key=lambda item: item[1], reverse=True)
+        print(f"Slowest imports ({len(slowest)} modules, "
+              f"{sum(self.imports.self_times.values()) * 1000:.1f} ms in total, own code only):", file=out)
+        for name, seconds in slowest[:SLOWEST_IMPORTS_SHOWN]:
+            print(f"  {seconds * 1000:8.1f}  {name}", file=out)
+        total = self.total_ms()
+        within = total <= budget_ms
+        print(f"Startup took {total:.1f} ms, budget {budget_ms:.0f} ms: {'ok' if within else 'OVER BUDGET'}", file=out)
+        return within
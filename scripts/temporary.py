@@ -14,14 +14,21 @@ _DEFAULT_SETTINGS = {
     "window_width": 800,
     "window_height": 600,
     "default_font": "Arial",
-    "default_font_size": 12
+    "default_font_size": 12,
+    "autosave_interval_s": 30,
+    "undo_memory_limit_mb": 32,  # Per document; the oldest undo steps are forgotten beyond this
+    "restore_session": True,  # Reopen the last session's files, each loaded when its tab is first shown
+    "instrumentation": False,  # Time file operations and tree edits; see instrument.py
+    "instrumentation_trace_file": "data/trace.json"  # Chrome trace written on exit when instrumentation is on
 }
 
 def load_settings():
     """Load settings from persistent.json."""
-    global settings
+    # Updated in place: other modules hold a reference to this dict
     try:
         with open("data/persistent.json", "r") as f:
-            settings = json.load(f)
+            loaded = json.load(f)
     except (FileNotFoundError, json.JSONDecodeError):
-        settings = _DEFAULT_SETTINGS.copy()
\ No newline at end of file
+        loaded = _DEFAULT_SETTINGS.copy()
+    settings.clear()
+    settings.update(loaded)
\ No newline at end of file
@@ -0,0 +1,227 @@
+import time
+from collections import deque
+
+UNDO_MEMORY_LIMIT = 32 << 20  # Default bytes the undo and redo stacks may hold per document
+UNDO_MERGE_WINDOW_S = 3.0  # Content edits of one note this close together undo as one step
+UNDO_MERGE_MAX_CHARS = 500  # ... as long as the merged edit stays this small
+ENTRY_OVERHEAD_BYTES = 200  # Rough cost of an entry object and its references
+NODE_OVERHEAD_BYTES = 400  # Rough cost of a node kept alive only by the log
+SIZE_SAMPLE_NODES = 1000  # Nodes of a removed subtree measured; the rest is estimated from them
+
+# Entries record the change an edit made, not a copy of what it touched, so
+# undoing or redoing one costs as much as the edit did. They are applied to an
+# editor providing place_nodes(placements), set_node_name(node, name) and
+# set_node_content(node, html), which is DocumentTab in the application; undo()
+# and redo() return the nodes to select afterwards.
+
+
+def text_diff(old, new):
+    """Returns (start, removed, inserted) turning old into new by replacing old[start:start + len(removed)]."""
+    limit = min(len(old), len(new))
+    prefix = _common_length(old, new, limit, lambda text, a, b: text[a:b])
+    limit -= prefix
+    suffix = _common_length(old, new, limit, lambda text, a, b: text[len(text) - b:len(text) - a])
+    return prefix, old[prefix:len(old) - suffix], new[prefix:len(new) - suffix]
+
+
+def _common_length(old, new, limit, part):
+    """Length of the common prefix (or suffix, depending on part) found by bisection on slice comparisons.
+
+    Each comparison runs in C on a window half the size of the last one,
+    so this stays linear without a character loop in Python.
+    """
+    low, high = 0, limit
+    while low < high:
+        middle = (low + high + 1) // 2
+        if part(old, low, middle) == part(new, low, middle):
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def apply_text_diff(text, start, removed, inserted):
+    """Replaces removed at start with inserted; raises ValueError if text no longer has removed there."""
+    end = start + len(removed)
+    if text[start:end] != removed:
+        raise ValueError("The note was changed outside the undo history")
+    return text[:start] + inserted + text[end:]
+
+
+def _subtree_bytes(node):
+    """Rough memory held by a detached subtree: a fixed cost per node plus the text loaded into memory.
+
+    Only the first SIZE_SAMPLE_NODES nodes are measured, so removing a huge
+    branch costs no more than a small one; each node still waiting to be
+    measured is counted at their average.
+    """
+    total = 0
+    measured = 0
+    stack = [node]
+    while stack and measured < SIZE_SAMPLE_NODES:
+        current = stack.pop()
+        total += NODE_OVERHEAD_BYTES + len(current._name) + len(current._content or "")
+        measured += 1
+        stack.extend(current._children)  # Children a lazy copy has not materialized cost nothing yet
+    return total + len(stack) * total // measured
+
+
+class Placement:
+    """Nodes added, removed or moved by one edit: (node, old parent, old row, new parent, new row) each.
+
+    A parent of None means the node was not in the tree. Rows are final
+    positions, so the old ones can be replayed in one pass to undo the edit.
+    """
+    def __init__(self, moves):
+        self.moves = moves
+        self.size = ENTRY_OVERHEAD_BYTES + 50 * len(moves) + sum(
+            _subtree_bytes(node) for node, _, _, new_parent, _ in moves if new_parent is None)
+
+    def undo(self, editor):
+        editor.place_nodes([(node, parent, row) for node, parent, row, _, _ in self.moves])
+        return [node if parent is not None else new_parent for node, parent, _, new_parent, _ in self.moves]
+
+    def redo(self, editor):
+        editor.place_nodes([(node, parent, row) for node, _, _, parent, row in self.moves])
+        return [node if parent is not None else old_parent for node, old_parent, _, parent, _ in self.moves]
+
+    def merge(self, entry):
+        return False
+
+
+class Rename:
+    def __init__(self, node, old_name, new_name):
+        self.node = node
+        self.old_name = old_name
+        self.new_name = new_name
+        self.size = ENTRY_OVERHEAD_BYTES + len(old_name) + len(new_name)
+
+    def undo(self, editor):
+        editor.set_node_name(self.node, self.old_name)
+        return [self.node]
+
+    def redo(self, editor):
+        editor.set_node_name(self.node, self.new_name)
+        return [self.node]
+
+    def merge(self, entry):
+        return False
+
+
+class ContentEdit:
+    """A change to a note's HTML, kept as the replaced span rather than the whole note."""
+    def __init__(self, node, old_content, new_content):
+        self.node = node
+        self.start, self.removed, self.inserted = text_diff(old_content, new_content)
+        self.time = time.monotonic()
+        self._update_size()
+
+    def _update_size(self):
+        self.size = ENTRY_OVERHEAD_BYTES + len(self.removed) + len(self.inserted)
+
+    def undo(self, editor):
+        content = apply_text_diff(self.node.content, self.start, self.inserted, self.removed)
+        editor.set_node_content(self.node, content)
+        return [self.node]
+
+    def redo(self, editor):
+        content = apply_text_diff(self.node.content, self.start, self.removed, self.inserted)
+        editor.set_node_content(self.node, content)
+        return [self.node]
+
+    def merge(self, entry):
+        """Absorbs entry if it is a small edit of the same note, made soon after, next to or inside this one."""
+        if not isinstance(entry, ContentEdit) or entry.node is not self.node:
+            return False
+        if entry.time - self.time > UNDO_MERGE_WINDOW_S:
+            return False
+        # Both spans in the text between the two edits: this one's insertion, entry's removal
+        first_end = self.start + len(self.inserted)
+        second_end = entry.start + len(entry.removed)
+        if entry.start > first_end or second_end < self.start:
+            return False
+        low, high = min(self.start, entry.start), max(first_end, second_end)
+        between = [None] * (high - low)
+        between[self.start - low:first_end - low] = self.inserted
+        between[entry.start - low:second_end - low] = entry.removed
+        between = "".join(between)
+        removed = between[:self.start - low] + self.removed + between[first_end - low:]
+        inserted = between[:entry.start - low] + entry.inserted + between[second_end - low:]
+        if len(removed) + len(inserted) > UNDO_MERGE_MAX_CHARS:
+            return False
+        self.start, self.removed, self.inserted = low, removed, inserted
+        self.time = entry.time
+        self._update_size()
+        return True
+
+
+class UndoLog:
+    """Undo and redo stacks for one document, kept under limit_bytes by forgetting the oldest edits."""
+    def __init__(self, limit_bytes=UNDO_MEMORY_LIMIT):
+        self.limit_bytes = limit_bytes
+        self.size = 0  # Estimated bytes held by both stacks
+        self._undo = deque()
+        self._redo = []
+        self.replaying = False  # Set while an entry is applied, so the edits it makes are not recorded
+
+    def record(self, entry):
+        """Adds the entry for an edit just made, merging it into the previous one where possible."""
+        if self.replaying:
+            return
+        for dropped in self._redo:
+            self.size -= dropped.size
+        self._redo.clear()
+        previous = self._undo[-1] if self._undo else None
+        if previous is not None:
+            self.size -= previous.size
+            merged = previous.merge(entry)
+            self.size += previous.size
+            if merged:
+                self._trim()
+                return
+        self._undo.append(entry)
+        self.size += entry.size
+        self._trim()
+
+    def _trim(self):
+        while self.size > self.limit_bytes and self._undo:
+            self.size -= self._undo.popleft().size
+
+    def can_undo(self):
+        return bool(self._undo)
+
+    def can_redo(self):
+        return bool(self._redo)
+
+    def undo(self, editor):
+        """Reverts the latest edit; returns the nodes to select, or None if there is nothing to undo."""
+        if not self._undo:
+            return None
+        entry = self._undo.pop()
+        nodes = self._replay(entry.undo, editor)
+        self._redo.append(entry)
+        return nodes
+
+    def redo(self, editor):
+        """Applies the latest undone edit again; returns the nodes to select, or None if there is none."""
+        if not self._redo:
+            return None
+        entry = self._redo.pop()
+        nodes = self._replay(entry.redo, editor)
+        self._undo.append(entry)
+        return nodes
+
+    def _replay(self, apply, editor):
+        self.replaying = True
+        try:
+            return apply(editor)
+        except ValueError:
+            self.clear()  # The document no longer matches the log, so no other entry can be trusted either
+            raise
+        finally:
+            self.replaying = False
+
+    def clear(self):
+        self._undo.clear()
+        self._redo.clear()
+        self.size = 0
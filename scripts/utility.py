@@ -1,25 +1,193 @@
+import os
+import re
+import itertools
+import base64
+import binascii
+import hashlib
+import threading
+import io
+import zlib
 import json
-import xml.etree.ElementTree as ET
-import sqlite3
-from copy import deepcopy
+import mmap
+import struct
+import weakref
+from instrument import timed
+
+_pending_copy_registry = weakref.WeakSet()  # Every copy that has not materialized its children yet
+_copy_lock = threading.RLock()  # Guards copy bookkeeping and Node.id; the search index worker uses both too
+_change_trackers = weakref.WeakKeyDictionary()  # Tree root -> WeakSet of the ChangeTrackers recording its edits
+_node_ids = itertools.count(1)
+_nodes_by_id = weakref.WeakValueDictionary()  # Node.id -> Node, for nodes whose id has been asked for
+
+class TreeNode:
+    """Common base for Node and other node implementations, such as compact.CompactNode."""
+    __slots__ = ()
+
+    def index_in_parent(self):
+        """Position of this node among its parent's children (0 for a root)."""
+        return self.parent.children.index(self) if self.parent is not None else 0
+
 
 # Assuming Node class is already defined in utility.py
-class Node:
+class Node(TreeNode):
+    """A tree node.
+
+    copy() is copy-on-write: the copy shares the original's name, content and
+    child structure, and its own child nodes are only created the first time
+    its children are accessed. Before either side changes, any copy that still
+    depends on it takes its own snapshot of the affected level.
+    """
+    __slots__ = ("_name", "_content", "_content_ref", "parent", "_children", "_copy_of", "_pending_copies",
+                 "_file_id", "_hash", "_content_hash", "_id", "_position", "_positions_valid",
+                 "__weakref__")  # Large trees hold millions of nodes, so no per-instance __dict__
+
     def __init__(self, name, content="", parent=None):
-        self.name = name
-        self.content = content
+        self._name = name
+        self._content = content
+        self._content_ref = None  # (source, key) while content is still on disk
         self.parent = parent
-        self.children = []
-        self.tree_item = None  # Reference to QTreeWidgetItem
+        self._children = []
+        self._copy_of = None  # Node whose children this copy has not materialized yet
+        self._pending_copies = None  # WeakSet of copies still reading this node's children
+        self._file_id = None  # Record id in the LTS2 file this node was loaded from or saved to
+        self._hash = None  # Cached subtree digest (see subtree_hash); None while stale
+        self._content_hash = None  # Cached digest of the content alone
+        self._id = None  # Assigned the first time id is read
+        self._position = 0  # Index in parent's children; trusted only below parent._positions_valid
+        self._positions_valid = 0  # Children [0, _positions_valid) have a correct _position
+
+    @property
+    def id(self):
+        """Process-wide id that stays the same while the node exists, wherever it is moved; see find_node."""
+        if self._id is None:
+            with _copy_lock:  # The search index worker assigns ids too
+                if self._id is None:
+                    node_id = next(_node_ids)
+                    _nodes_by_id[node_id] = self
+                    self._id = node_id
+        return self._id
+
+    def index_in_parent(self):
+        """Position among the parent's children, from the cached positions (renumbered after edits)."""
+        parent = self.parent
+        if parent is None:
+            return 0
+        if self._position >= parent._positions_valid:
+            parent._renumber_children()
+        position = self._position
+        if position >= len(parent._children) or parent._children[position] is not self:
+            raise ValueError(f"'{self._name}' is not among its parent's children")
+        return position
+
+    def _renumber_children(self):
+        children = self._children
+        for position in range(self._positions_valid, len(children)):
+            children[position]._position = position
+        self._positions_valid = len(children)
+
+    @property
+    def name(self):
+        return self._name
+
+    @name.setter
+    def name(self, value):
+        self._unshare(include_self=False)
+        self._name = value
+        _record_change(self)
+
+    @property
+    def children(self):
+        if self._copy_of is not None:
+            self._materialize()
+        return self._children
+
+    @property
+    def content(self):
+        """Node content, read from its backing file the first time it is needed."""
+        if self._content_ref is not None:
+            source, key = self._content_ref
+            self._content = source.read_content(key)
+            self._content_ref = None
+        return self._content
+
+    @content.setter
+    def content(self, value):
+        self._unshare(include_self=False)
+        self._content = value
+        self._content_ref = None
+        self._content_hash = None
+        _record_change(self)
+
+    def is_content_loaded(self):
+        return self._content_ref is None
+
+    def bind_content(self, source, key):
+        """Defer loading content until it is first accessed."""
+        self._content = None
+        self._content_ref = (source, key)
+
+    def content_bytes(self):
+        """Returns the UTF-8 content without caching it on the node."""
+        content_ref = self._content_ref  # Read once: the GUI thread may load or replace the content meanwhile
+        if content_ref is not None:
+            source, key = content_ref
+            return source.read_bytes(key)
+        return self._content.encode('utf-8')
 
     def add_child(self, child):
+        self.insert_child(len(self.children), child)
+        return child
+
+    def insert_child(self, index, child):
+        self._unshare(include_self=True)
         child.parent = self
-        self.children.append(child)
+        children = self._children
+        index = max(0, min(len(children), index if index >= 0 else len(children) + index))
+        children.insert(index, child)
+        child._position = index
+        if index < len(children) - 1:
+            self._positions_valid = min(self._positions_valid, index)  # Later siblings shifted
+        elif self._positions_valid == index:
+            self._positions_valid += 1
+        _record_change(self)
+
+    def move_child(self, old_index, new_index):
+        """Moves the child at old_index so it ends up at new_index."""
+        self._unshare(include_self=True)
+        children = self._children
+        children.insert(new_index, children.pop(old_index))
+        for position in range(min(old_index, new_index), max(old_index, new_index) + 1):
+            children[position]._position = position  # Only the positions in between changed
+        _record_change(self)
 
     def remove_child(self, child):
-        if child in self.children:
-            self.children.remove(child)
+        if child.parent is self and self._copy_of is None:
+            index = child.index_in_parent()
+            self._unshare(include_self=True)
+            del self._children[index]
             child.parent = None
+            self._positions_valid = min(self._positions_valid, index)
+            _record_change(self)
+
+    def replace_children(self, children):
+        """Sets the whole child list in one edit; children not in it are detached.
+
+        Batch edits build the new order and apply it here, so each parent is
+        rewritten once however many of its children change.
+        """
+        self._unshare(include_self=True)
+        kept = set(map(id, children))
+        for child in self._children:
+            if id(child) not in kept:
+                child.parent = None
+        for position, child in enumerate(children):
+            if child.parent is not None and child.parent is not self:
+                child.parent.remove_child(child)
+            child.parent = self
+            child._position = position
+        self._children = list(children)
+        self._positions_valid = len(children)
+        _record_change(self)
 
     def to_dict(self):
         return {
@@ -32,194 +200,1097 @@ class Node:
     def from_dict(cls, data):
         node = cls(data["name"], data.get("content", ""))
         for child_data in data.get("children", []):
-            node.add_child(cls.from_dict(child_data))
+            _attach(node, cls.from_dict(child_data))  # Built by loaders, so not recorded as an edit
         return node
 
     def copy(self):
-        return deepcopy(self)
+        """Returns a copy-on-write copy of this subtree in O(1)."""
+        duplicate = Node(self._name)
+        duplicate._content = self._content
+        duplicate._content_ref = self._content_ref
+        duplicate._hash = self._hash
+        duplicate._content_hash = self._content_hash
+        if self._copy_of is not None or self._children:
+            with _copy_lock:
+                duplicate._copy_of = self
+                if self._pending_copies is None:
+                    self._pending_copies = weakref.WeakSet()
+                self._pending_copies.add(duplicate)
+                _pending_copy_registry.add(duplicate)
+        return duplicate
+
+    def _materialize(self):
+        """Creates this copy's own child nodes, each a lazy copy of the original's."""
+        with _copy_lock:
+            original = self._copy_of
+            if original is None:
+                return  # Materialized by another thread meanwhile
+            children = []
+            for position, child in enumerate(original.children):
+                duplicate = child.copy()
+                duplicate.parent = self
+                duplicate._position = position
+                children.append(duplicate)
+            self._children = children
+            self._positions_valid = len(children)
+            self._copy_of = None  # Only now, so a reader seeing None finds every child in place
+            original._pending_copies.discard(self)
+            _pending_copy_registry.discard(self)
+
+    def _unshare(self, include_self):
+        """Lets copies that still read from this node or its ancestors snapshot them before a change."""
+        if not _pending_copy_registry:
+            return
+        path = []
+        node = self if include_self else self.parent
+        while node is not None:
+            path.append(node)
+            node = node.parent
+        with _copy_lock:
+            for node in reversed(path):
+                if node._copy_of is not None:
+                    node._materialize()
+                if node._pending_copies:
+                    for duplicate in list(node._pending_copies):
+                        if duplicate._copy_of is node:
+                            duplicate._materialize()
+
+def _record_change(node):
+    _invalidate_hashes(node)
+    if _change_trackers:
+        for tracker in _change_trackers.get(_root_of(node), ()):
+            tracker.changed.add(node)
+
+def _invalidate_hashes(node):
+    """Marks the subtree digests of node and its ancestors stale.
+
+    A node only has a digest while all of its descendants do, so the walk
+    can stop at the first ancestor that is already stale.
+    """
+    while node is not None and node._hash is not None:
+        node._hash = None
+        node = node.parent
+
+class ChangeTracker:
+    """Collects nodes edited since the last take().
+
+    A node is recorded when its name or content is set or its list of
+    children changes; removed and moved nodes show up through their parents.
+    Only edits to the tree under root are recorded, so other open documents
+    cost a tracker nothing; with a root of None nothing is.
+    """
+    def __init__(self, root):
+        self.root = root
+        self.changed = weakref.WeakSet()
+        if root is not None:
+            _change_trackers.setdefault(root, weakref.WeakSet()).add(self)
+
+    def take(self):
+        """Returns the recorded nodes that are still in the tree and forgets all records."""
+        nodes = [node for node in self.changed if _root_of(node) is self.root]
+        self.changed = weakref.WeakSet()
+        return nodes
+
+    def restore(self, nodes):
+        """Puts back nodes returned by take(), e.g. after a failed save."""
+        for node in nodes:
+            self.changed.add(node)
+
+def _root_of(node):
+    while node.parent is not None:
+        node = node.parent
+    return node
+
+def _attach(parent, child):
+    """Appends a freshly built child; loaders use this since no copy can depend on new nodes."""
+    child.parent = parent
+    child._position = len(parent._children)
+    if parent._positions_valid == child._position:
+        parent._positions_valid += 1
+    parent._children.append(child)
+
+def find_node(node_id):
+    """The node with the given Node.id, or None once it no longer exists."""
+    return _nodes_by_id.get(node_id)
+
+# --- Progress reporting ---
+# Long-running loaders and savers accept progress(done, total). The callback may
+# raise OperationCancelled to abort; savers then leave the target file untouched.
+PROGRESS_BYTES_STEP = 1 << 20
+PROGRESS_NODES_STEP = 1024
+
+
+class OperationCancelled(Exception):
+    """Raised from a progress callback to abort a load, import or save."""
+
+
+class _ProgressReader:
+    """File wrapper that reports bytes read to a progress callback."""
+    def __init__(self, f, total, progress):
+        self._f = f
+        self.total = total
+        self.done = 0
+        self._reported = 0
+        self._progress = progress
+
+    def read(self, size=-1):
+        data = self._f.read(size)
+        self.done += len(data)
+        if self.done - self._reported >= PROGRESS_BYTES_STEP:
+            self._reported = self.done
+            self._progress(self.done, self.total)
+        return data
+
+
+def _report(progress, done, total):
+    if progress is not None:
+        progress(done, total)
 
 # --- Helper functions for custom binary format ---
-def _write_length_prefixed_string(f, text_string):
-    """Encodes a string to UTF-8, writes its length (4 bytes, big-endian), then writes the string bytes."""
-    encoded_bytes = text_string.encode('utf-8')
-    f.write(len(encoded_bytes).to_bytes(4, 'big'))
-    f.write(encoded_bytes)
-
-def _read_length_prefixed_string(f, field_name_for_error="string"):
-    """Reads a 4-byte length (big-endian), then reads that many bytes and decodes from UTF-8."""
-    len_bytes = f.read(4)
-    if not len_bytes or len(len_bytes) < 4: # Check for EOF or incomplete length
+LTS_WRITE_BUFFER_SIZE = 1 << 20  # Bytes packed in memory before each write to disk
+
+
+class _ChunkWriter:
+    """Packs small writes into a fixed bytearray and hands it to the file in large chunks."""
+    def __init__(self, f, size=LTS_WRITE_BUFFER_SIZE):
+        self.f = f
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.used = 0
+        self.flushed = f.tell()  # File offset of buffer[0]
+
+    def tell(self):
+        return self.flushed + self.used
+
+    def pack(self, packer, *values):
+        if self.used + packer.size > len(self.buffer):
+            self.flush()
+        packer.pack_into(self.buffer, self.used, *values)
+        self.used += packer.size
+
+    def write(self, data):
+        size = len(data)
+        if self.used + size > len(self.buffer):
+            self.flush()
+            if size > len(self.buffer):
+                self.f.write(data)  # Too big to be worth copying through the buffer
+                self.flushed += size
+                return
+        self.view[self.used:self.used + size] = data
+        self.used += size
+
+    def write_string(self, text_string):
+        """Writes a UTF-8 string prefixed by its byte length (4 bytes, big-endian)."""
+        encoded_bytes = text_string.encode('utf-8')
+        self.pack(_U32, len(encoded_bytes))
+        self.write(encoded_bytes)
+
+    def flush(self):
+        if self.used:
+            self.f.write(self.view[:self.used])
+            self.flushed += self.used
+            self.used = 0
+
+
+def _unpack_string(view, pos, field_name_for_error="string"):
+    """Decodes a length-prefixed UTF-8 string at pos; returns (string, position after it)."""
+    start = pos + _U32.size
+    if start > len(view):
         raise ValueError(f"Invalid LTS file format: unexpected EOF while reading {field_name_for_error} length")
-    
-    string_len = int.from_bytes(len_bytes, 'big')
-    
-    string_bytes = f.read(string_len)
-    if len(string_bytes) != string_len: # Check for EOF or incomplete data
-        raise ValueError(f"Invalid LTS file format: unexpected EOF while reading {field_name_for_error} data (expected {string_len} bytes, got {len(string_bytes)})")
-    
-    return string_bytes.decode('utf-8')
+    (string_len,) = _U32.unpack_from(view, pos)
+    end = start + string_len
+    if end > len(view):
+        raise ValueError(f"Invalid LTS file format: unexpected EOF while reading {field_name_for_error} data (expected {string_len} bytes, got {len(view) - start})")
+    return str(view[start:end], 'utf-8'), end
 # --- End Helper functions ---
 
+# --- Image blobs ---
+# Images are stored once, keyed by the SHA-256 of their encoded bytes; node
+# content refers to them as <img src="blob:<hex digest>">.
+BLOB_SCHEME = "blob:"
+_BLOB_REF_PATTERN = r'blob:([0-9a-f]{64})'
+_BLOB_REF = re.compile(_BLOB_REF_PATTERN.encode('ascii'))
+_BLOB_REF_TEXT = re.compile(_BLOB_REF_PATTERN)
+_DATA_URI_IMAGE = re.compile(r'data:image/[\w.+-]+;base64,([A-Za-z0-9+/=\s]+)')
+_IMAGE_MIME_TYPES = ((b'\x89PNG', "image/png"), (b'\xff\xd8', "image/jpeg"), (b'GIF8', "image/gif"), (b'BM', "image/bmp"))
+
+
+class BlobStore:
+    """Content-addressed image store shared by all open documents.
+
+    A blob is held either as bytes (pasted or migrated images) or as a
+    (source, key) reference into the LTS file it was loaded from.
+    """
+    def __init__(self):
+        self._blobs = {}
+        self._lock = threading.Lock()  # Saves read blobs from a worker thread
+
+    def __contains__(self, key):
+        return key in self._blobs
+
+    def add(self, data):
+        """Stores image bytes and returns their key."""
+        key = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            if not isinstance(self._blobs.get(key), bytes):
+                self._blobs[key] = bytes(data)
+        return key
+
+    def bind(self, key, source, source_key, written=False):
+        """Records where a blob can be read from.
+
+        Bytes already held are kept, unless written is set: a save that has
+        just written them to the file lets go of them.
+        """
+        with self._lock:
+            if written or not isinstance(self._blobs.get(key), bytes):
+                self._blobs[key] = (source, source_key)
+
+    def get(self, key):
+        """Returns the blob's bytes, or None if the key is unknown."""
+        with self._lock:
+            entry = self._blobs.get(key)
+        if entry is None or isinstance(entry, bytes):
+            return entry
+        source, source_key = entry
+        return source.read_bytes(source_key)
+
+
+blob_store = BlobStore()
+
+
+def extract_inline_images(html):
+    """Moves base64 data-URI images into blob_store and returns html referring to them."""
+    if "data:image/" not in html:
+        return html
+    def store(match):
+        try:
+            data = base64.b64decode(match.group(1))
+        except (binascii.Error, ValueError):
+            return match.group(0)
+        return BLOB_SCHEME + blob_store.add(data)
+    return _DATA_URI_IMAGE.sub(store, html)
+
+def inline_blob_images(html):
+    """Replaces blob references by data URIs, for formats that have no blob section."""
+    if BLOB_SCHEME not in html:
+        return html
+    def inline(match):
+        data = blob_store.get(match.group(1))
+        if data is None:
+            return match.group(0)
+        mime_type = next((mime for magic, mime in _IMAGE_MIME_TYPES if data.startswith(magic)), "image/png")
+        return f"data:{mime_type};base64,{base64.b64encode(data).decode('ascii')}"
+    return _BLOB_REF_TEXT.sub(inline, html)
+
+# --- LTS2 indexed format ---
+# Layout: b'LTS2', u64 footer offset, node content bytes, then a footer holding
+# a section table (tag, offset, length). The b'NODE' section is the node index:
+# a u32 node count followed by one record per node in depth-first order. The
+# optional b'BLOB' section lists the images referenced by node content: a u32
+# count, then SHA-256 digest, offset and length of each image in the data area.
+# The optional b'HASH' section holds a u32 count, then the subtree and content
+# digests (see subtree_hash) of each node in record id order.
+#
+# Incremental saves append journal records after the footer. Each record is
+# b'JRNL', u64 payload length, u32 CRC-32 of the payload, then the payload:
+# the next free node id, the payload offsets of a node table and a blob table
+# (same layouts as b'NODE' and b'BLOB'), and the new content and images they
+# point to. A journal node record replaces the record with the same id, and
+# nodes no longer listed as anyone's child are gone. b'HASH' digests are not
+# journaled: those of replaced records and their ancestors are recomputed. Reading stops at the
+# first torn or corrupt record, so a crash during an append loses only that
+# save.
+LTS2_MAGIC = b'LTS2'
+JOURNAL_MAGIC = b'JRNL'
+JOURNAL_COMPACT_RATIO = 0.5  # Journal size, relative to the compacted file, that triggers a full rewrite
+JOURNAL_COMPACT_MIN_BYTES = 4 << 20
+JOURNAL_MAX_RECORDS = 1000  # Each record adds a little to load time
+_LTS2_HEADER = struct.Struct('>4sQ')
+_LTS2_SECTION = struct.Struct('>4sQQ')
+_LTS2_NODE = struct.Struct('>IiQQI')  # node id, parent id, content offset, content length, name length
+_LTS2_BLOB = struct.Struct('>32sQQ')  # SHA-256 digest, offset, length
+_LTS2_HASH = struct.Struct('>16s16s')  # subtree digest, content digest (HASH_SIZE bytes each)
+_JOURNAL_HEADER = struct.Struct('>4sQI')  # magic, payload length, payload CRC-32
+_JOURNAL_PAYLOAD = struct.Struct('>IQQ')  # next free node id, node table offset, blob table offset
+_U32 = struct.Struct('>I')
+_NO_PARENT = -1
+_MADV_DONTNEED = getattr(mmap, "MADV_DONTNEED", None)  # Not available on Windows
+MAP_RELEASE_BLOCK = 2 << 20  # A page fault maps a whole block of the file around it; released in blocks this size
+
+_lts_sources = weakref.WeakValueDictionary()  # absolute path -> LtsContentSource
+_lts_journals = weakref.WeakKeyDictionary()  # root node -> LtsJournal for the file it was loaded from or saved to
+
+
+class LtsContentSource:
+    """Reads node content on demand from the data section of an LTS2 file.
+
+    After map(), content is read from a read-only memory map of the file
+    instead, and the pages read are handed back to the OS afterwards, so
+    viewing a huge file never holds more of it than the note being read.
+    """
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self._file = None
+        self._mapped = False
+        self._map = None
+        self._retired = False  # Set once a save is about to replace the file at its path
+        self._moved_aside = False  # Windows only: the file was renamed for the save and goes with this source
+        self._lock = threading.Lock()  # Saves read content from a worker thread
+
+    def map(self):
+        """Reads content from a memory map of the file from now on."""
+        with self._lock:
+            self._mapped = True
+
+    def read_bytes(self, key):
+        offset, length = key
+        with self._lock:
+            if self._mapped:
+                data = self._mapping(offset + length)[offset:offset + length]
+                self._release_pages(offset, length)
+                return data
+            if self._file is None:
+                self._file = open(self.file_name, "rb")
+            self._file.seek(offset)
+            data = self._file.read(length)
+        if len(data) != length:
+            raise ValueError(f"Invalid LTS file format: node content truncated in '{self.file_name}'")
+        return data
+
+    def read_content(self, key):
+        if not self._mapped:
+            return self.read_bytes(key).decode('utf-8')
+        offset, length = key
+        with self._lock:
+            # Decoded straight from the mapped pages, without a bytes copy in between
+            with memoryview(self._mapping(offset + length)) as mapping, mapping[offset:offset + length] as data:
+                content = str(data, 'utf-8')
+            self._release_pages(offset, length)
+        return content
+
+    def _mapping(self, end):
+        """The memory map, remapped if the file has grown past it since (a save appended to it). Caller holds the lock."""
+        if self._map is None or end > len(self._map):
+            if self._map is not None:
+                self._map.close()
+            if self._file is None:
+                self._file = open(self.file_name, "rb")
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            if end > len(self._map):
+                raise ValueError(f"Invalid LTS file format: node content truncated in '{self.file_name}'")
+        return self._map
+
+    def _release_pages(self, offset, length):
+        """Drops the mapped pages just read from this process's memory; they are read again if needed."""
+        if _MADV_DONTNEED is not None and length:
+            start = offset - offset % MAP_RELEASE_BLOCK
+            end = min(len(self._map), -(-(offset + length) // MAP_RELEASE_BLOCK) * MAP_RELEASE_BLOCK)
+            self._map.madvise(_MADV_DONTNEED, start, end - start)
+
+    def retire(self):
+        """Keeps the file readable by nodes outside a tree that is about to be saved over it.
+
+        The open handle (and any map) keeps the old data reachable after the
+        new file replaces it, so the path always holds one complete file.
+        Windows cannot replace a file that is open: there it is moved aside
+        instead and deleted once the last node referring to this source is gone.
+        """
+        with self._lock:
+            if self._retired:
+                return
+            self._retired = True
+            if os.name != "nt":
+                if self._file is None:
+                    self._file = open(self.file_name, "rb")
+                return
+        self.close()
+        with self._lock:
+            directory, base_name = os.path.split(self.file_name)
+            import tempfile  # Only needed when saving over an open file
+            fd, aside_name = tempfile.mkstemp(prefix=base_name + ".", suffix=".old", dir=directory)
+            os.close(fd)
+            os.replace(self.file_name, aside_name)
+            self.file_name = aside_name
+            self._moved_aside = True
+
+    def close(self):
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __deepcopy__(self, memo):
+        return self  # Sources are shared, read-only handles
+
+    def __del__(self):
+        self.close()
+        if self._moved_aside:
+            try:
+                os.remove(self.file_name)
+            except OSError:
+                pass
+
+
+def get_lts_source(file_name):
+    """Returns the shared content source for an LTS2 file."""
+    key = os.path.abspath(file_name)
+    source = _lts_sources.get(key)
+    if source is None:
+        source = LtsContentSource(key)
+        _lts_sources[key] = source
+    return source
+
+
+def iter_tree_preorder(root):
+    """Yields (node, parent) pairs depth-first without recursion."""
+    stack = [(root, None)]
+    while stack:
+        node, parent = stack.pop()
+        yield node, parent
+        for child in reversed(node.children):
+            stack.append((child, node))
+
+
+def prefetch_content_bytes(nodes):
+    """Returns {id(node): bytes} for nodes whose content is still in their source.
+
+    Sources that support it are read in batches rather than node by node.
+    Nothing is cached on the nodes themselves.
+    """
+    by_source = {}
+    for node in nodes:
+        content_ref = node._content_ref  # Read once: the GUI thread may load or replace the content meanwhile
+        if content_ref is not None:
+            source, key = content_ref
+            by_source.setdefault(id(source), (source, []))[1].append((node, key))
+    fetched = {}
+    for source, source_nodes in by_source.values():
+        read_many = getattr(source, "read_many_bytes", None)
+        if read_many is None:
+            continue
+        data = read_many([key for _, key in source_nodes])
+        for node, key in source_nodes:
+            fetched[id(node)] = data.get(key, b'')
+    return fetched
+
+# --- Subtree digests ---
+# A node's digest covers its name, its content and its children's digests in
+# order, so two subtrees are identical exactly when their digests are. Digests
+# are cached on the nodes and marked stale up the parent chain by every edit,
+# so rehashing a document after an edit only reads the nodes that changed.
+HASH_SIZE = 16  # Bytes of BLAKE2b digest
+
+@timed
+def subtree_hash(root, progress=None):
+    """Returns root's subtree digest, computing any stale digests below it."""
+    if root._hash is not None:
+        return root._hash
+    stale = []  # Parents before children; subtrees whose digest is current are not entered
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        stale.append(node)
+        stack.extend(child for child in node.children if child._hash is None)
+    unhashed = [node for node in stale if node._content_hash is None]
+    total = len(unhashed)
+    blake2b = hashlib.blake2b
+    for start in range(0, total, PROGRESS_NODES_STEP):
+        _report(progress, start, total)
+        batch = unhashed[start:start + PROGRESS_NODES_STEP]
+        prefetched = prefetch_content_bytes(batch)
+        for node in batch:
+            data = prefetched.get(id(node))
+            if data is None:
+                data = node.content_bytes()
+            node._content_hash = blake2b(data, digest_size=HASH_SIZE).digest()
+    for node in reversed(stale):
+        name = node.name.encode('utf-8')
+        parts = [len(name).to_bytes(4, 'big'), name, node._content_hash]
+        parts.extend(child._hash for child in node.children)
+        node._hash = blake2b(b''.join(parts), digest_size=HASH_SIZE).digest()
+    _report(progress, total, total)
+    return root._hash
+
 # LTS format functions
-def save_tree_to_custom_format(tree, file_name):
+@timed
+def save_tree_to_custom_format(tree, file_name, version=2, progress=None):
+    """Saves a tree as LTS2 (default) or legacy LTS1 via a temporary file.
+
+    Returns the file name actually written (".lts" is appended if missing).
+    """
     if not file_name.endswith(".lts"):
         file_name += ".lts"
+    temp_name = file_name + ".tmp"
     try:
-        with open(file_name, "wb") as f:
-            f.write(b'LTS1') # Magic number
-            _write_node_recursive(f, tree)
+        with open(temp_name, "wb") as f:
+            if version == 1:
+                _write_lts1(f, tree, progress)
+                content_keys, blob_keys, written = [], [], None
+            else:
+                content_keys, blob_keys, written = _write_lts2(f, tree, progress)
+            f.flush()
+            os.fsync(f.fileno())
+        _replace_lts_file(temp_name, file_name, content_keys, blob_keys)
     except IOError as e:
+        _remove_if_exists(temp_name)
         raise IOError(f"Error saving to LTS file '{file_name}': {e}")
+    except BaseException:
+        _remove_if_exists(temp_name)
+        raise
+    if written is None:
+        _number_nodes(tree)  # The ids reading the LTS1 file back gives, for crash recovery against it
+        _lts_journals.pop(tree, None)
+    else:
+        for node_id, node in enumerate(written):
+            node._file_id = node_id
+        _lts_journals[tree] = LtsJournal(os.path.abspath(file_name), len(written),
+                                         [key for key, _, _ in blob_keys])
+    return file_name
 
-def _write_node_recursive(f, node_to_write):
-    _write_length_prefixed_string(f, node_to_write.name)
-    _write_length_prefixed_string(f, node_to_write.content)
-    
-    f.write(len(node_to_write.children).to_bytes(4, 'big'))
-    for child in node_to_write.children:
-        _write_node_recursive(f, child)
+@timed
+def save_tree_incremental(tree, file_name, changed_nodes, progress=None):
+    """Saves only changed_nodes (from ChangeTracker.take) by appending a journal record.
 
-def load_tree_from_custom_format(file_name):
+    Falls back to a full save, which also compacts the journal, when the tree
+    was not loaded from or last saved to file_name, the file has changed on
+    disk since, or the journal has outgrown JOURNAL_COMPACT_RATIO.
+    Returns the file name actually written.
+    """
+    if not file_name.endswith(".lts"):
+        file_name += ".lts"
+    journal = _lts_journals.get(tree)
+    if journal is None or not journal.can_append(file_name):
+        return save_tree_to_custom_format(tree, file_name, progress=progress)
+    try:
+        _append_lts_journal(tree, journal, changed_nodes, progress)
+    except IOError as e:
+        raise IOError(f"Error saving to LTS file '{file_name}': {e}")
+    return file_name
+
+def _remove_if_exists(file_name):
+    if os.path.exists(file_name):
+        os.remove(file_name)
+
+def _write_lts2(f, tree, progress=None):
+    """Writes tree as LTS2.
+
+    Returns (node, key) pairs for content that is still on disk,
+    (blob key, offset, length) for each image written and the nodes in
+    record id order.
+    """
+    out = _ChunkWriter(f)
+    out.pack(_LTS2_HEADER, LTS2_MAGIC, 0)
+    node_ids = {}
+    records = []
+    content_keys = []
+    referenced_blobs = set()
+    ordered = list(iter_tree_preorder(tree))
+    total = len(ordered)
+    prefetched = {}
+    for node, parent in ordered:
+        node_id = len(records)
+        if node_id % PROGRESS_NODES_STEP == 0:
+            _report(progress, node_id, total)
+            batch = ordered[node_id:node_id + PROGRESS_NODES_STEP]
+            prefetched = prefetch_content_bytes(node for node, _ in batch)
+        node_ids[id(node)] = node_id
+        parent_id = node_ids[id(parent)] if parent is not None else _NO_PARENT
+        data = prefetched.get(id(node))
+        if data is None:
+            data = node.content_bytes()
+        offset = out.tell()
+        out.write(data)
+        if BLOB_SCHEME.encode('ascii') in data:
+            referenced_blobs.update(_BLOB_REF.findall(data))
+        if node._content_hash is None:
+            node._content_hash = hashlib.blake2b(data, digest_size=HASH_SIZE).digest()
+        if not node.is_content_loaded():
+            content_keys.append((node, (offset, len(data))))
+        records.append((node, node_id, parent_id, offset, len(data)))
+    blob_keys = []
+    for digest in sorted(referenced_blobs):
+        key = digest.decode('ascii')
+        data = blob_store.get(key)
+        if data is None:
+            continue  # Unknown image; the reference is kept and shows as missing, as before
+        blob_keys.append((key, out.tell(), len(data)))
+        out.write(data)
+    index_offset = out.tell()
+    out.pack(_U32, len(records))
+    for node, node_id, parent_id, offset, length in records:
+        _pack_node_record(out, node, node_id, parent_id, offset, length,
+                          [node_ids[id(child)] for child in node.children])
+    blob_offset = out.tell()
+    _pack_blob_table(out, blob_keys)
+    hash_offset = out.tell()
+    subtree_hash(tree)  # Only names and child digests are left to hash
+    out.pack(_U32, len(records))
+    for node, _, _, _, _ in records:
+        out.pack(_LTS2_HASH, node._hash, node._content_hash)
+    footer_offset = out.tell()
+    sections = [
+        (b'DATA', _LTS2_HEADER.size, index_offset - _LTS2_HEADER.size),
+        (b'NODE', index_offset, blob_offset - index_offset),
+        (b'BLOB', blob_offset, hash_offset - blob_offset),
+        (b'HASH', hash_offset, footer_offset - hash_offset),
+    ]
+    out.pack(_U32, len(sections))
+    for tag, offset, length in sections:
+        out.pack(_LTS2_SECTION, tag, offset, length)
+    out.flush()
+    f.seek(0)
+    f.write(_LTS2_HEADER.pack(LTS2_MAGIC, footer_offset))
+    _report(progress, total, total)
+    return content_keys, blob_keys, [record[0] for record in records]
+
+def _pack_node_record(out, node, node_id, parent_id, offset, length, child_ids):
+    name_bytes = node.name.encode('utf-8')
+    out.pack(_LTS2_NODE, node_id, parent_id, offset, length, len(name_bytes))
+    out.write(name_bytes)
+    out.pack(_U32, len(child_ids))
+    for child_id in child_ids:
+        out.pack(_U32, child_id)
+
+def _pack_blob_table(out, blob_keys):
+    out.pack(_U32, len(blob_keys))
+    for key, offset, length in blob_keys:
+        out.pack(_LTS2_BLOB, bytes.fromhex(key), offset, length)
+
+class LtsJournal:
+    """Tracks where a document's next journal record goes and what its LTS2 file already holds."""
+    def __init__(self, file_name, next_id, blob_keys, base_size=None, end=None, records=0):
+        self.file_name = file_name  # Absolute path
+        self.next_id = next_id  # First node id not used in the file
+        self.blob_keys = set(blob_keys)  # Images already stored in the file
+        stat = os.stat(file_name)
+        self.base_size = stat.st_size if base_size is None else base_size  # Offset of the first record
+        self.end = stat.st_size if end is None else end  # Offset after the last intact record
+        self.records = records
+        self.stamp = (stat.st_size, stat.st_mtime_ns)
+
+    def can_append(self, file_name):
+        if os.path.abspath(file_name) != self.file_name:
+            return False
+        try:
+            stat = os.stat(self.file_name)
+        except OSError:
+            return False
+        if (stat.st_size, stat.st_mtime_ns) != self.stamp:
+            return False  # Rewritten by someone else, e.g. another tab on the same file
+        limit = max(JOURNAL_COMPACT_MIN_BYTES, self.base_size * JOURNAL_COMPACT_RATIO)
+        return self.end - self.base_size < limit and self.records < JOURNAL_MAX_RECORDS
+
+def _append_lts_journal(tree, journal, changed_nodes, progress=None):
+    """Appends one journal record holding changed_nodes and any new nodes below them."""
+    source = get_lts_source(journal.file_name)
+    new_ids = {}
+    nodes = []
+    seen = set()
+    stack = [node for node in changed_nodes if _root_of(node) is tree]
+    while stack:
+        node = stack.pop()
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        nodes.append(node)
+        if node._file_id is None:
+            new_ids[id(node)] = journal.next_id + len(new_ids)
+        stack.extend(child for child in node.children if child._file_id is None)
+    if not nodes:
+        return
+    def record_id(node):
+        return node._file_id if node._file_id is not None else new_ids[id(node)]
+
+    buffer = io.BytesIO()
+    out = _ChunkWriter(buffer)
+    out.pack(_JOURNAL_PAYLOAD, 0, 0, 0)  # Filled in once the tables are placed
+    payload_offset = journal.end + _JOURNAL_HEADER.size
+    entries = []
+    referenced_blobs = set()
+    for count, node in enumerate(nodes):
+        if count % PROGRESS_NODES_STEP == 0:
+            _report(progress, count, len(nodes))
+        content_ref = node._content_ref
+        if content_ref is not None and content_ref[0] is source:
+            offset, length = content_ref[1]  # Unchanged content already in this file
+        else:
+            data = node.content_bytes()
+            offset, length = payload_offset + out.tell(), len(data)
+            out.write(data)
+            if BLOB_SCHEME.encode('ascii') in data:
+                referenced_blobs.update(_BLOB_REF.findall(data))
+        entries.append((node, offset, length))
+    blob_keys = []
+    for digest in sorted(referenced_blobs):
+        key = digest.decode('ascii')
+        data = None if key in journal.blob_keys else blob_store.get(key)
+        if data is not None:
+            blob_keys.append((key, payload_offset + out.tell(), len(data)))
+            out.write(data)
+    node_table = out.tell()
+    out.pack(_U32, len(entries))
+    for node, offset, length in entries:
+        parent_id = record_id(node.parent) if node.parent is not None else _NO_PARENT
+        _pack_node_record(out, node, record_id(node), parent_id, offset, length,
+                          [record_id(child) for child in node.children])
+    blob_table = out.tell()
+    _pack_blob_table(out, blob_keys)
+    out.flush()
+    next_id = journal.next_id + len(new_ids)
+    with buffer.getbuffer() as view:
+        _JOURNAL_PAYLOAD.pack_into(view, 0, next_id, node_table, blob_table)
+    payload = buffer.getvalue()
+
+    with open(journal.file_name, "r+b") as f:
+        f.seek(journal.end)
+        f.truncate()  # Drops a record torn by an earlier crash
+        f.write(_JOURNAL_HEADER.pack(JOURNAL_MAGIC, len(payload), zlib.crc32(payload)))
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    for node in nodes:
+        if node._file_id is None:
+            node._file_id = new_ids[id(node)]
+    for key, offset, length in blob_keys:
+        blob_store.bind(key, source, (offset, length), written=True)
+        journal.blob_keys.add(key)
+    stat = os.stat(journal.file_name)
+    journal.next_id = next_id
+    journal.end = payload_offset + len(payload)
+    journal.records += 1
+    journal.stamp = (stat.st_size, stat.st_mtime_ns)
+    _report(progress, len(nodes), len(nodes))
+
+def _replace_lts_file(temp_name, file_name, content_keys, blob_keys=()):
+    """Moves a freshly written file into place and repoints lazily loaded nodes and images at it.
+
+    Nodes and images the new file does not hold, e.g. in copies, the clipboard
+    or the undo log, keep reading the old file through its retired source.
+    """
+    target = os.path.abspath(file_name)
+    old_source = _lts_sources.get(target)
+    if old_source is not None:
+        old_source.retire()
+        old_source = None
+    os.replace(temp_name, target)
+    new_source = LtsContentSource(target)  # Bound only now, so nothing reads the old file through it
+    for node, key in content_keys:
+        node.bind_content(new_source, key)
+    for key, offset, length in blob_keys:
+        blob_store.bind(key, new_source, (offset, length), written=True)
+    _lts_sources[target] = new_source
+
+def _write_lts1(f, tree, progress=None):
+    """Writes tree in the legacy LTS1 layout: each node's name, content and child count, depth-first."""
+    out = _ChunkWriter(f)
+    out.write(b'LTS1') # Magic number
+    ordered = list(iter_tree_preorder(tree))
+    total = len(ordered)
+    for count, (node, _) in enumerate(ordered):
+        if count % PROGRESS_NODES_STEP == 0:
+            _report(progress, count, total)
+        out.write_string(node.name)
+        out.write_string(inline_blob_images(node.content))  # LTS1 has no blob section
+        out.pack(_U32, len(node.children))
+    out.flush()
+    _report(progress, total, total)
+
+@timed
+def load_tree_from_custom_format(file_name, progress=None):
+    """Loads an LTS file. LTS2 loads only the tree skeleton; content is read on demand."""
     try:
         with open(file_name, "rb") as f:
             magic_number = f.read(4)
+            if magic_number == LTS2_MAGIC:
+                return _read_lts2(f, file_name, progress)
             if magic_number != b'LTS1':
                 raise ValueError("Invalid LTS file format: incorrect magic number")
-            return _read_node_recursive(f)
+            data = f.read()
+    except IOError as e:
+        raise IOError(f"Error loading from LTS file '{file_name}': {e}")
+    with memoryview(data) as view:
+        return _read_lts1(view, progress)
+    # ValueError from _read_lts1 or magic number check will propagate
+
+@timed
+def load_tree_mapped(file_name, progress=None):
+    """Loads an LTS2 file for viewing only: the tree skeleton is built and content is read from a memory map of the file."""
+    try:
+        with open(file_name, "rb") as f:
+            magic_number = f.read(4)
     except IOError as e:
         raise IOError(f"Error loading from LTS file '{file_name}': {e}")
-    # ValueError from _read_node_recursive or magic number check will propagate
+    if magic_number != LTS2_MAGIC:
+        raise ValueError("Only LTS2 files can be opened read-only; open and save the file to convert it")
+    root = load_tree_from_custom_format(file_name, progress)
+    get_lts_source(file_name).map()
+    return root
 
-def _read_node_recursive(f):
-    name = _read_length_prefixed_string(f, "node name")
-    content = _read_length_prefixed_string(f, "node content")
+def _read_lts1(view, progress=None):
+    """Parses an LTS1 body (everything after the magic number) without recursion."""
+    total = len(view)
+    pos = 0
+    root = None
+    stack = []  # [node, children still to be read] for each open ancestor
+    count = 0
+    while True:
+        name, pos = _unpack_string(view, pos, "node name")
+        content, pos = _unpack_string(view, pos, "node content")
+        if pos + _U32.size > total:
+            raise ValueError("Invalid LTS file format: unexpected EOF while reading number of children")
+        (num_children,) = _U32.unpack_from(view, pos)
+        pos += _U32.size
 
-    current_node = Node(name, content)
+        current_node = Node(name, content)
+        current_node._file_id = count  # Depth-first position, as _number_nodes gives formats without record ids
+        if stack:
+            _attach(stack[-1][0], current_node)
+            stack[-1][1] -= 1
+        else:
+            root = current_node
+        if num_children:
+            stack.append([current_node, num_children])
+        while stack and stack[-1][1] == 0:
+            stack.pop()
+        if not stack:
+            _report(progress, total, total)
+            return root
 
-    num_children_bytes = f.read(4)
-    if not num_children_bytes or len(num_children_bytes) < 4: # Check for EOF
-        raise ValueError("Invalid LTS file format: unexpected EOF while reading number of children")
-    num_children = int.from_bytes(num_children_bytes, 'big')
+        count += 1
+        if count % PROGRESS_NODES_STEP == 0:
+            _report(progress, pos, total)
 
-    for _ in range(num_children):
-        child_node = _read_node_recursive(f)
-        current_node.add_child(child_node)
-    
-    return current_node
+def _read_lts2_sections(f):
+    """Reads the LTS2 footer section table as ({tag: (offset, length)}, offset after the footer)."""
+    f.seek(0)
+    header = f.read(_LTS2_HEADER.size)
+    if len(header) < _LTS2_HEADER.size:
+        raise ValueError("Invalid LTS file format: truncated header")
+    _, footer_offset = _LTS2_HEADER.unpack(header)
+    f.seek(footer_offset)
+    count_bytes = f.read(_U32.size)
+    if len(count_bytes) < _U32.size:
+        raise ValueError("Invalid LTS file format: missing footer")
+    (section_count,) = _U32.unpack(count_bytes)
+    table = f.read(section_count * _LTS2_SECTION.size)
+    if len(table) < section_count * _LTS2_SECTION.size:
+        raise ValueError("Invalid LTS file format: truncated section table")
+    sections = {}
+    for i in range(section_count):
+        tag, offset, length = _LTS2_SECTION.unpack_from(table, i * _LTS2_SECTION.size)
+        sections[tag] = (offset, length)
+    return sections, footer_offset + _U32.size + len(table)
 
-# CherryTree Importer
-def import_cherrytree(file_name):
-    """Imports a CherryTree document (.ctd) into the application's Node structure."""
+def _read_lts2(f, file_name, progress=None):
+    sections, footer_end = _read_lts2_sections(f)
+    if b'NODE' not in sections:
+        raise ValueError("Invalid LTS file format: missing node index")
+    index_offset, index_length = sections[b'NODE']
+    f.seek(index_offset)
+    index = f.read(index_length)
+    if len(index) != index_length:
+        raise ValueError("Invalid LTS file format: truncated node index")
+    source = get_lts_source(file_name)
+    index = memoryview(index)
+    f.seek(footer_end)
+    records, journal_end = _read_journal_records(f.read(), footer_end)
+    if records:
+        return _read_lts2_journaled(f, file_name, sections, index, records, footer_end, journal_end)
     try:
-        xml_tree = ET.parse(file_name)
-        xml_root = xml_tree.getroot() 
-    except FileNotFoundError:
-        raise FileNotFoundError(f"CherryTree file not found: {file_name}")
-    except ET.ParseError:
-        raise ValueError(f"Invalid XML in CherryTree file: {file_name}")
-
-    app_root_node = Node("Imported CherryTree") 
-
-    def _parse_xml_node(xml_node_element, parent_app_node):
-        name = xml_node_element.get("name", "Untitled")
-        rich_text_content = xml_node_element.get("rich_text", "")
-        if not rich_text_content:
-             rich_text_element = xml_node_element.find('rich_text')
-             if rich_text_element is not None and rich_text_element.text:
-                 rich_text_content = rich_text_element.text
-        app_node = Node(name, rich_text_content)
-        if parent_app_node:
-            parent_app_node.add_child(app_node)
-        for child_xml_element in xml_node_element.findall('node'):
-            _parse_xml_node(child_xml_element, app_node)
-        return app_node
-
-    for child_xml_node in xml_root.findall('node'):
-        _parse_xml_node(child_xml_node, app_root_node)
-    return app_root_node
-
-# NoteCase Importer
-def import_notecase(file_name):
-    """Imports a NoteCase document (.ncd) into the application's Node structure."""
-    conn = None
+        (node_count,) = _U32.unpack_from(index, 0)
+        pos = _U32.size
+        nodes = [None] * node_count
+        root = None
+        for i in range(node_count):
+            if i % PROGRESS_NODES_STEP == 0:
+                _report(progress, pos, index_length)
+            node_id, parent_id, offset, length, name_len = _LTS2_NODE.unpack_from(index, pos)
+            pos += _LTS2_NODE.size
+            name = str(index[pos:pos + name_len], 'utf-8')
+            pos += name_len
+            (child_count,) = _U32.unpack_from(index, pos)
+            pos += _U32.size + child_count * _U32.size  # Child order follows from the depth-first records
+            node = Node(name)
+            node._file_id = node_id
+            if length:
+                node.bind_content(source, (offset, length))
+            nodes[node_id] = node
+            if parent_id == _NO_PARENT:
+                root = node
+            else:
+                _attach(nodes[parent_id], node)
+    except (struct.error, IndexError, TypeError, AttributeError):
+        raise ValueError("Invalid LTS file format: corrupt node index")
+    if root is None:
+        raise ValueError("Invalid LTS file format: no root node")
+    blob_keys = _read_lts2_blobs(f, sections[b'BLOB'], source) if b'BLOB' in sections else []
+    if b'HASH' in sections:
+        _read_lts2_hashes(f, sections[b'HASH'], nodes)
+    _lts_journals[root] = LtsJournal(os.path.abspath(file_name), node_count, blob_keys, footer_end, footer_end)
+    _report(progress, index_length, index_length)
+    return root
+
+def _read_lts2_blobs(f, section, source):
+    """Registers the file's images with blob_store without reading them; returns their keys."""
+    table_offset, table_length = section
+    f.seek(table_offset)
+    return _bind_blob_table(f.read(table_length), source)
+
+def _read_lts2_hashes(f, section, nodes):
+    """Restores the cached digests of nodes (indexed by record id) from a b'HASH' section."""
+    table_offset, table_length = section
+    f.seek(table_offset)
+    table = f.read(table_length)
     try:
-        conn = sqlite3.connect(file_name)
-        cursor = conn.cursor()
-        
-        # Check if nodes table exists
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='nodes'")
-        if not cursor.fetchone():
-            raise ValueError("No 'nodes' table found in NoteCase database")
-        
-        try:
-            cursor.execute("SELECT id, parent_id, title, html_content FROM nodes ORDER BY parent_id, id")
-            all_rows = cursor.fetchall()
-        except sqlite3.OperationalError:
-            try:
-                cursor.execute("SELECT id, parent_id, title, rtf_content FROM nodes ORDER BY parent_id, id")
-                all_rows = cursor.fetchall()
-            except sqlite3.OperationalError as e_inner:
-                raise ValueError(f"Could not find expected table/columns in NoteCase DB: {e_inner}")
-        
-        if not all_rows:
-            raise ValueError("NoteCase database is empty")
-        
-        app_root_node = Node("Imported NoteCase")
-        db_nodes_map = {}
-        raw_node_data = []
-
-        for row in all_rows:
-            node_id, parent_id, title, content_data = row[0], row[1], row[2], row[3]
-            title = title if title else "Untitled"
-            content = str(content_data if content_data is not None else "")
-            app_node = Node(name=title, content=content)
-            db_nodes_map[node_id] = app_node
-            raw_node_data.append({'id': node_id, 'parent_id': parent_id})
-
-        for data in raw_node_data:
-            node_id = data['id']
-            parent_id = data['parent_id']
-            app_node = db_nodes_map.get(node_id)
-            if app_node:
-                parent_app_node = db_nodes_map.get(parent_id)
-                if parent_app_node:
-                    parent_app_node.add_child(app_node)
-                else:
-                    app_root_node.add_child(app_node)
-        
-        return app_root_node
-
-    except FileNotFoundError:
-        raise FileNotFoundError(f"NoteCase file not found: {file_name}")
-    except sqlite3.Error as e: 
-        raise ValueError(f"Database error with NoteCase file '{file_name}': {e}")
-    except Exception as e: 
-        raise RuntimeError(f"An unexpected error occurred during NoteCase import: {e}")
-    finally:
-        if conn:
-            conn.close()
+        (count,) = _U32.unpack_from(table, 0)
+        if count != len(nodes):
+            return  # Written for a different node table; digests are recomputed when needed
+        for node, (digest, content_digest) in zip(nodes, _LTS2_HASH.iter_unpack(table[_U32.size:])):
+            if node is not None:
+                node._hash = digest
+                node._content_hash = content_digest
+    except struct.error:
+        raise ValueError("Invalid LTS file format: corrupt hash table")
+
+def _bind_blob_table(table, source):
+    try:
+        (blob_count,) = _U32.unpack_from(table, 0)
+        keys = []
+        for i in range(blob_count):
+            digest, offset, length = _LTS2_BLOB.unpack_from(table, _U32.size + i * _LTS2_BLOB.size)
+            keys.append(digest.hex())
+            blob_store.bind(keys[-1], source, (offset, length))
+        return keys
+    except struct.error:
+        raise ValueError("Invalid LTS file format: corrupt blob table")
+
+def _read_journal_records(tail, start):
+    """Splits the bytes after the footer into journal payloads.
+
+    Returns ([(payload, file offset of payload)], offset after the last intact record).
+    """
+    tail = memoryview(tail)
+    records = []
+    pos = 0
+    while pos + _JOURNAL_HEADER.size <= len(tail):
+        magic, length, crc = _JOURNAL_HEADER.unpack_from(tail, pos)
+        begin = pos + _JOURNAL_HEADER.size
+        end = begin + length
+        if magic != JOURNAL_MAGIC or end > len(tail) or zlib.crc32(tail[begin:end]) != crc:
+            break  # Torn or corrupt: everything from here on is ignored
+        records.append((tail[begin:end], start + begin))
+        pos = end
+    return records, start + pos
+
+def _read_lts2_journaled(f, file_name, sections, index, records, footer_end, journal_end):
+    """Builds the tree from the node index with every journal record applied on top."""
+    source = get_lts_source(file_name)
+    table = {}
+    replaced = set()  # Ids of records replaced or added by the journal
+    try:
+        root_id = _parse_node_table(index, table)
+        next_id = base_count = len(table)
+        blob_keys = _read_lts2_blobs(f, sections[b'BLOB'], source) if b'BLOB' in sections else []
+        for payload, _ in records:
+            record_next_id, node_table, blob_table = _JOURNAL_PAYLOAD.unpack_from(payload, 0)
+            journal_table = {}
+            _parse_node_table(payload[node_table:blob_table], journal_table)
+            table.update(journal_table)
+            replaced.update(journal_table)
+            blob_keys += _bind_blob_table(payload[blob_table:], source)
+            next_id = max(next_id, record_next_id)
+        if root_id is None:
+            raise ValueError("Invalid LTS file format: no root node")
+        root, child_ids = _node_from_record(table, root_id, source)
+        nodes = [None] * base_count  # Base records by id, for their digests
+        nodes[root_id] = root
+        stack = [(root, child_ids)]
+        while stack:
+            parent, child_ids = stack.pop()
+            for child_id in child_ids:
+                child, grandchild_ids = _node_from_record(table, child_id, source)
+                _attach(parent, child)
+                if child_id < base_count:
+                    nodes[child_id] = child
+                if grandchild_ids:
+                    stack.append((child, grandchild_ids))
+    except (struct.error, KeyError, IndexError):
+        raise ValueError("Invalid LTS file format: corrupt node index or journal")
+    if b'HASH' in sections:
+        _read_lts2_hashes(f, sections[b'HASH'], nodes)
+        for node_id in replaced:
+            node = nodes[node_id] if node_id < base_count else None
+            if node is not None:
+                node._content_hash = None
+                _invalidate_hashes(node)
+    _lts_journals[root] = LtsJournal(os.path.abspath(file_name), next_id, blob_keys,
+                                     footer_end, journal_end, len(records))
+    return root
+
+def _parse_node_table(view, table):
+    """Reads node records into table as {id: (name, offset, length, child ids)}; returns the root's id."""
+    (node_count,) = _U32.unpack_from(view, 0)
+    pos = _U32.size
+    root_id = None
+    for _ in range(node_count):
+        node_id, parent_id, offset, length, name_len = _LTS2_NODE.unpack_from(view, pos)
+        pos += _LTS2_NODE.size
+        name = str(view[pos:pos + name_len], 'utf-8')
+        pos += name_len
+        (child_count,) = _U32.unpack_from(view, pos)
+        pos += _U32.size
+        table[node_id] = (name, offset, length, struct.unpack_from(f'>{child_count}I', view, pos))
+        pos += child_count * _U32.size
+        if parent_id == _NO_PARENT:
+            root_id = node_id
+    return root_id
+
+def _node_from_record(table, node_id, source):
+    name, offset, length, child_ids = table.pop(node_id)  # Popped so a corrupt cycle cannot loop forever
+    node = Node(name)
+    node._file_id = node_id
+    if length:
+        node.bind_content(source, (offset, length))
+    return node, child_ids
 
 # File operation functions
+@timed
 def save_tree_to_file(tree, file_name):
     if not file_name.endswith(".lts"): 
         file_name += ".lts" 
     with open(file_name, "w") as f:
         try:
-            json.dump(tree.to_dict(), f, indent=2)
+            json.dump(_inline_blobs_in_dict(tree.to_dict()), f, indent=2)
+            _number_nodes(tree)
+            _lts_journals.pop(tree, None)
         except IOError as e: 
             raise IOError(f"Error writing JSON to file '{file_name}': {e}")
         except TypeError as e: 
             raise TypeError(f"Error serializing tree to JSON: {e}")
 
-def load_tree_from_file(file_name):
+def _inline_blobs_in_dict(tree_dict):
+    """JSON files have no blob section, so images are written back as data URIs."""
+    stack = [tree_dict]
+    while stack:
+        node_dict = stack.pop()
+        node_dict["content"] = inline_blob_images(node_dict["content"])
+        stack.extend(node_dict["children"])
+    return tree_dict
+
+@timed
+def load_tree_from_file(file_name, progress=None):
     if file_name.endswith(".lts"):
         try:
-            return load_tree_from_custom_format(file_name)
+            return load_tree_from_custom_format(file_name, progress)
         except ValueError: 
             try:
                 with open(file_name, "r") as f:
                     data = json.load(f)
-                return Node.from_dict(data)
+                return _number_nodes(Node.from_dict(data))
             except FileNotFoundError:
                 raise FileNotFoundError(f"LTS file not found: {file_name}")
             except json.JSONDecodeError:
@@ -227,56 +1298,149 @@ def load_tree_from_file(file_name):
             except Exception as e:
                  raise ValueError(f"Error loading LTS as JSON: {e}")
     elif file_name.endswith(".ctd"):
-        return import_cherrytree(file_name)
+        from importers import import_cherrytree
+        return _number_nodes(import_cherrytree(file_name, progress))
     elif file_name.endswith(".ncd"):
-        return import_notecase(file_name)
+        from importers import import_notecase
+        return _number_nodes(import_notecase(file_name, progress))
     else:
         raise ValueError("Unsupported file format.")
 
+def _number_nodes(root):
+    """Gives nodes of formats without record ids their depth-first position as id, which reloading reproduces."""
+    for node_id, (node, _) in enumerate(iter_tree_preorder(root)):
+        node._file_id = node_id
+    return root
+
+# --- Crash recovery files ---
+# JSON lines: a header naming the document's base file, then one line per
+# autosave listing the nodes changed since the previous one as
+# [id, name, content, child ids]. "f<n>" ids are record ids in the base file
+# (Node._file_id); "n<n>" ids are nodes the base file does not have. content
+# is null when it is unchanged from the base file. A torn last line is ignored.
+RECOVERY_FORMAT_VERSION = 1
+
+def file_stamp(file_name):
+    """[size, mtime in ns] of a file, used to tell whether it changed."""
+    stat = os.stat(file_name)
+    return [stat.st_size, stat.st_mtime_ns]
+
+def write_recovery_lines(file_name, lines, truncate=False):
+    """Appends (or, with truncate, writes) JSON lines to a recovery file and syncs it to disk."""
+    with open(file_name, "w" if truncate else "a", encoding="utf-8") as f:
+        for line in lines:
+            f.write(json.dumps(line, separators=(',', ':')))
+            f.write("\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+@timed
+def load_recovery(file_name, progress=None):
+    """Rebuilds a document from a recovery file.
+
+    Returns (root, header, {id: node} for nodes not in the base file,
+    nodes that differ from the base file).
+    """
+    try:
+        with open(file_name, "r", encoding="utf-8") as f:
+            lines = f.read().split("\n")
+        header = json.loads(lines[0])
+    except (IOError, ValueError) as e:
+        raise ValueError(f"Unreadable recovery file '{file_name}': {e}")
+    if header.get("version") != RECOVERY_FORMAT_VERSION:
+        raise ValueError(f"Unsupported recovery file version in '{file_name}'")
+    records = []
+    for line in lines[1:]:
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            break  # Torn by a crash during the write
+    nodes = {}
+    if header["base"] is not None:
+        base_file = header["file_path"]
+        if not os.path.exists(base_file) or file_stamp(base_file) != header["base"]:
+            raise ValueError(f"'{base_file}' has changed since its unsaved edits were recorded")
+        base_root = load_tree_from_file(base_file, progress)
+        for node, _ in iter_tree_preorder(base_root):
+            nodes[f"f{node._file_id}"] = node
+    child_lists = {}
+    try:
+        for entries in records:
+            for node_id, name, content, child_ids in entries:
+                node = nodes.get(node_id)
+                if node is None:
+                    node = nodes[node_id] = Node(name, content or "")
+                else:  # Fields set directly: the base tree is freshly loaded, and the edits are restored below
+                    node._name = name
+                    if content is not None:
+                        node._content = content
+                        node._content_ref = None
+                        node._content_hash = None
+                child_lists[node_id] = child_ids
+        for node_id, child_ids in child_lists.items():
+            node = nodes[node_id]
+            node._children = []
+            node._positions_valid = 0
+            for child_id in child_ids:
+                _attach(node, nodes[child_id])
+        for node_id in child_lists:  # Digests from the base file no longer cover the relinked tree
+            node = nodes[node_id]
+            while node is not None:
+                node._hash = None
+                node = node.parent
+        root = nodes[header["root"]]
+    except (KeyError, TypeError, ValueError):
+        raise ValueError(f"Corrupt recovery file '{file_name}'")
+    root.parent = None
+    new_nodes = {node_id: node for node_id, node in nodes.items() if node_id.startswith("n")}
+    return root, header, new_nodes, [nodes[node_id] for node_id in child_lists]
+
 # Tree manipulation functions
+@timed
 def add_node_to_tree(parent_node, name="New Node", content=""):
-    if not isinstance(parent_node, Node):
+    if not isinstance(parent_node, TreeNode):
         raise TypeError("parent_node must be an instance of Node")
     new_node = Node(name, content)
-    parent_node.add_child(new_node)
-    return new_node
+    return parent_node.add_child(new_node)
 
+@timed
 def remove_node_from_tree(node):
-    if not isinstance(node, Node):
+    if not isinstance(node, TreeNode):
         raise TypeError("node must be an instance of Node")
     if node.parent: 
         node.parent.remove_child(node)
 
+@timed
 def move_node_up(node):
-    if not isinstance(node, Node):
+    if not isinstance(node, TreeNode):
         raise TypeError("node must be an instance of Node")
     if node.parent:
         try:
-            index = node.parent.children.index(node)
+            index = node.index_in_parent()
             if index > 0:
-                node.parent.children[index], node.parent.children[index - 1] = \
-                    node.parent.children[index - 1], node.parent.children[index]
+                node.parent.move_child(index, index - 1)
         except ValueError: 
             pass 
 
+@timed
 def move_node_down(node):
-    if not isinstance(node, Node):
+    if not isinstance(node, TreeNode):
         raise TypeError("node must be an instance of Node")
     if node.parent:
         try:
-            index = node.parent.children.index(node)
+            index = node.index_in_parent()
             if index < len(node.parent.children) - 1:
-                node.parent.children[index], node.parent.children[index + 1] = \
-                    node.parent.children[index + 1], node.parent.children[index]
+                node.parent.move_child(index, index + 1)
         except ValueError:
             pass
 
+@timed
 def indent_node(node):
-    if not isinstance(node, Node):
+    if not isinstance(node, TreeNode):
         raise TypeError("node must be an instance of Node")
     if node.parent:
         try:
-            index = node.parent.children.index(node)
+            index = node.index_in_parent()
             if index > 0:
                 prev_sibling = node.parent.children[index - 1]
                 node.parent.remove_child(node) 
@@ -284,22 +1448,181 @@ def indent_node(node):
         except ValueError:
             pass
 
+@timed
 def outdent_node(node):
-    if not isinstance(node, Node):
+    if not isinstance(node, TreeNode):
         raise TypeError("node must be an instance of Node")
     if node.parent and node.parent.parent:
         current_parent = node.parent
         grandparent = current_parent.parent
         try:
-            parent_index_in_grandparent = grandparent.children.index(current_parent)
+            parent_index_in_grandparent = current_parent.index_in_parent()
             current_parent.remove_child(node) 
-            grandparent.children.insert(parent_index_in_grandparent + 1, node)
-            node.parent = grandparent 
+            grandparent.insert_child(parent_index_in_grandparent + 1, node)
         except ValueError: 
             pass
 
+@timed
 def merge_trees(base_tree_root, tree_to_merge_root):
-    if not isinstance(base_tree_root, Node) or not isinstance(tree_to_merge_root, Node):
+    if not isinstance(base_tree_root, TreeNode) or not isinstance(tree_to_merge_root, TreeNode):
         raise TypeError("Both arguments must be Node instances")
     for child_node in tree_to_merge_root.children:
         base_tree_root.add_child(child_node.copy())
+
+# --- Batch edits ---
+# Each takes any collection of nodes, ignores nodes below another one in it
+# and rewrites every affected parent once with Node.replace_children, so
+# editing k of n siblings costs O(n) rather than O(k * n).
+
+def node_index_path(node):
+    """Child positions from the root down to node."""
+    path = []
+    while node.parent is not None:
+        path.append(node.index_in_parent())
+        node = node.parent
+    return path[::-1]
+
+def node_at_index_path(root, path):
+    """The node at a path from node_index_path, or None if the tree has no such node."""
+    node = root
+    for position in path:
+        if not 0 <= position < len(node.children):
+            return None
+        node = node.children[position]
+    return node
+
+def top_level_nodes(nodes):
+    """The nodes that are not below another of nodes, in document order."""
+    selected = {id(node): node for node in nodes}
+    top = []
+    for node in selected.values():
+        ancestor = node.parent
+        while ancestor is not None and id(ancestor) not in selected:
+            ancestor = ancestor.parent
+        if ancestor is None:
+            top.append(node)
+    return sorted(top, key=node_index_path)
+
+def _by_parent(nodes):
+    """Groups top-level nodes (with a parent) by parent: {id(parent): (parent, set of child ids)}."""
+    groups = {}
+    for node in top_level_nodes(nodes):
+        if node.parent is not None:
+            groups.setdefault(id(node.parent), (node.parent, set()))[1].add(id(node))
+    return groups
+
+@timed
+def remove_nodes(nodes):
+    """Detaches nodes with their subtrees; returns the removed top-level nodes in document order."""
+    removed = [node for node in top_level_nodes(nodes) if node.parent is not None]
+    for parent, chosen in _by_parent(removed).values():
+        parent.replace_children([child for child in parent.children if id(child) not in chosen])
+    return removed
+
+@timed
+def move_nodes(nodes, new_parent, index=None):
+    """Moves nodes, in document order, to new_parent's children starting at index (default: the end).
+
+    index counts new_parent's current children, including any being moved.
+    Nodes that contain new_parent are left where they are. Returns the moved nodes.
+    """
+    moving = []
+    for node in top_level_nodes(nodes):
+        ancestor = new_parent
+        while ancestor is not None and ancestor is not node:
+            ancestor = ancestor.parent
+        if ancestor is None:
+            moving.append(node)
+    if not moving:
+        return []
+    siblings = new_parent.children
+    if index is None or index > len(siblings):
+        index = len(siblings)
+    chosen = set(map(id, moving))
+    index -= sum(1 for child in siblings[:index] if id(child) in chosen)
+    for parent, moved_here in _by_parent(moving).values():
+        if parent is not new_parent:
+            parent.replace_children([child for child in parent.children if id(child) not in moved_here])
+    kept = [child for child in new_parent.children if id(child) not in chosen]
+    new_parent.replace_children(kept[:index] + moving + kept[index:])
+    return moving
+
+def _shift_up(children, chosen):
+    """Moves each chosen child one place up, unless it is blocked at the top by other chosen children."""
+    children = list(children)
+    free = 0  # First position a chosen child could still move into
+    for position in range(len(children)):
+        if id(children[position]) in chosen:
+            if position > free:
+                children[position - 1], children[position] = children[position], children[position - 1]
+                free = position
+            else:
+                free = position + 1
+    return children
+
+@timed
+def move_nodes_up(nodes):
+    """Moves each node one place up among its siblings, keeping the selection's relative order."""
+    for parent, chosen in _by_parent(nodes).values():
+        parent.replace_children(_shift_up(parent.children, chosen))
+
+@timed
+def move_nodes_down(nodes):
+    """Moves each node one place down among its siblings, keeping the selection's relative order."""
+    for parent, chosen in _by_parent(nodes).values():
+        parent.replace_children(_shift_up(parent.children[::-1], chosen)[::-1])
+
+@timed
+def indent_nodes(nodes):
+    """Makes each node the last child of the nearest preceding sibling that is not being indented."""
+    for parent, chosen in _by_parent(nodes).values():
+        kept = []
+        adopted = {}  # id(new parent) -> (new parent, nodes appended to it)
+        for child in parent.children:
+            if id(child) in chosen and kept:
+                adopted.setdefault(id(kept[-1]), (kept[-1], []))[1].append(child)
+            else:
+                kept.append(child)
+        parent.replace_children(kept)
+        for new_parent, children in adopted.values():
+            new_parent.replace_children(new_parent.children + children)
+
+@timed
+def outdent_nodes(nodes):
+    """Moves each node to its grandparent, right after its old parent; top-level nodes stay."""
+    for parent, chosen in _by_parent(nodes).values():
+        grandparent = parent.parent
+        if grandparent is None:
+            continue
+        moving = [child for child in parent.children if id(child) in chosen]
+        parent.replace_children([child for child in parent.children if id(child) not in chosen])
+        siblings = grandparent.children
+        position = parent.index_in_parent() + 1
+        grandparent.replace_children(siblings[:position] + moving + siblings[position:])
+
+@timed
+def place_nodes(placements):
+    """Puts each node of (node, parent, index) placements at that index of parent's children.
+
+    A parent of None takes the node out of the tree. Indexes are positions
+    once every node is placed, so replaying where nodes were before an edit
+    undoes it; every affected parent is rewritten once.
+    """
+    leaving = {}  # id(current parent) -> (parent, ids of children leaving it)
+    for node, _, _ in placements:
+        if node.parent is not None:
+            leaving.setdefault(id(node.parent), (node.parent, set()))[1].add(id(node))
+    for parent, chosen in leaving.values():
+        parent.replace_children([child for child in parent.children if id(child) not in chosen])
+    arriving = {}  # id(new parent) -> (parent, [(index, node)])
+    for node, parent, index in placements:
+        if parent is not None:
+            arriving.setdefault(id(parent), (parent, []))[1].append((index, node))
+    for parent, entries in arriving.values():
+        rest = iter(parent.children)
+        children = []
+        for index, node in sorted(entries, key=lambda entry: entry[0]):
+            children.extend(itertools.islice(rest, max(0, index - len(children))))
+            children.append(node)
+        children.extend(rest)
+        parent.replace_children(children)
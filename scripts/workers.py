@@ -0,0 +1,102 @@
+import threading
+import time
+from PyQt5.QtCore import QCoreApplication, QObject, QRunnable, QThreadPool, pyqtSignal
+from utility import OperationCancelled
+
+PROGRESS_INTERVAL_S = 0.05  # Minimum time between progress signals
+
+
+class JobSignals(QObject):
+    """Signals for a Job. Created on the GUI thread, so emits from the worker are queued to it."""
+    progress = pyqtSignal(object, object)  # done, total (may exceed 32 bits)
+    finished = pyqtSignal(object)  # Return value of the job function
+    failed = pyqtSignal(object)  # Exception raised by the job function
+    cancelled = pyqtSignal()
+
+
+class Job(QRunnable):
+    """Runs func(*args, progress=callback) on a QThreadPool worker thread.
+
+    The callback forwards progress to the GUI thread and raises
+    OperationCancelled once cancel() has been called.
+    """
+    def __init__(self, func, *args):
+        super().__init__()
+        self.func = func
+        self.args = args
+        self.signals = JobSignals()
+        self._cancel_event = threading.Event()
+        self._last_emit = 0.0
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def is_cancelled(self):
+        return self._cancel_event.is_set()
+
+    def report_progress(self, done, total):
+        if self._cancel_event.is_set():
+            raise OperationCancelled()
+        now = time.monotonic()
+        if now - self._last_emit >= PROGRESS_INTERVAL_S or done >= total:
+            self._last_emit = now
+            self.signals.progress.emit(min(done, total), total)
+
+    def run(self):
+        try:
+            result = self.func(*self.args, progress=self.report_progress)
+        except OperationCancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            if self._cancel_event.is_set():
+                self.signals.cancelled.emit()
+            else:
+                self.signals.failed.emit(e)
+        else:
+            self.signals.finished.emit(result)
+
+
+class JobRunner(QObject):
+    """Runs one file job at a time and tracks it until its result reaches the GUI thread."""
+    started = pyqtSignal(str)  # Job description
+    progress = pyqtSignal(object, object)
+    done = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool.globalInstance()
+        self.active_job = None
+
+    def is_busy(self):
+        return self.active_job is not None
+
+    def start(self, description, func, *args, on_finished=None, on_failed=None, on_cancelled=None):
+        """Starts func on the pool. Returns False if another job is still running."""
+        if self.active_job is not None:
+            return False
+        job = Job(func, *args)
+        job.setAutoDelete(False)  # Kept alive by active_job until its signals are delivered
+        job.signals.progress.connect(self.progress)
+        job.signals.finished.connect(lambda result: self._complete(on_finished, result))
+        job.signals.failed.connect(lambda error: self._complete(on_failed, error))
+        job.signals.cancelled.connect(lambda: self._complete(on_cancelled))
+        self.active_job = job
+        self.started.emit(description)
+        self.pool.start(job)
+        return True
+
+    def cancel(self):
+        if self.active_job is not None:
+            self.active_job.cancel()
+
+    def wait(self):
+        """Blocks until the active job has finished and its callbacks have run."""
+        while self.active_job is not None:
+            self.pool.waitForDone(50)
+            QCoreApplication.processEvents()
+
+    def _complete(self, callback, *args):
+        self.active_job = None
+        self.done.emit()
+        if callback is not None:
+            callback(*args)
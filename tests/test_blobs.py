@@ -0,0 +1,64 @@
+"""Images kept in blob_store across saves of the documents that use them."""
+import base64
+
+from utility import (
+    BLOB_SCHEME, Node, blob_store, extract_inline_images, load_tree_from_file, save_tree_to_custom_format
+)
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 4
+
+
+def image_note(name, data=PNG):
+    html = f'<p><img src="data:image/png;base64,{base64.b64encode(data).decode("ascii")}"></p>'
+    return Node(name, extract_inline_images(html))
+
+
+def blob_key(node):
+    return node.content.split(BLOB_SCHEME, 1)[1].split('"', 1)[0]
+
+
+def test_saved_image_is_read_from_the_file(tmp_path):
+    root = Node("Root")
+    note = root.add_child(image_note("Image", PNG + b"saved"))
+    key = blob_key(note)
+    assert isinstance(blob_store._blobs[key], bytes)
+    save_tree_to_custom_format(root, str(tmp_path / "a.lts"))
+    assert not isinstance(blob_store._blobs[key], bytes)  # The file holds it now
+    assert blob_store.get(key) == PNG + b"saved"
+
+
+def test_full_save_keeps_images_still_used_elsewhere(tmp_path):
+    path_a, path_b = str(tmp_path / "a.lts"), str(tmp_path / "b.lts")
+    root = Node("Root")
+    key = blob_key(root.add_child(image_note("Image", PNG + b"shared")))
+    save_tree_to_custom_format(root, path_a)
+    blob_store._blobs.pop(key)  # As in a later session: known only from the file
+    doc_a = load_tree_from_file(path_a)
+
+    doc_b = Node("Other")
+    doc_b.add_child(doc_a.children[0].copy())  # Pasted into another document
+    doc_a.remove_child(doc_a.children[0])
+    save_tree_to_custom_format(doc_a, path_a)  # Compacted without the image
+    assert blob_store.get(key) == PNG + b"shared"
+
+    save_tree_to_custom_format(doc_b, path_b)
+    blob_store._blobs.pop(key)
+    reloaded = load_tree_from_file(path_b)
+    assert blob_key(reloaded.children[0]) == key
+    assert blob_store.get(key) == PNG + b"shared"
+
+
+def test_save_over_open_file_keeps_old_content_readable(tmp_path):
+    path = str(tmp_path / "a.lts")
+    root = Node("Root")
+    for i in range(20):
+        root.add_child(Node(f"Note {i}", f"<p>old {i}</p>"))
+    save_tree_to_custom_format(root, path)
+    loaded = load_tree_from_file(path)
+    detached = loaded.children[7]
+    assert not detached.is_content_loaded()
+
+    save_tree_to_custom_format(Node("Replacement", "<p>new</p>"), path)
+    assert detached.content == "<p>old 7</p>"
+    assert load_tree_from_file(path).content == "<p>new</p>"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a.lts"]
@@ -0,0 +1,60 @@
+"""Copy-on-write copies stay independent of the tree they were copied from."""
+from utility import Node, iter_tree_preorder
+
+
+def build_tree():
+    root = Node("Root")
+    for i in range(3):
+        branch = root.add_child(Node(f"Branch {i}", f"<p>branch {i}</p>"))
+        for j in range(3):
+            branch.add_child(Node(f"Leaf {i}.{j}", f"<p>leaf {i}.{j}</p>"))
+    return root
+
+
+def dump(root):
+    return [(node.name, node.content, parent.name if parent else None) for node, parent in iter_tree_preorder(root)]
+
+
+def test_editing_the_copy_leaves_the_original():
+    original = build_tree()
+    expected = dump(original)
+    copy = original.copy()
+    copy.children[1].children[2].content = "<p>changed</p>"
+    copy.children[0].name = "Renamed"
+    copy.children[2].add_child(Node("Added"))
+    copy.children[1].remove_child(copy.children[1].children[0])
+    assert dump(original) == expected
+    assert copy.children[1].children[1].content == "<p>changed</p>"
+
+
+def test_editing_the_original_leaves_the_copy():
+    original = build_tree()
+    expected = dump(original)
+    copy = original.copy()
+    original.children[1].children[2].content = "<p>changed</p>"
+    original.children[2].name = "Renamed"
+    original.children[0].add_child(Node("Added"))
+    original.remove_child(original.children[1])
+    assert dump(copy) == expected
+
+
+def test_copies_of_copies():
+    original = build_tree()
+    expected = dump(original)
+    first = original.copy()
+    second = first.copy()
+    first.children[0].children[0].name = "First only"
+    second.children[0].children[0].content = "<p>second only</p>"
+    assert dump(original) == expected
+    assert first.children[0].children[0].content == "<p>leaf 0.0</p>"
+    assert second.children[0].children[0].name == "Leaf 0.0"
+
+
+def test_copy_is_detached_and_materialized_lazily():
+    original = build_tree()
+    copy = original.children[1].copy()
+    assert copy.parent is None
+    assert copy._copy_of is not None  # Nothing built until the children are read
+    assert [child.name for child in copy.children] == ["Leaf 1.0", "Leaf 1.1", "Leaf 1.2"]
+    assert all(child.parent is copy for child in copy.children)
+    assert not any(child is other for child, other in zip(copy.children, original.children[1].children))
@@ -0,0 +1,94 @@
+"""ChangeTracker records and the LTS journal they feed."""
+import os
+import random
+
+from utility import (
+    ChangeTracker, Node, indent_node, iter_tree_preorder, load_tree_from_custom_format, remove_node_from_tree,
+    save_tree_incremental, save_tree_to_custom_format
+)
+
+
+def build_tree(name="Root"):
+    root = Node(name)
+    for i in range(3):
+        root.add_child(Node(f"Note {i}", f"<p>note {i}</p>"))
+    return root
+
+
+def dump(root):
+    return [(node.name, node.content, parent.name if parent else None) for node, parent in iter_tree_preorder(root)]
+
+
+def test_tracker_records_only_its_own_tree():
+    first, second = build_tree("First"), build_tree("Second")
+    tracker = ChangeTracker(first)
+    first.children[0].content = "<p>edited</p>"
+    second.children[1].content = "<p>edited</p>"
+    second.add_child(Node("Added"))
+    assert len(tracker.changed) == 1
+    assert tracker.take() == [first.children[0]]
+    assert tracker.take() == []
+
+
+def test_trackers_of_one_tree_record_independently():
+    root = build_tree()
+    saves, snapshots = ChangeTracker(root), ChangeTracker(root)
+    root.children[0].name = "Renamed"
+    assert saves.take() == [root.children[0]]
+    root.children[1].name = "Renamed too"
+    assert {node.name for node in snapshots.take()} == {"Renamed", "Renamed too"}
+
+
+def test_nodes_removed_after_an_edit_are_not_taken():
+    root = build_tree()
+    tracker = ChangeTracker(root)
+    removed = root.children[2]
+    removed.content = "<p>edited</p>"
+    root.remove_child(removed)
+    assert tracker.take() == [root]
+
+
+def test_tracker_without_a_tree_records_nothing():
+    tracker = ChangeTracker(None)
+    build_tree().children[0].name = "Renamed"
+    assert tracker.take() == []
+
+
+def test_journal_replays_random_edits(tmp_path):
+    rng = random.Random(12)
+    base = Node("Root")
+    nodes = [base]
+    for i in range(300):
+        nodes.append(rng.choice(nodes).add_child(Node(f"Node {i}", f"<p>{i}</p>")))
+    path = save_tree_to_custom_format(base, str(tmp_path / "doc.lts"))
+    tree = load_tree_from_custom_format(path)
+    tracker = ChangeTracker(tree)
+    for round_ in range(20):
+        nodes = [node for node, _ in iter_tree_preorder(tree)]
+        for node in rng.sample(nodes, 4):
+            if node.parent is None:
+                node.name += "'"
+            elif round_ % 4 == 0:
+                remove_node_from_tree(node)
+            elif round_ % 4 == 1:
+                indent_node(node)
+            elif round_ % 4 == 2:
+                node.add_child(rng.choice(nodes).copy())
+            else:
+                node.content += "<p>edited</p>"
+        size = os.path.getsize(path)
+        assert save_tree_incremental(tree, path, tracker.take()) == path
+        assert os.path.getsize(path) > size  # Appended rather than rewritten
+        assert dump(load_tree_from_custom_format(path)) == dump(tree)
+
+
+def test_torn_journal_record_is_ignored(tmp_path):
+    path = save_tree_to_custom_format(Node("Root"), str(tmp_path / "doc.lts"))
+    tree = load_tree_from_custom_format(path)
+    tracker = ChangeTracker(tree)
+    tree.add_child(Node("Kept", "<p>kept</p>"))
+    save_tree_incremental(tree, path, tracker.take())
+    expected = dump(tree)
+    with open(path, "ab") as f:
+        f.write(b"JRNL\x00\x00\x00\x00\x00\x00\x10\x00garbage")  # A crash in the middle of an append
+    assert dump(load_tree_from_custom_format(path)) == expected
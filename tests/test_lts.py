@@ -0,0 +1,66 @@
+"""LTS1 and LTS2 save and load round trips."""
+import pytest
+
+from utility import (
+    Node, iter_tree_preorder, load_tree_from_custom_format, load_tree_from_file, load_tree_mapped,
+    save_tree_to_custom_format
+)
+
+
+def build_tree():
+    root = Node("Root")
+    for i in range(4):
+        branch = root.add_child(Node(f"Branch {i}", f"<p>branch {i} é中</p>"))
+        for j in range(i):
+            branch.add_child(Node(f"Leaf {i}.{j}", "" if j else f"<p>leaf {i}.{j}</p>"))
+    return root
+
+
+def dump(root):
+    return [(node.name, node.content, parent.name if parent else None) for node, parent in iter_tree_preorder(root)]
+
+
+@pytest.mark.parametrize("version", [1, 2])
+def test_round_trip(tmp_path, version):
+    root = build_tree()
+    path = save_tree_to_custom_format(root, str(tmp_path / "doc"), version=version)
+    assert path.endswith(".lts")
+    assert dump(load_tree_from_custom_format(path)) == dump(root)
+    assert dump(load_tree_from_file(path)) == dump(root)
+
+
+def test_lts2_loads_content_lazily(tmp_path):
+    path = save_tree_to_custom_format(build_tree(), str(tmp_path / "doc.lts"))
+    loaded = load_tree_from_custom_format(path)
+    leaf = loaded.children[3].children[0]
+    assert not leaf.is_content_loaded()
+    assert leaf.content == "<p>leaf 3.0</p>"
+    assert leaf.is_content_loaded()
+
+
+def test_mapped_view_matches_the_tree(tmp_path):
+    root = build_tree()
+    path = save_tree_to_custom_format(root, str(tmp_path / "doc.lts"))
+    assert dump(load_tree_mapped(path)) == dump(root)
+
+
+@pytest.mark.parametrize("version", [1, 2])
+def test_very_deep_tree(tmp_path, version):
+    root = node = Node("Root")
+    for i in range(20_000):
+        node = node.add_child(Node(f"Level {i}", "<p>deep</p>"))
+    path = save_tree_to_custom_format(root, str(tmp_path / "deep.lts"), version=version)
+    loaded = load_tree_from_custom_format(path)
+    depth = 0
+    while loaded.children:
+        loaded = loaded.children[0]
+        depth += 1
+    assert depth == 20_000 and loaded.name == "Level 19999"
+
+
+def test_resave_over_the_loaded_file(tmp_path):
+    path = save_tree_to_custom_format(build_tree(), str(tmp_path / "doc.lts"))
+    loaded = load_tree_from_custom_format(path)
+    loaded.children[0].name = "Renamed"
+    save_tree_to_custom_format(loaded, path)
+    assert dump(load_tree_from_custom_format(path)) == dump(loaded)
@@ -0,0 +1,19 @@
+"""NodeTreeModel row lookups."""
+from model import NodeTreeModel
+from utility import Node
+
+
+def test_index_for_node_in_a_very_deep_tree():
+    root = node = Node("Root")
+    for i in range(50_000):
+        node = node.add_child(Node(f"Level {i}"))
+    model = NodeTreeModel(root)
+    index = model.index_for_node(node)
+    assert index.isValid() and index.internalPointer() is node
+    assert model.parent(index).internalPointer() is node.parent
+
+
+def test_index_for_node_outside_the_tree():
+    model = NodeTreeModel(Node("Root"))
+    stray = Node("Stray").add_child(Node("Child"))
+    assert not model.index_for_node(stray).isValid()
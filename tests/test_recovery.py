@@ -0,0 +1,88 @@
+"""Crash recovery round trips against each format a document can be loaded from."""
+import pytest
+
+from autosave import Autosaver
+from generate import write_cherrytree, write_notecase
+from utility import (
+    ChangeTracker, Node, iter_tree_preorder, load_recovery, load_tree_from_file,
+    save_tree_to_custom_format, save_tree_to_file
+)
+
+
+def build_tree():
+    root = Node("Root")
+    for i in range(3):
+        branch = root.add_child(Node(f"Branch {i}", f"<p>branch {i}</p>"))
+        for j in range(3):
+            branch.add_child(Node(f"Leaf {i}.{j}", f"<p>leaf {i}.{j}</p>"))
+    return root
+
+
+def dump(root):
+    return [(node.name, node.content, parent.name if parent else None) for node, parent in iter_tree_preorder(root)]
+
+
+def write_base(root, path, kind):
+    if kind == "lts1":
+        save_tree_to_custom_format(root, path, version=1)
+    elif kind == "lts2":
+        save_tree_to_custom_format(root, path)
+    elif kind == "json":
+        save_tree_to_file(root, path)
+    elif kind == "ctd":
+        write_cherrytree(root, path)
+    else:
+        write_notecase(root, path)
+
+
+@pytest.mark.parametrize("kind, suffix", [
+    ("lts1", ".lts"), ("lts2", ".lts"), ("json", ".lts"), ("ctd", ".ctd"), ("ncd", ".ncd")
+])
+def test_recovery_against_base_file(tmp_path, kind, suffix):
+    path = str(tmp_path / f"doc{suffix}")
+    write_base(build_tree(), path, kind)
+    root = load_tree_from_file(path)
+    tracker = ChangeTracker(root)
+    autosaver = Autosaver(str(tmp_path / "recovery"))
+
+    root.children[1].children[2].content = "<p>edited</p>"
+    autosaver.snapshot("doc", root, path, "doc", tracker.take())
+    root.children[0].name = "Renamed"
+    root.children[2].add_child(Node("Added", "<p>new</p>"))
+    root.remove_child(root.children[1].children[0])
+    autosaver.snapshot("doc", root, path, "doc", tracker.take())
+    autosaver.wait()
+
+    recovery_file, = autosaver.recovery_files()
+    restored, header, new_nodes, changed = load_recovery(recovery_file)
+    assert header["file_path"] == path
+    assert dump(restored) == dump(root)
+    assert [node.name for node in new_nodes.values()] == ["Added"]
+
+
+def test_recovery_after_saving_in_another_format(tmp_path):
+    lts2, lts1 = str(tmp_path / "a.lts"), str(tmp_path / "b.lts")
+    save_tree_to_custom_format(build_tree(), lts2)
+    root = load_tree_from_file(lts2)
+    root.remove_child(root.children[0])
+    save_tree_to_custom_format(root, lts1, version=1)  # Ids must now follow the LTS1 file
+    tracker = ChangeTracker(root)
+    autosaver = Autosaver(str(tmp_path / "recovery"))
+    root.children[0].children[1].content = "<p>edited</p>"
+    autosaver.snapshot("doc", root, lts1, "b", tracker.take())
+    autosaver.wait()
+
+    restored = load_recovery(autosaver.recovery_files()[0])[0]
+    assert dump(restored) == dump(root)
+
+
+def test_recovery_without_base_file(tmp_path):
+    root = build_tree()
+    autosaver = Autosaver(str(tmp_path / "recovery"))
+    autosaver.snapshot("doc", root, None, "Untitled", [])
+    autosaver.wait()
+
+    restored, header, new_nodes, _ = load_recovery(autosaver.recovery_files()[0])
+    assert header["file_path"] is None
+    assert dump(restored) == dump(root)
+    assert len(new_nodes) == len(dump(root))
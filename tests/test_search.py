@@ -0,0 +1,65 @@
+"""SearchIndex updates made from the worker thread."""
+import gc
+import weakref
+
+from search import SearchIndex
+from utility import Node
+
+
+def build_tree(count=50):
+    root = Node("Root")
+    for i in range(count):
+        root.add_child(Node(f"Note {i}", f"<p>w{i}x shared</p>"))
+    return root
+
+
+def test_index_and_remove_subtree():
+    index = SearchIndex()
+    root = build_tree()
+    index.add_subtree(root)
+    index.wait()
+    assert [node.name for node in index.search("w7x")] == ["Note 7"]
+    assert len(index.search("shared")) == 50
+    index.remove_subtree(root.children[7])
+    root.remove_child(root.children[7])
+    index.wait()
+    assert index.search("w7x") == []
+    assert index.failed == 0
+
+
+def test_pasted_copy_is_indexed_on_the_worker():
+    index = SearchIndex()
+    original = build_tree()
+    pasted = original.copy()
+    index.add_subtree(pasted)
+    index.wait()
+    hits = index.search("w3x")
+    assert len(hits) == 1 and hits[0] is pasted.children[3]
+
+
+def test_unreadable_note_does_not_stop_the_batch():
+    class BrokenSource:
+        def read_bytes(self, key):
+            raise ValueError("note content truncated")
+
+    index = SearchIndex()
+    root = build_tree()
+    root.children[10].bind_content(BrokenSource(), 0)
+    index.add_subtree(root)
+    index.wait()
+    assert index.failed == 1
+    assert "truncated" in index.last_error
+    assert len(index.search("shared")) == 49
+    assert [node.name for node in index.search("note 10")] == ["Note 10"]  # Still found by name
+
+
+def test_index_does_not_keep_deleted_nodes_alive():
+    index = SearchIndex()
+    root = build_tree()
+    index.add_subtree(root)
+    index.wait()
+    note = weakref.ref(root.children[0])
+    del root
+    gc.collect()
+    assert note() is None
+    assert index.search("shared") == []
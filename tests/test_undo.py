@@ -0,0 +1,74 @@
+"""UndoLog entries recorded by the tree model, and merging of content edits."""
+from model import NodeTreeModel
+from undo import ContentEdit, UndoLog, _subtree_bytes, NODE_OVERHEAD_BYTES, SIZE_SAMPLE_NODES
+from utility import Node
+
+
+class ContentEditor:
+    """The part of DocumentTab a ContentEdit replays through."""
+    def set_node_content(self, node, content):
+        node.content = content
+
+
+def names(node):
+    return [child.name for child in node.children]
+
+
+def test_grouped_insertions_undo_as_one_step():
+    log = UndoLog()
+    root = Node("Root")
+    root.add_child(Node("Existing"))
+    model = NodeTreeModel(root, undo_log=log)
+    with model.single_undo_step():
+        for i in range(3):
+            model.insert_node(root, Node(f"Merged {i}"))
+        model.insert_node(root.children[1], Node("Nested"))
+    assert len(log._undo) == 1
+    log.undo(model)
+    assert names(root) == ["Existing"]
+    assert not log.can_undo()
+    log.redo(model)
+    assert names(root) == ["Existing", "Merged 0", "Merged 1", "Merged 2"]
+    assert names(root.children[1]) == ["Nested"]
+
+
+def test_insertions_outside_a_group_undo_one_by_one():
+    log = UndoLog()
+    root = Node("Root")
+    model = NodeTreeModel(root, undo_log=log)
+    for i in range(3):
+        model.insert_node(root, Node(f"Note {i}"))
+    log.undo(model)
+    assert names(root) == ["Note 0", "Note 1"]
+
+
+def test_typing_merges_into_one_content_edit():
+    log = UndoLog()
+    editor = ContentEditor()
+    node = Node("Note", "")
+    text = ""
+    for char in "hello":
+        node.content, old = text + char, text
+        log.record(ContentEdit(node, old, node.content))
+        text = node.content
+    assert len(log._undo) == 1
+    log.undo(editor)
+    assert node.content == ""
+    log.redo(editor)
+    assert node.content == "hello"
+
+
+def test_edits_of_different_notes_stay_separate():
+    log = UndoLog()
+    first, second = Node("First", "a"), Node("Second", "b")
+    log.record(ContentEdit(first, "a", "ab"))
+    log.record(ContentEdit(second, "b", "bc"))
+    assert len(log._undo) == 2
+
+
+def test_huge_subtree_size_is_estimated_from_a_sample():
+    root = Node("Root")
+    for i in range(SIZE_SAMPLE_NODES * 5):
+        root.add_child(Node("Note", "x" * 100))
+    exact = sum(NODE_OVERHEAD_BYTES + len(node.name) + len(node._content) for node in [root] + root.children)
+    assert abs(_subtree_bytes(root) - exact) < exact * 0.01